@@ -0,0 +1,220 @@
+""" LPGL - IUT Metz
+Zachary Arnaise
+
+Génère un catalogue SQLite synthétique, de même schéma que `data/movies.db`,
+pour mesurer le serveur sur de gros volumes (voir `run.py`).
+
+    python bench/generate.py --movies 100000 --output /tmp/catalogue.db
+
+Le contenu est déterministe pour une même graine (`--seed`): deux catalogues
+générés avec les mêmes arguments sont identiques, ce qui rend les mesures
+comparables d'un commit à l'autre.
+
+Chaque film a un ou deux réalisateurs, 3 à 12 acteurs et le plus souvent un
+compositeur. Les personnes sont tirées selon une loi déséquilibrée: quelques
+personnes apparaissent dans beaucoup de films, la plupart dans peu.
+"""
+
+import argparse
+import datetime
+import os
+import random
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import sqlalchemy  # noqa: E402
+
+import migrations  # noqa: E402
+from models import Base  # noqa: E402
+from references import ACTOR, DIRECTOR, SONG_WRITER  # noqa: E402
+
+# Tables de référence, identiques à celles de `data/movies.db`
+STATUSES = ((1, "en cours de réalisation"), (2, "sortie"), (3, "inabouti"))
+ROLES = ((1, DIRECTOR), (2, ACTOR), (3, SONG_WRITER))
+
+# Nombre de lignes par `executemany`
+_BATCH_SIZE = 10000
+
+_FIRST_NAMES = (
+    "Alice Bruno Camille David Élise François Gabrielle Hugo Inès Jean "
+    "Karine Louis Manon Nicolas Océane Pierre Quentin Rose Sophie Thomas "
+    "Ursule Victor William Xavier Yasmine Zoé Agnès Benoît Chloé Denis"
+).split()
+_LAST_NAMES = (
+    "Martin Bernard Dubois Thomas Robert Richard Petit Durand Leroy Moreau "
+    "Simon Laurent Lefèvre Michel Garcia David Bertrand Roux Vincent Fournier "
+    "Morel Girard André Lefebvre Mercier Dupont Lambert Bonnet François Legrand"
+).split()
+_TITLE_WORDS = (
+    "retour avenir nuit soleil crocodile élément ombre dernier voyage ville "
+    "secret mer silence feu royaume étoile chemin mémoire hiver jardin "
+    "guerre promesse rêve lumière cité peur île frontière orage miroir"
+).split()
+_ORIGINAL_WORDS = (
+    "return future night sun crocodile element shadow last journey city "
+    "secret sea silence fire kingdom star road memory winter garden war "
+    "promise dream light city fear island border storm mirror"
+).split()
+
+
+def _date(rng: random.Random, first_year: int, last_year: int) -> str:
+    """Date aléatoire au format ISO (comme stockée par SQLAlchemy)."""
+    start = datetime.date(first_year, 1, 1).toordinal()
+    end = datetime.date(last_year, 12, 31).toordinal()
+    return datetime.date.fromordinal(rng.randint(start, end)).isoformat()
+
+
+def _title(rng: random.Random, words: tuple) -> str:
+    """Titre de 1 à 4 mots."""
+    title = " ".join(rng.choice(words) for _ in range(rng.randint(1, 4)))
+    return title[0].upper() + title[1:]
+
+
+def _person(rng: random.Random, popularity: list) -> int:
+    """ID d'une personne, les premières de `popularity` étant les plus
+    fréquentes."""
+    return popularity[int(len(popularity) * rng.random() ** 2)]
+
+
+def _persons(rng: random.Random, count: int):
+    """Lignes de la table `person`."""
+    for id_ in range(1, count + 1):
+        birth = _date(rng, 1920, 2005)
+        death = _date(rng, 1990, 2022) if rng.random() < 0.1 else None
+        if death is not None and death < birth:
+            death = None
+        yield (
+            id_,
+            rng.choice(_FIRST_NAMES),
+            rng.choice(_LAST_NAMES),
+            birth,
+            death,
+        )
+
+
+def _movies(rng: random.Random, count: int):
+    """Lignes de la table `movie`."""
+    for id_ in range(1, count + 1):
+        french = _title(rng, _TITLE_WORDS)
+        original = (
+            french if rng.random() < 0.6 else _title(rng, _ORIGINAL_WORDS)
+        )
+        status = rng.choices((1, 2, 3), weights=(1, 17, 2))[0]
+        yield (id_, french, original, status, _date(rng, 1930, 2026))
+
+
+def _members(
+    rng: random.Random,
+    popularity: list,
+    members: dict,
+    role_id: int,
+    count: int,
+):
+    """Ajoute à `members` `count` personnes distinctes ayant le rôle
+    `role_id` (moins s'il n'y a pas assez de personnes)."""
+    wanted = len(members) + min(count, len(popularity))
+    while len(members) < wanted:
+        members[(_person(rng, popularity), role_id)] = None
+
+
+def _crew(rng: random.Random, movies: int, persons: int):
+    """Lignes de la table `movie_persons`."""
+    # Popularité indépendante de l'ID, pour que les premières pages de
+    # personnes ne soient pas les plus chargées
+    popularity = list(range(1, persons + 1))
+    rng.shuffle(popularity)
+    id_ = 0
+    for movie_id in range(1, movies + 1):
+        members = {}
+        _members(rng, popularity, members, 1, 1 if rng.random() < 0.9 else 2)
+        _members(rng, popularity, members, 2, rng.randint(3, 12))
+        if rng.random() < 0.7:
+            _members(rng, popularity, members, 3, 1)
+        for person_id, role_id in members:
+            id_ += 1
+            yield (id_, movie_id, person_id, role_id)
+
+
+def _insert(connection, statement: str, rows):
+    """Insère `rows` par lots."""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= _BATCH_SIZE:
+            connection.executemany(statement, batch)
+            batch = []
+    if batch:
+        connection.executemany(statement, batch)
+
+
+def generate(path: str, movies: int, persons: int, seed: int = 1):
+    """Crée le catalogue `path` (remplacé s'il existe)."""
+    if os.path.exists(path):
+        os.remove(path)
+    rng = random.Random(seed)
+
+    # Schéma des modèles, puis données sans passer par l'ORM
+    engine = sqlalchemy.create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    engine.dispose()
+
+    connection = sqlite3.connect(path)
+    connection.execute("PRAGMA journal_mode=OFF")
+    connection.execute("PRAGMA synchronous=OFF")
+    with connection:
+        connection.executemany(
+            "INSERT INTO movie_status VALUES (?, ?)", STATUSES
+        )
+        connection.executemany("INSERT INTO person_roles VALUES (?, ?)", ROLES)
+        _insert(
+            connection,
+            "INSERT INTO person VALUES (?, ?, ?, ?, ?)",
+            _persons(rng, persons),
+        )
+        _insert(
+            connection,
+            "INSERT INTO movie VALUES (?, ?, ?, ?, ?)",
+            _movies(rng, movies),
+        )
+        _insert(
+            connection,
+            "INSERT INTO movie_persons VALUES (?, ?, ?, ?)",
+            _crew(rng, movies, persons),
+        )
+    connection.close()
+
+    # Index et recherche plein texte, comme au démarrage du serveur
+    engine = sqlalchemy.create_engine(f"sqlite:///{path}")
+    migrations.migrate(engine)
+    with engine.connect() as connection:
+        connection.execute("ANALYZE")
+    engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--movies", type=int, default=10000)
+    parser.add_argument(
+        "--persons",
+        type=int,
+        default=None,
+        help="nombre de personnes (la moitié du nombre de films par défaut)",
+    )
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", required=True, help="fichier SQLite créé")
+    args = parser.parse_args()
+
+    persons = args.persons or max(1, args.movies // 2)
+    start = time.perf_counter()
+    generate(args.output, args.movies, persons, args.seed)
+    print(
+        f"{args.output}: {args.movies} films, {persons} personnes "
+        f"({time.perf_counter() - start:.1f} s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+""" LPGL - IUT Metz
+Zachary Arnaise
+
+Mesure les performances du serveur sur un catalogue (voir `generate.py`).
+
+    python bench/run.py --db /tmp/catalogue.db --output resultats.json
+    python bench/run.py --db /tmp/catalogue.db --compare resultats.json
+
+Un jeu fixe de documents GraphQL représentatifs est envoyé à
+`ResourceGraphQL` via le client de test de Falcon (sans réseau ni serveur).
+Pour chaque document sont mesurés la latence (percentiles), le nombre de
+requêtes SQL par requête HTTP et le pic de mémoire allouée (`tracemalloc`,
+dans une passe séparée pour ne pas fausser les latences).
+
+Les résultats, enregistrés en JSON avec le commit courant et la taille du
+catalogue, peuvent être comparés à ceux d'un autre commit (`--compare`).
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import falcon  # noqa: E402
+import falcon.testing  # noqa: E402
+import sqlalchemy  # noqa: E402
+import sqlalchemy.orm  # noqa: E402
+
+import database  # noqa: E402
+import migrations  # noqa: E402
+import references  # noqa: E402
+import sessions  # noqa: E402
+from backend import CachedDocumentBackend  # noqa: E402
+from resources import ResourceGraphQL  # noqa: E402
+from schema import schema  # noqa: E402
+
+_PERSON = "id firstName lastName"
+_MOVIE = "id frenchTitle status"
+
+# Documents mesurés: nom -> (document, variables à tirer au hasard)
+DOCUMENTS = {
+    "movie_by_id": (
+        "query ($id: Int) { movie(id: $id) { %s directors { %s } "
+        "actors { %s } songWriters { %s } } }"
+        % (_MOVIE, _PERSON, _PERSON, _PERSON),
+        ("movie",),
+    ),
+    "person_career": (
+        "query ($id: Int) { person(id: $id) { %s directed { %s } "
+        "playedIn { %s actors { %s } } } }"
+        % (_PERSON, _MOVIE, _MOVIE, _PERSON),
+        ("person",),
+    ),
+    "movies_page": (
+        "{ moviesConnection(first: 100) { totalCount edges { node { %s "
+        "directors { %s } actors { %s } } } } }" % (_MOVIE, _PERSON, _PERSON),
+        (),
+    ),
+    "persons_page": (
+        "{ personsConnection(first: 100) { edges { node { %s "
+        "playedIn { %s } } } } }" % (_PERSON, _MOVIE),
+        (),
+    ),
+    "directors_page": (
+        "{ directorsConnection(first: 100) { edges { node { %s } } } }"
+        % _PERSON,
+        (),
+    ),
+    "search": (
+        "query ($q: String) { search(q: $q, first: 20) { "
+        "... on MovieType { %s } ... on PersonType { %s } } }"
+        % (_MOVIE, _PERSON),
+        ("q",),
+    ),
+    "movies_all": ("{ movies { %s } }" % _MOVIE, ()),
+}
+
+# Mots cherchés par le document `search`
+_SEARCH_TERMS = ("retour", "nuit cité", "martin", "élément", "sophie dubois")
+
+
+class Catalogue(object):
+    """Serveur GraphQL sur une copie du catalogue, avec comptage des
+    requêtes SQL."""
+
+    def __init__(self: object, path: str):
+        """Constructeur."""
+        self.directory = tempfile.mkdtemp(prefix="bench-")
+        self.path = os.path.join(self.directory, "catalogue.db")
+        shutil.copy(path, self.path)
+
+        environ = {"DATABASE_URL": f"sqlite:///{self.path}"}
+        self.engine = database.create_engine(environ)
+        migrations.migrate(self.engine)
+        self.statements = 0
+        sqlalchemy.event.listen(
+            self.engine, "before_cursor_execute", self._count
+        )
+
+        session = sqlalchemy.orm.scoped_session(
+            sqlalchemy.orm.sessionmaker(bind=self.engine)
+        )
+        sessions.instrument()
+        references.load(session)
+        with self.engine.connect() as connection:
+            self.sizes = {
+                table: connection.execute(
+                    f"SELECT COUNT(*) FROM {table}"
+                ).scalar()
+                for table in ("movie", "person", "movie_persons")
+            }
+            self.max_ids = {
+                table: connection.execute(
+                    f"SELECT MAX(id) FROM {table}"
+                ).scalar()
+                for table in ("movie", "person")
+            }
+
+        app = falcon.App(middleware=[sessions.SessionMiddleware(session)])
+        app.add_route(
+            "/graphql",
+            ResourceGraphQL(
+                schema=schema,
+                scoped_session=session,
+                backend=CachedDocumentBackend(max_size=512),
+            ),
+        )
+        self.client = falcon.testing.TestClient(app)
+
+    def _count(self: object, *args):
+        self.statements += 1
+
+    def close(self: object):
+        """Supprime la copie du catalogue."""
+        self.engine.dispose()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def request(self: object, document: str, variables: dict) -> int:
+        """Exécute un document.
+
+        Returns:
+            int: Nombre de requêtes SQL exécutées.
+        """
+        self.statements = 0
+        result = self.client.simulate_post(
+            "/graphql", json={"query": document, "variables": variables}
+        )
+        if result.status_code != 200 or "errors" in result.json:
+            raise RuntimeError(f"{result.status}: {result.text[:500]}")
+        return self.statements
+
+
+def _variables(names: tuple, catalogue: Catalogue, rng: random.Random):
+    """Variables d'une requête, tirées au hasard."""
+    variables = {}
+    for name in names:
+        if name == "q":
+            variables["q"] = rng.choice(_SEARCH_TERMS)
+        else:
+            variables["id"] = rng.randint(1, catalogue.max_ids[name] or 1)
+    return variables
+
+
+def _percentile(values: list, percent: float) -> float:
+    """Percentile (interpolé) de `values`, triées."""
+    position = (len(values) - 1) * percent / 100
+    low = int(position)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (position - low)
+
+
+def measure(
+    catalogue: Catalogue,
+    name: str,
+    iterations: int,
+    warmup: int,
+    seed: int,
+) -> dict:
+    """Mesure un document de `DOCUMENTS`."""
+    document, names = DOCUMENTS[name]
+    rng = random.Random(seed)
+
+    for _ in range(warmup):
+        catalogue.request(document, _variables(names, catalogue, rng))
+
+    latencies, statements = [], []
+    for _ in range(iterations):
+        variables = _variables(names, catalogue, rng)
+        start = time.perf_counter()
+        statements.append(catalogue.request(document, variables))
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+
+    # Pic de mémoire sur une requête supplémentaire
+    tracemalloc.start()
+    catalogue.request(document, _variables(names, catalogue, rng))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "iterations": iterations,
+        "latency_ms": {
+            "min": latencies[0],
+            "p50": _percentile(latencies, 50),
+            "p90": _percentile(latencies, 90),
+            "p99": _percentile(latencies, 99),
+            "max": latencies[-1],
+            "mean": statistics.mean(latencies),
+        },
+        "sql_statements": {
+            "min": min(statements),
+            "median": statistics.median(statements),
+            "max": max(statements),
+        },
+        "peak_memory_kib": peak // 1024,
+    }
+
+
+def _git(*args) -> str:
+    """Sortie d'une commande git, `None` hors d'un dépôt."""
+    try:
+        return subprocess.check_output(
+            ("git",) + args,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL,
+            text=True,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _report(results: dict, baseline: dict = None):
+    """Affiche les résultats, et leur écart avec `baseline`."""
+    header = f"{'document':<16}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}"
+    header += f"{'SQL':>6}{'mém. Kio':>10}"
+    if baseline:
+        header += f"{'Δ p50':>9}{'Δ SQL':>7}"
+    print(header)
+
+    for name, result in results["documents"].items():
+        latency = result["latency_ms"]
+        sql = result["sql_statements"]["median"]
+        line = f"{name:<16}{latency['p50']:>10.2f}{latency['p90']:>10.2f}"
+        line += f"{latency['p99']:>10.2f}{sql:>6g}"
+        line += f"{result['peak_memory_kib']:>10}"
+        previous = (baseline or {}).get("documents", {}).get(name)
+        if previous:
+            before = previous["latency_ms"]["p50"]
+            change = (latency["p50"] - before) / before * 100 if before else 0
+            line += f"{change:>+8.1f}%"
+            line += f"{sql - previous['sql_statements']['median']:>+7g}"
+        print(line)
+
+    if baseline:
+        print(
+            f"\nréférence: {baseline.get('commit')} "
+            f"({baseline.get('catalogue')})"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--db", required=True, help="catalogue SQLite")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument(
+        "--documents",
+        nargs="+",
+        choices=sorted(DOCUMENTS),
+        default=list(DOCUMENTS),
+    )
+    parser.add_argument("--output", help="fichier JSON des résultats")
+    parser.add_argument("--compare", help="résultats JSON de référence")
+    args = parser.parse_args()
+
+    catalogue = Catalogue(args.db)
+    try:
+        results = {
+            "commit": _git("rev-parse", "HEAD"),
+            "dirty": bool(_git("status", "--porcelain", "--untracked=no")),
+            "python": platform.python_version(),
+            "catalogue": catalogue.sizes,
+            "iterations": args.iterations,
+            "documents": {},
+        }
+        for name in args.documents:
+            results["documents"][name] = measure(
+                catalogue, name, args.iterations, args.warmup, args.seed
+            )
+    finally:
+        catalogue.close()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            baseline = json.load(file)
+    _report(results, baseline)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
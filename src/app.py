@@ -2,27 +2,125 @@
 Zachary Arnaise
 """
 
+import logging
 import os.path
 import sys
 
 import falcon
 import sqlalchemy.orm
 
-from resources import ResourceGraphQL
+import database
+import metrics
+import migrations
+import references
+import sessions
+from backend import CachedDocumentBackend
+from complexity import ComplexityAnalyzer
+from compression import CompressionMiddleware
+from encoders import get_encoder
+from persisted import SQLiteQueryStore
+from result_cache import MemoryResultCache, SQLiteResultCache
+from resources import ResourceGraphQL, ResourceMetrics
 from schema import schema
 
-if not os.path.isfile("/db/movies.db"):
+# Journalisation: niveau `LOG_LEVEL` (WARNING par défaut), requêtes SQL
+# journalisées seulement avec `SQL_ECHO=1`
+logging.basicConfig(
+    level=os.environ.get("LOG_LEVEL", "WARNING").upper(),
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+)
+if os.environ.get("SQL_ECHO") == "1":
+    logging.getLogger("sqlalchemy.engine").setLevel(logging.INFO)
+
+# Init ORM, base configurée par l'environnement (voir `database`)
+engine = database.create_engine()
+if engine.url.get_backend_name() == "sqlite" and not os.path.isfile(
+    engine.url.database or ""
+):
     print("ERREUR: Accès à la db SQLite impossible, aucun fichier trouvé.")
     sys.exit(1)
-
-# Init ORM
-engine = sqlalchemy.create_engine("sqlite:////db/movies.db", echo=True)
+metrics.instrument_engine(engine)
+migrations.migrate(engine)
 sessionmaker = sqlalchemy.orm.sessionmaker(bind=engine)
 scoped_session = sqlalchemy.orm.scoped_session(sessionmaker)
+sessions.instrument()
+
+# Connexions en lecture seule pour les requêtes `query`, les mutations
+# utilisant la base principale
+read_engines = database.create_read_engines()
+read_scoped_session = None
+if read_engines:
+    for read_engine in read_engines:
+        metrics.instrument_engine(read_engine)
+    read_scoped_session = sqlalchemy.orm.scoped_session(
+        database.read_session_factory(read_engines)
+    )
+
+# Chargement des données de référence
+references.load(scoped_session)
+scoped_session.remove()
+
+# Cache des résultats des requêtes, désactivé par défaut. `sqlite` partage le
+# cache (et son invalidation) entre les processus
+result_cache = None
+if os.environ.get("RESULT_CACHE") == "memory":
+    result_cache = MemoryResultCache(ttl=60)
+elif os.environ.get("RESULT_CACHE") == "sqlite":
+    result_cache = SQLiteResultCache(
+        database.data_path("result_cache.db"), ttl=60
+    )
+
+# Encodeur JSON des réponses (`json` ou `orjson`, le plus rapide disponible
+# par défaut) et envoi des réponses par morceaux
+encoder = get_encoder(os.environ.get("JSON_ENCODER") or None)
+stream_responses = os.environ.get("GRAPHQL_STREAM") == "1"
 
-# Init serveur Falcon
-app = falcon.API()
-app.add_route(
-    uri_template="/graphql",
-    resource=ResourceGraphQL(schema=schema, scoped_session=scoped_session),
+# Limites de profondeur et de coût des requêtes, vérifiées avant exécution.
+# Le coût n'est limité qu'avec `GRAPHQL_MAX_COST`, les listes non paginées
+# (`movies`, `persons`) coûtant le nombre de lignes de leur table
+max_cost = os.environ.get("GRAPHQL_MAX_COST")
+complexity = ComplexityAnalyzer(
+    max_depth=int(os.environ.get("GRAPHQL_MAX_DEPTH", "10")),
+    max_cost=int(max_cost) if max_cost else None,
 )
+
+# Compression des réponses (gzip, brotli si installé), désactivée avec
+# `COMPRESSION=0`
+compression_options = None
+if os.environ.get("COMPRESSION") != "0":
+    compression_options = dict(
+        min_size=int(os.environ.get("COMPRESSION_MIN_SIZE", "1024")),
+        level=int(os.environ.get("COMPRESSION_LEVEL", "6")),
+        brotli_quality=int(os.environ.get("BROTLI_QUALITY", "4")),
+    )
+
+# En-tête `Cache-Control` des réponses aux requêtes GET (avec ETag)
+cache_control = os.environ.get("GRAPHQL_CACHE_CONTROL") or "no-cache"
+
+
+def create_resource(resource_class=ResourceGraphQL, **kwargs):
+    """Construit la resource GraphQL, commune aux serveurs WSGI et ASGI."""
+    return resource_class(
+        schema=schema,
+        scoped_session=scoped_session,
+        backend=CachedDocumentBackend(max_size=512),
+        persisted_queries=SQLiteQueryStore(
+            database.data_path("persisted_queries.db")
+        ),
+        result_cache=result_cache,
+        encoder=encoder,
+        stream_responses=stream_responses,
+        complexity=complexity,
+        read_scoped_session=read_scoped_session,
+        cache_control=cache_control,
+        **kwargs,
+    )
+
+
+# Init serveur Falcon (WSGI), voir `asgi.py` pour le serveur ASGI
+middleware = [sessions.SessionMiddleware(scoped_session, read_scoped_session)]
+if compression_options is not None:
+    middleware.append(CompressionMiddleware(**compression_options))
+app = falcon.App(middleware=middleware)
+app.add_route(uri_template="/graphql", resource=create_resource())
+app.add_route(uri_template="/metrics", resource=ResourceMetrics())
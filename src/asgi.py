@@ -0,0 +1,28 @@
+""" LPGL - IUT Metz
+Zachary Arnaise
+
+Point d'entrée ASGI du serveur, à lancer avec uvicorn:
+    uvicorn asgi:app --host 0.0.0.0 --port 80
+"""
+
+import os
+
+import falcon.asgi
+
+from app import compression_options, create_resource
+from compression import AsyncCompressionMiddleware
+from resources import AsyncResourceGraphQL, AsyncResourceMetrics
+
+# Init serveur Falcon (ASGI)
+middleware = []
+if compression_options is not None:
+    middleware.append(AsyncCompressionMiddleware(**compression_options))
+app = falcon.asgi.App(middleware=middleware)
+app.add_route(
+    uri_template="/graphql",
+    resource=create_resource(
+        AsyncResourceGraphQL,
+        max_workers=int(os.environ.get("GRAPHQL_THREADS", "8")),
+    ),
+)
+app.add_route(uri_template="/metrics", resource=AsyncResourceMetrics())
@@ -0,0 +1,92 @@
+""" LPGL - IUT Metz
+Zachary Arnaise
+
+Backend graphql-core avec cache LRU des documents parsés et validés.
+"""
+
+import threading
+from collections import OrderedDict
+from functools import partial
+
+from graphql.backend.base import GraphQLBackend, GraphQLDocument
+from graphql.execution import ExecutionResult, execute
+from graphql.language.base import parse
+from graphql.validation import validate
+
+
+def _execute_validated(schema, document_ast, validation_errors, *args, **kw):
+    """Exécute un document déjà validé, ou renvoie ses erreurs de
+    validation."""
+    if validation_errors:
+        return ExecutionResult(errors=validation_errors, invalid=True)
+    return execute(schema, document_ast, *args, **kw)
+
+
+class CachedDocumentBackend(GraphQLBackend):
+    """Backend qui garde en cache les `max_size` derniers documents utilisés.
+
+    Un document identique (même schéma, même texte) n'est ainsi lexé, parsé
+    et validé qu'une seule fois, les requêtes suivantes passent directement à
+    l'exécution. Les documents invalides sont aussi mis en cache avec leurs
+    erreurs de validation (`validation_errors` du document); les erreurs de
+    syntaxe ne le sont pas.
+
+    Attributes:
+        max_size (int): Nombre maximum de documents gardés en cache.
+        hits (int): Nombre de documents trouvés dans le cache.
+        misses (int): Nombre de documents absents du cache.
+        evictions (int): Nombre de documents retirés du cache faute de place.
+    """
+
+    def __init__(self: object, max_size: int = 512):
+        """Constructeur."""
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._documents = OrderedDict()
+        self._lock = threading.Lock()
+
+    def document_from_string(self: object, schema, document_string: str):
+        """Renvoie le document correspondant à `document_string`, depuis le
+        cache si possible."""
+        key = (schema, document_string)
+        with self._lock:
+            document = self._documents.get(key)
+            if document is not None:
+                self._documents.move_to_end(key)
+                self.hits += 1
+                return document
+            self.misses += 1
+
+        # Parse et validation hors verrou, ce sont les étapes coûteuses
+        document_ast = parse(document_string)
+        validation_errors = validate(schema, document_ast)
+        document = GraphQLDocument(
+            schema=schema,
+            document_string=document_string,
+            document_ast=document_ast,
+            execute=partial(
+                _execute_validated, schema, document_ast, validation_errors
+            ),
+        )
+        document.validation_errors = validation_errors
+
+        with self._lock:
+            self._documents[key] = document
+            self._documents.move_to_end(key)
+            while len(self._documents) > self.max_size:
+                self._documents.popitem(last=False)
+                self.evictions += 1
+        return document
+
+    def stats(self: object) -> dict:
+        """Compteurs du cache."""
+        with self._lock:
+            return {
+                "size": len(self._documents),
+                "maxSize": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
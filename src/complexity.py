@@ -0,0 +1,266 @@
+""" LPGL - IUT Metz
+Zachary Arnaise
+
+Analyse statique de la profondeur et du coût d'une opération GraphQL, avant
+son exécution.
+
+Le coût estime le nombre d'objets chargés: chaque champ objet coûte 1, et le
+coût d'un champ liste est multiplié par le nombre d'éléments attendu:
+- liste à la racine (`movies`, `actors`, ...): nombre de lignes de la table;
+- liste paginée (`first`): taille de la page demandée;
+- liste imbriquée (`movie { actors }`): nombre moyen de lignes liées par
+  objet parent, d'après les tables de ses relations one-to-many.
+
+Les champs d'introspection (`__schema`, `__type`, ...) ne sont pas comptés.
+"""
+
+import math
+import threading
+import time
+from collections import namedtuple
+
+import sqlalchemy
+from graphql.language import ast
+from graphql.type.definition import (
+    GraphQLList,
+    GraphQLNonNull,
+    get_named_type,
+)
+from graphql.utils.value_from_ast import value_from_ast
+
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+
+Complexity = namedtuple("Complexity", "depth cost")
+Complexity.__doc__ = """Profondeur et coût estimé d'une opération."""
+
+
+def _model(graphql_type):
+    """Modèle SQLAlchemy d'un type GraphQL, `None` s'il n'en a pas."""
+    graphene_type = getattr(graphql_type, "graphene_type", None)
+    return getattr(getattr(graphene_type, "_meta", None), "model", None)
+
+
+class TableStatistics(object):
+    """Nombre de lignes des tables, gardé en cache `ttl` secondes."""
+
+    def __init__(self: object, ttl: float = 300):
+        """Constructeur."""
+        self.ttl = ttl
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def row_count(self: object, session, table: sqlalchemy.Table) -> int:
+        """Nombre de lignes de `table`."""
+        with self._lock:
+            cached = self._counts.get(table.name)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+
+        count = (
+            session.query(sqlalchemy.func.count()).select_from(table).scalar()
+        )
+        with self._lock:
+            self._counts[table.name] = (time.monotonic() + self.ttl, count)
+        return count
+
+
+class _Context(object):
+    """État d'une analyse."""
+
+    def __init__(self: object, document, session, variables: dict):
+        """Constructeur."""
+        self.schema = document.schema
+        self.session = session
+        self.variables = variables or {}
+        self.fragments = {
+            definition.name.value: definition
+            for definition in document.document_ast.definitions
+            if isinstance(definition, ast.FragmentDefinition)
+        }
+
+
+class ComplexityAnalyzer(object):
+    """Calcule la profondeur et le coût des opérations.
+
+    Attributes:
+        max_depth (int): Profondeur maximale acceptée.
+        max_cost (int): Coût maximal accepté, `None` pour ne pas limiter le
+        coût (il est alors seulement calculé). Les listes non paginées
+        existantes (`movies`, `persons`) coûtant le nombre de lignes de leur
+        table, une limite peut refuser des requêtes jusque-là acceptées.
+        statistics (TableStatistics): Nombre de lignes des tables.
+    """
+
+    def __init__(
+        self: object,
+        max_depth: int = 10,
+        max_cost: int = None,
+        statistics: TableStatistics = None,
+    ):
+        """Constructeur."""
+        self.max_depth = max_depth
+        self.max_cost = max_cost
+        self.statistics = statistics if statistics else TableStatistics()
+
+    def analyze(
+        self: object,
+        document,
+        session,
+        variables: dict = None,
+        operationName: str = None,
+    ) -> Complexity:
+        """Profondeur et coût de l'opération `operationName` de `document`.
+
+        L'analyse a lieu avant la validation: les champs inconnus ne sont pas
+        comptés, leurs erreurs seront renvoyées par l'exécution.
+        """
+        schema = document.schema
+        context = _Context(document, session, variables)
+        for definition in document.document_ast.definitions:
+            if not isinstance(definition, ast.OperationDefinition):
+                continue
+            if operationName and (
+                definition.name is None
+                or definition.name.value != operationName
+            ):
+                continue
+            root_type = {
+                "query": schema.get_query_type(),
+                "mutation": schema.get_mutation_type(),
+                "subscription": schema.get_subscription_type(),
+            }.get(definition.operation)
+            if root_type is None:
+                break
+            return self._selection(
+                context, root_type, definition.selection_set, 1, None
+            )
+        return Complexity(0, 0)
+
+    def _fields(self: object, context, parent_type, selection_set, spreads):
+        """Champs d'une sélection, fragments inclus, avec leur type
+        parent."""
+        for selection in selection_set.selections:
+            if isinstance(selection, ast.Field):
+                yield selection, parent_type
+                continue
+
+            fragment = selection
+            fragment_spreads = spreads
+            if isinstance(selection, ast.FragmentSpread):
+                name = selection.name.value
+                if name in spreads or name not in context.fragments:
+                    continue  # Cycle ou fragment inconnu, refusés ensuite
+                fragment = context.fragments[name]
+                fragment_spreads = spreads | {name}
+
+            fragment_type = parent_type
+            if fragment.type_condition is not None:
+                fragment_type = context.schema.get_type(
+                    fragment.type_condition.name.value
+                )
+            yield from self._fields(
+                context,
+                fragment_type or parent_type,
+                fragment.selection_set,
+                fragment_spreads,
+            )
+
+    def _selection(
+        self: object, context, parent_type, selection_set, depth: int, page
+    ) -> Complexity:
+        """Profondeur et coût d'une sélection."""
+        max_depth = depth
+        cost = 0
+        for field, field_parent in self._fields(
+            context, parent_type, selection_set, frozenset()
+        ):
+            field_depth, field_cost = self._field(
+                context, field_parent, field, depth, page
+            )
+            max_depth = max(max_depth, field_depth)
+            cost += field_cost
+        return Complexity(max_depth, cost)
+
+    def _field(
+        self: object, context, parent_type, field, depth: int, page
+    ) -> Complexity:
+        """Profondeur et coût d'un champ.
+
+        `page` est la taille de page d'une connexion parente, appliquée à la
+        première liste rencontrée (`edges`).
+        """
+        name = field.name.value
+        field_def = getattr(parent_type, "fields", {}).get(name)
+        if name.startswith("__") or field_def is None:
+            return Complexity(depth, 0)
+        if field.selection_set is None:
+            return Complexity(depth, 0)  # Champ scalaire
+        if depth > self.max_depth:
+            # Opération déjà refusée, inutile d'aller plus loin (fragments
+            # récursifs compris)
+            return Complexity(depth, 0)
+
+        if "first" in field_def.args:
+            first = self._argument(context, field, field_def, "first")
+            first = DEFAULT_PAGE_SIZE if first is None else first
+            page = max(0, min(first, MAX_PAGE_SIZE))
+
+        field_type = field_def.type
+        if isinstance(field_type, GraphQLNonNull):
+            field_type = field_type.of_type
+        named_type = get_named_type(field_type)
+
+        multiplier = 1
+        if isinstance(field_type, GraphQLList):
+            ids = None
+            if "ids" in field_def.args:
+                ids = self._argument(context, field, field_def, "ids", list)
+            if page is not None:
+                multiplier, page = page, None
+            elif ids is not None:
+                multiplier = len(ids)
+            else:
+                multiplier = self._list_size(context, parent_type, named_type)
+
+        child_depth, child_cost = self._selection(
+            context, named_type, field.selection_set, depth + 1, page
+        )
+        return Complexity(child_depth, multiplier * (1 + child_cost))
+
+    def _argument(
+        self: object, context, field, field_def, name: str, kind: type = int
+    ):
+        """Valeur de l'argument `name` d'un champ, ou sa valeur par défaut,
+        `None` si elle n'est pas du type `kind`."""
+        arg_def = field_def.args[name]
+        for argument in field.arguments or ():
+            if argument.name.value == name:
+                value = value_from_ast(
+                    argument.value, arg_def.type, context.variables
+                )
+                return value if isinstance(value, kind) else None
+        default = arg_def.default_value
+        return default if isinstance(default, kind) else None
+
+    def _list_size(self: object, context, parent_type, item_type) -> int:
+        """Nombre d'éléments attendu dans une liste non paginée."""
+        session = context.session
+        model = _model(item_type)
+        parent_model = _model(parent_type)
+        if parent_model is None:
+            # Liste à la racine, ou liste non liée à un modèle
+            if model is None:
+                return 1
+            return max(1, self.statistics.row_count(session, model.__table__))
+
+        parents = max(
+            1, self.statistics.row_count(session, parent_model.__table__)
+        )
+        size = 1
+        for relationship in sqlalchemy.inspect(parent_model).relationships:
+            if relationship.uselist:
+                rows = self.statistics.row_count(
+                    session, relationship.mapper.local_table
+                )
+                size = max(size, math.ceil(rows / parents))
+        return size
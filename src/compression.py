@@ -0,0 +1,240 @@
+""" LPGL - IUT Metz
+Zachary Arnaise
+
+Compression des réponses (gzip, et brotli si le module `brotli` est
+installé), négociée avec l'en-tête `Accept-Encoding` du client.
+
+Les réponses construites d'un bloc ne sont compressées qu'au-delà d'une
+taille minimale; les réponses envoyées par morceaux (voir `encoders`) le sont
+toujours, morceau par morceau, chaque morceau étant envoyé dès qu'il est
+compressé.
+
+Une réponse compressée est une autre représentation de la ressource: son
+`ETag` reçoit le suffixe du codage (`-gzip`, `-br`, voir `coded_etag`). Le
+codage négocié pour une requête est noté dans `req.context.content_coding`,
+pour que seul l'ETag de la représentation choisie soit comparé à ceux de
+`If-None-Match`.
+"""
+
+import asyncio
+import zlib
+from collections.abc import AsyncIterator, Iterator
+
+import falcon
+
+try:
+    import brotli
+except ImportError:  # Dépendance optionnelle
+    brotli = None
+
+# Types de contenu compressés
+COMPRESSIBLE_TYPES = ("application/json", "text/")
+
+
+def coded_etag(etag: str, coding: str) -> str:
+    """ETag (sans guillemets) de la représentation compressée avec
+    `coding`."""
+    return f"{etag}-{coding}"
+
+
+def _accepted(header: str) -> dict:
+    """Codages acceptés par le client: codage -> poids (`q`)."""
+    codings = {}
+    for item in (header or "").split(","):
+        coding, _, params = item.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        weight = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        codings[coding] = weight
+    return codings
+
+
+class _Compressor(object):
+    """Compression incrémentale d'un contenu."""
+
+    def __init__(self: object, coding: str, level: int, brotli_quality: int):
+        """Constructeur."""
+        if coding == "br":
+            self._compressor = brotli.Compressor(quality=brotli_quality)
+        else:
+            # `wbits` 16 + 15: en-tête et somme de contrôle gzip
+            self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+        self.coding = coding
+
+    def compress(self: object, data: bytes) -> bytes:
+        """Compresse `data` et renvoie tout ce qui peut déjà être envoyé."""
+        if self.coding == "br":
+            return self._compressor.process(data) + self._compressor.flush()
+        return self._compressor.compress(data) + self._compressor.flush(
+            zlib.Z_SYNC_FLUSH
+        )
+
+    def finish(self: object) -> bytes:
+        """Fin du contenu compressé."""
+        if self.coding == "br":
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+
+class CompressionMiddleware(object):
+    """Middleware Falcon (WSGI) compressant les réponses.
+
+    Attributes:
+        min_size (int): Taille (en octets) à partir de laquelle une réponse
+        construite d'un bloc est compressée.
+        level (int): Niveau de compression gzip, de 1 (rapide) à 9.
+        brotli_quality (int): Qualité de compression brotli, de 0 (rapide)
+        à 11.
+    """
+
+    def __init__(
+        self: object,
+        min_size: int = 1024,
+        level: int = 6,
+        brotli_quality: int = 4,
+    ):
+        """Constructeur."""
+        self.min_size = min_size
+        self.level = level
+        self.brotli_quality = brotli_quality
+
+    def _coding(self: object, req: falcon.Request) -> str:
+        """Codage à utiliser pour la réponse à `req`, `None` si aucun."""
+        accepted = _accepted(req.get_header("Accept-Encoding"))
+        candidates = ["gzip"]
+        if brotli is not None:
+            candidates.insert(0, "br")
+        for coding in candidates:
+            if accepted.get(coding, accepted.get("*", 0)) > 0:
+                return coding
+        return None
+
+    def _prepare(self: object, req: falcon.Request, resp: falcon.Response):
+        """Vérifie si la réponse peut être compressée.
+
+        Returns:
+            str: Codage à utiliser, `None` pour laisser la réponse telle
+            quelle.
+        """
+        # Sans `Content-Type`, Falcon utilise le type par défaut de l'app
+        content_type = resp.content_type or resp.options.default_media_type
+        if not content_type.startswith(COMPRESSIBLE_TYPES):
+            return None
+        if resp.get_header("Content-Encoding") or req.method == "HEAD":
+            return None
+        # La représentation dépend de `Accept-Encoding`, même non compressée
+        resp.append_header("Vary", "Accept-Encoding")
+        if resp.status in (falcon.HTTP_204, falcon.HTTP_304):
+            return None
+        return self._coding(req)
+
+    def _negotiate(self: object, req: falcon.Request):
+        """Note le codage négocié avec le client (voir `coded_etag`)."""
+        req.context.content_coding = self._coding(req)
+
+    def _compressor(self: object, coding: str) -> _Compressor:
+        """Compresseur incrémental pour `coding`."""
+        return _Compressor(coding, self.level, self.brotli_quality)
+
+    def _compress(self: object, coding: str, data: bytes) -> bytes:
+        """Compresse `data` d'un bloc."""
+        compressor = self._compressor(coding)
+        return compressor.compress(data) + compressor.finish()
+
+    def _iter_compress(self: object, coding: str, chunks: Iterator):
+        """Compresse les morceaux d'une réponse envoyée par morceaux."""
+        compressor = self._compressor(coding)
+        for chunk in chunks:
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.finish()
+
+    @staticmethod
+    def _set_encoding(resp: falcon.Response, coding: str):
+        """En-têtes d'une réponse compressée avec `coding`."""
+        resp.set_header("Content-Encoding", coding)
+        etag = resp.get_header("ETag")
+        if etag and etag.startswith('"'):
+            resp.set_header("ETag", f'"{coded_etag(etag[1:-1], coding)}"')
+
+    def process_request(
+        self: object, req: falcon.Request, resp: falcon.Response
+    ):
+        self._negotiate(req)
+
+    def process_response(
+        self: object,
+        req: falcon.Request,
+        resp: falcon.Response,
+        resource: object,
+        req_succeeded: bool,
+    ):
+        coding = self._prepare(req, resp)
+        if coding is None:
+            return
+
+        if resp.stream is not None:
+            resp.stream = self._iter_compress(coding, resp.stream)
+        else:
+            data = resp.render_body()
+            if data is None or len(data) < self.min_size:
+                return
+            resp.data = self._compress(coding, data)
+        self._set_encoding(resp, coding)
+
+
+class AsyncCompressionMiddleware(CompressionMiddleware):
+    """Version ASGI de `CompressionMiddleware`.
+
+    Les réponses construites d'un bloc sont compressées dans le pool de
+    threads par défaut de la boucle, pour ne pas la bloquer.
+    """
+
+    async def _aiter_compress(self: object, coding: str, chunks):
+        """Compresse les morceaux d'une réponse envoyée par morceaux."""
+        compressor = self._compressor(coding)
+        async for chunk in chunks:
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.finish()
+
+    async def process_request(
+        self: object, req: falcon.Request, resp: falcon.Response
+    ):
+        self._negotiate(req)
+
+    async def process_response(
+        self: object,
+        req: falcon.Request,
+        resp: falcon.Response,
+        resource: object,
+        req_succeeded: bool,
+    ):
+        coding = self._prepare(req, resp)
+        if coding is None:
+            return
+
+        if isinstance(resp.stream, AsyncIterator):
+            resp.stream = self._aiter_compress(coding, resp.stream)
+        elif resp.stream is not None:
+            # Autres flux (fichiers...): laissés tels quels
+            return
+        else:
+            data = await resp.render_body()
+            if data is None or len(data) < self.min_size:
+                return
+            loop = asyncio.get_running_loop()
+            resp.data = await loop.run_in_executor(
+                None, self._compress, coding, data
+            )
+        self._set_encoding(resp, coding)
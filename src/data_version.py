@@ -0,0 +1,70 @@
+""" LPGL - IUT Metz
+Zachary Arnaise
+
+Version des données: compteur enregistré dans la table `data_version`,
+incrémenté par chaque transaction qui modifie la base, dans cette même
+transaction.
+
+Deux lectures faites avec la même version voient donc les mêmes données,
+quel que soit le processus qui a écrit: la version sert à construire l'ETag
+des réponses aux requêtes GET (voir `resources`) et à recharger les données
+de référence modifiées par un autre processus (voir `references`).
+"""
+
+import sqlalchemy
+import sqlalchemy.orm
+from sqlalchemy import Column, Integer
+
+import signals
+
+# Clé de la version lue par une transaction, dans `Session.info`
+_SESSION_VERSION = "data_version"
+
+# Table hors des modèles, une seule ligne d'ID 1
+metadata = sqlalchemy.MetaData()
+data_version = sqlalchemy.Table(
+    "data_version",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("version", Integer, nullable=False),
+)
+
+
+def create_table(connection):
+    """Crée la table `data_version` et sa ligne si elles n'existent pas."""
+    data_version.create(connection, checkfirst=True)
+    exists = connection.execute(sqlalchemy.select([data_version.c.id])).first()
+    if exists is None:
+        connection.execute(data_version.insert().values(id=1, version=1))
+
+
+def current(session) -> int:
+    """Version actuelle des données, vue par `session`."""
+    return session.execute(sqlalchemy.select([data_version.c.version])).scalar()
+
+
+def of_session(session) -> int:
+    """Version des données vue par `session`, lue une seule fois par
+    transaction."""
+    version = session.info.get(_SESSION_VERSION)
+    if version is None:
+        version = session.info[_SESSION_VERSION] = current(session)
+    return version
+
+
+@sqlalchemy.event.listens_for(sqlalchemy.orm.Session, "after_transaction_end")
+def _after_transaction_end(session, transaction):
+    """Oublie la version lue par la transaction terminée."""
+    if transaction.parent is None:
+        session.info.pop(_SESSION_VERSION, None)
+
+
+@sqlalchemy.event.listens_for(sqlalchemy.orm.Session, "before_commit")
+def _before_commit(session):
+    """Incrémente la version si la transaction modifie au moins une table."""
+    # Flush des objets en attente, pour connaître toutes les tables modifiées
+    session.flush()
+    if signals.changed_tables(session):
+        session.execute(
+            data_version.update().values(version=data_version.c.version + 1)
+        )
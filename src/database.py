@@ -0,0 +1,185 @@
+""" LPGL - IUT Metz
+Zachary Arnaise
+
+Création du moteur SQLAlchemy à partir des variables d'environnement:
+- `DATABASE_URL`: URL de la base, SQLite (`sqlite:////db/movies.db` par
+  défaut) ou PostgreSQL (`postgresql://...`, pilote `psycopg2` requis);
+- `DATABASE_READ_URLS`: URLs des réplicas en lecture seule, séparées par
+  des virgules. Par défaut, le fichier SQLite de `DATABASE_URL` est rouvert en
+  lecture seule; sans réplica ni SQLite, tout passe par `DATABASE_URL`;
+- `DATA_DIR`: dossier des fichiers annexes (requêtes persistées, cache des
+  résultats), par défaut celui du fichier SQLite de `DATABASE_URL`, ou `/db`
+  avec une autre base;
+- `DB_POOL_SIZE`, `DB_MAX_OVERFLOW`, `DB_POOL_TIMEOUT`, `DB_POOL_RECYCLE`:
+  réglages du pool de connexions;
+- `SQLITE_JOURNAL_MODE`, `SQLITE_SYNCHRONOUS`, `SQLITE_CACHE_SIZE` (en Kio),
+  `SQLITE_MMAP_SIZE` (en octets), `SQLITE_BUSY_TIMEOUT` (en secondes):
+  pragmas appliqués à chaque nouvelle connexion SQLite.
+"""
+
+import itertools
+import os
+from functools import partial
+
+import sqlalchemy
+import sqlalchemy.orm
+from sqlalchemy.pool import QueuePool, StaticPool
+
+DEFAULT_URL = "sqlite:////db/movies.db"
+DEFAULT_DATA_DIR = "/db"
+
+# Valeurs par défaut des réglages, surchargeables par l'environnement
+DEFAULTS = {
+    "DB_POOL_SIZE": "8",
+    "DB_MAX_OVERFLOW": "4",
+    "DB_POOL_TIMEOUT": "30",
+    "DB_POOL_RECYCLE": "3600",
+    "SQLITE_JOURNAL_MODE": "WAL",
+    "SQLITE_SYNCHRONOUS": "NORMAL",
+    "SQLITE_CACHE_SIZE": "65536",
+    "SQLITE_MMAP_SIZE": "268435456",
+    "SQLITE_BUSY_TIMEOUT": "5",
+}
+
+
+def _setting(environ, name: str) -> str:
+    """Valeur d'un réglage, depuis l'environnement ou par défaut."""
+    return environ.get(name) or DEFAULTS[name]
+
+
+def sqlite_pragmas(environ=os.environ, read_only: bool = False) -> dict:
+    """Pragmas appliqués aux connexions SQLite.
+
+    Le journal WAL permet les lectures pendant une écriture; avec WAL,
+    `synchronous=NORMAL` reste sûr en cas d'arrêt du processus. Le cache de
+    pages est exprimé en Kio (valeur négative pour SQLite). Le mode du journal
+    n'est pas modifiable par une connexion en lecture seule.
+    """
+    pragmas = {
+        "journal_mode": _setting(environ, "SQLITE_JOURNAL_MODE"),
+        "synchronous": _setting(environ, "SQLITE_SYNCHRONOUS"),
+        "cache_size": -int(_setting(environ, "SQLITE_CACHE_SIZE")),
+        "mmap_size": int(_setting(environ, "SQLITE_MMAP_SIZE")),
+        "temp_store": "MEMORY",
+    }
+    if read_only:
+        del pragmas["journal_mode"]
+        pragmas["query_only"] = 1
+    return pragmas
+
+
+def _set_pragmas(pragmas: dict, dbapi_connection, connection_record):
+    """Applique `pragmas` à une nouvelle connexion SQLite."""
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+def create_engine(
+    environ=os.environ, url: str = None, read_only: bool = False, **kwargs
+) -> sqlalchemy.engine.Engine:
+    """Crée le moteur de la base configurée par `environ`.
+
+    Les connexions sont gardées dans un pool partagé par les threads du
+    serveur (`QueuePool`), y compris avec SQLite, pour ne payer qu'une fois
+    l'ouverture du fichier et l'application des pragmas.
+
+    Args:
+        url (str): URL de la base, `DATABASE_URL` par défaut.
+        read_only (bool): Connexions en lecture seule (réplica).
+        kwargs: Arguments supplémentaires de `sqlalchemy.create_engine`.
+    """
+    url = sqlalchemy.engine.url.make_url(
+        url or environ.get("DATABASE_URL") or DEFAULT_URL
+    )
+    options = {}
+
+    if url.get_backend_name() == "sqlite":
+        if url.database in (None, "", ":memory:"):
+            # Base en mémoire: une seule connexion, sinon chaque connexion
+            # verrait une base différente
+            options["poolclass"] = StaticPool
+        else:
+            options["poolclass"] = QueuePool
+            options["pool_size"] = int(_setting(environ, "DB_POOL_SIZE"))
+            options["max_overflow"] = int(_setting(environ, "DB_MAX_OVERFLOW"))
+            options["pool_timeout"] = int(_setting(environ, "DB_POOL_TIMEOUT"))
+        options["connect_args"] = {
+            "check_same_thread": False,
+            "timeout": float(_setting(environ, "SQLITE_BUSY_TIMEOUT")),
+        }
+    else:
+        options["pool_size"] = int(_setting(environ, "DB_POOL_SIZE"))
+        options["max_overflow"] = int(_setting(environ, "DB_MAX_OVERFLOW"))
+        options["pool_timeout"] = int(_setting(environ, "DB_POOL_TIMEOUT"))
+        options["pool_recycle"] = int(_setting(environ, "DB_POOL_RECYCLE"))
+        options["pool_pre_ping"] = True
+
+    options.update(kwargs)
+    engine = sqlalchemy.create_engine(url, **options)
+
+    if url.get_backend_name() == "sqlite":
+        sqlalchemy.event.listen(
+            engine,
+            "connect",
+            partial(_set_pragmas, sqlite_pragmas(environ, read_only)),
+        )
+    return engine
+
+
+def data_path(name: str, environ=os.environ) -> str:
+    """Chemin du fichier annexe `name` (voir `DATA_DIR`)."""
+    directory = environ.get("DATA_DIR")
+    if not directory:
+        url = sqlalchemy.engine.url.make_url(
+            environ.get("DATABASE_URL") or DEFAULT_URL
+        )
+        directory = DEFAULT_DATA_DIR
+        if url.get_backend_name() == "sqlite" and url.database not in (
+            None,
+            "",
+            ":memory:",
+        ):
+            directory = os.path.dirname(os.path.abspath(url.database))
+    return os.path.join(directory, name)
+
+
+def read_urls(environ=os.environ) -> list:
+    """URLs des bases en lecture seule (voir `DATABASE_READ_URLS`)."""
+    urls = environ.get("DATABASE_READ_URLS") or ""
+    urls = [url.strip() for url in urls.split(",") if url.strip()]
+    if urls:
+        return urls
+
+    url = sqlalchemy.engine.url.make_url(
+        environ.get("DATABASE_URL") or DEFAULT_URL
+    )
+    if url.get_backend_name() == "sqlite" and url.database not in (
+        None,
+        "",
+        ":memory:",
+    ):
+        # Même fichier, ouvert en lecture seule (URI SQLite)
+        return [f"sqlite:///file:{url.database}?mode=ro&uri=true"]
+    return []
+
+
+def create_read_engines(environ=os.environ) -> list:
+    """Moteurs des bases en lecture seule, une liste vide s'il n'y en a
+    pas."""
+    return [
+        create_engine(environ, url=url, read_only=True)
+        for url in read_urls(environ)
+    ]
+
+
+def read_session_factory(engines: list):
+    """Fabrique de sessions en lecture seule, liées tour à tour à chacun des
+    `engines` (répartition des requêtes entre les réplicas)."""
+    sessionmakers = itertools.cycle(
+        [sqlalchemy.orm.sessionmaker(bind=engine) for engine in engines]
+    )
+    return lambda: next(sessionmakers)()
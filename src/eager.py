@@ -0,0 +1,89 @@
+""" LPGL - IUT Metz
+Zachary Arnaise
+
+Chargement anticipé (eager loading) guidé par la sélection GraphQL: seules les
+relations dont les champs sont demandés par la requête sont chargées, en un
+nombre fixe de requêtes SQL.
+"""
+
+import graphene
+from graphql.language import ast
+from sqlalchemy.orm import selectinload
+
+from models import Movie, MoviePersons, Person
+
+# Champs GraphQL résolus via `movie_persons`: relation du modèle vers
+# l'association puis relation de l'association vers le modèle cible.
+# `Movie.status` n'en fait pas partie: il est résolu par la table de référence
+# en mémoire (`references.statuses`), sans jointure
+_THROUGH = {
+    Movie: {
+        "directors": ("crew", "person", Person),
+        "actors": ("crew", "person", Person),
+        "songWriters": ("crew", "person", Person),
+    },
+    Person: {
+        "directed": ("career", "movie", Movie),
+        "playedIn": ("career", "movie", Movie),
+        "composed": ("career", "movie", Movie),
+    },
+}
+
+
+def _selected_fields(nodes: list, fragments: dict) -> dict:
+    """Regroupe les sous-champs sélectionnés par nom, fragments compris.
+
+    Returns:
+        dict: Nom du champ GraphQL -> liste des noeuds AST correspondants.
+    """
+    fields = {}
+    pending = [node.selection_set for node in nodes if node.selection_set]
+    while pending:
+        for selection in pending.pop().selections:
+            if isinstance(selection, ast.Field):
+                fields.setdefault(selection.name.value, []).append(selection)
+            elif isinstance(selection, ast.InlineFragment):
+                pending.append(selection.selection_set)
+            elif isinstance(selection, ast.FragmentSpread):
+                fragment = fragments.get(selection.name.value)
+                if fragment is not None:
+                    pending.append(fragment.selection_set)
+    return fields
+
+
+def _options(model, nodes: list, fragments: dict, parent=None) -> list:
+    """Options de chargement pour `model` selon les champs de `nodes`."""
+    fields = _selected_fields(nodes, fragments)
+    options = []
+
+    # Les champs passant par la même association partagent un seul chargement
+    through = {}
+    for name, (relation, target, target_model) in _THROUGH.get(
+        model, {}
+    ).items():
+        if name in fields:
+            key = (relation, target, target_model)
+            through.setdefault(key, []).extend(fields[name])
+
+    for (relation, target, target_model), subnodes in through.items():
+        loader = parent.selectinload if parent else selectinload
+        association = loader(getattr(model, relation))
+        entity = association.joinedload(getattr(MoviePersons, target))
+        options.append(entity)
+        options.extend(_options(target_model, subnodes, fragments, entity))
+
+    return options
+
+
+def load_options(model, info: graphene.ResolveInfo, path: tuple = ()) -> list:
+    """Options `joinedload`/`selectinload` à appliquer à la requête qui
+    résout le champ courant, d'après sa sélection GraphQL.
+
+    Args:
+        path (tuple): Champs menant aux objets `model` dans la sélection,
+        `("edges", "node")` pour une connexion Relay.
+    """
+    nodes = info.field_asts
+    for name in path:
+        nodes = _selected_fields(nodes, info.fragments).get(name, [])
+    return _options(model, nodes, info.fragments)
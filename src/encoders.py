@@ -0,0 +1,113 @@
+""" LPGL - IUT Metz
+Zachary Arnaise
+
+Sérialisation JSON des réponses GraphQL.
+
+Deux encodeurs sont disponibles: celui de la bibliothèque standard (`json`)
+et `orjson`, plus rapide, s'il est installé. Chacun peut produire la réponse
+d'un seul bloc ou par morceaux (`iter_encode`), pour l'envoyer au client au
+fur et à mesure sans construire la chaîne JSON complète en mémoire.
+
+Seule la sérialisation est découpée: le résultat de l'exécution GraphQL
+(dictionnaires et listes) est toujours entièrement construit avant l'envoi
+du premier morceau. Le pic de mémoire et le délai avant le premier octet
+restent donc dominés par l'exécution.
+"""
+
+import json
+
+try:
+    import orjson
+except ImportError:  # Dépendance optionnelle
+    orjson = None
+
+# Profondeur jusqu'à laquelle les objets et listes sont parcourus en
+# streaming, les valeurs plus profondes sont encodées d'un seul bloc
+STREAM_DEPTH = 4
+
+
+class JSONEncoder(object):
+    """Encodeur de la bibliothèque standard.
+
+    Attributes:
+        chunk_size (int): Taille minimale (en octets) des morceaux produits
+        par `iter_encode`, hormis le dernier.
+    """
+
+    name = "json"
+
+    def __init__(self: object, chunk_size: int = 64 * 1024):
+        """Constructeur."""
+        self.chunk_size = chunk_size
+
+    def encode(self: object, obj: object) -> bytes:
+        """Encode `obj` d'un seul bloc."""
+        return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+    def iter_encode(self: object, obj: object):
+        """Encode `obj` par morceaux d'au moins `chunk_size` octets.
+
+        Les objets et les listes des premiers niveaux sont parcourus élément
+        par élément: seul le morceau en cours est gardé en mémoire, en plus
+        de `obj` lui-même.
+        """
+        buffer = []
+        size = 0
+        for part in self._iter_parts(obj, 0):
+            buffer.append(part)
+            size += len(part)
+            if size >= self.chunk_size:
+                yield b"".join(buffer)
+                buffer = []
+                size = 0
+        if buffer:
+            yield b"".join(buffer)
+
+    def _iter_parts(self: object, obj: object, depth: int):
+        """Fragments JSON de `obj`, dans l'ordre."""
+        if depth >= STREAM_DEPTH or not obj:
+            yield self.encode(obj)
+        elif isinstance(obj, dict):
+            separator = b"{"
+            for key, value in obj.items():
+                yield separator + self.encode(str(key)) + b":"
+                yield from self._iter_parts(value, depth + 1)
+                separator = b","
+            yield b"}"
+        elif isinstance(obj, (list, tuple)):
+            separator = b"["
+            for value in obj:
+                yield separator
+                yield from self._iter_parts(value, depth + 1)
+                separator = b","
+            yield b"]"
+        else:
+            yield self.encode(obj)
+
+
+class OrjsonEncoder(JSONEncoder):
+    """Encodeur basé sur `orjson`.
+
+    Les caractères non ASCII sont écrits tels quels en UTF-8, sans
+    échappement `\\uXXXX`.
+    """
+
+    name = "orjson"
+
+    def encode(self: object, obj: object) -> bytes:
+        """Encode `obj` d'un seul bloc."""
+        return orjson.dumps(obj)
+
+
+def get_encoder(name: str = None, **kwargs) -> JSONEncoder:
+    """Encodeur `name` (`json` ou `orjson`), le plus rapide disponible si
+    `name` n'est pas précisé."""
+    if name is None:
+        name = "json" if orjson is None else "orjson"
+    if name == "json":
+        return JSONEncoder(**kwargs)
+    if name == "orjson":
+        if orjson is None:
+            raise ValueError("orjson n'est pas installé.")
+        return OrjsonEncoder(**kwargs)
+    raise ValueError(f"Encodeur JSON inconnu: {name}")
@@ -0,0 +1,87 @@
+""" LPGL - IUT Metz
+Zachary Arnaise
+
+Bus d'événements en mémoire du processus, utilisé par les subscriptions
+GraphQL.
+
+Les mutations publient un événement après le commit de leur transaction; chaque
+abonné (une subscription d'un client WebSocket) le reçoit dans sa propre file
+asyncio bornée. La publication ne bloque jamais: si un abonné ne consomme pas
+assez vite et que sa file est pleine, ses événements les plus anciens sont
+abandonnés.
+"""
+
+import asyncio
+import threading
+from collections import namedtuple
+
+# Sujets des événements publiés par les mutations
+MOVIE_CREATED = "movie_created"
+PERSON_CREATED = "person_created"
+
+Event = namedtuple("Event", "topic id")
+Event.__doc__ = """Événement publié: sujet et ID de l'entité concernée."""
+
+
+class Subscriber(object):
+    """File d'événements d'un abonné, consommée sur sa boucle asyncio.
+
+    Attributes:
+        dropped (int): Nombre d'événements abandonnés faute de place.
+    """
+
+    def __init__(
+        self: object, loop: asyncio.AbstractEventLoop, max_size: int = 100
+    ):
+        """Constructeur."""
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=max_size)
+        self.dropped = 0
+
+    def _put(self: object, event: Event):
+        """Ajoute un événement à la file, appelé depuis la boucle de
+        l'abonné."""
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    async def get(self: object) -> Event:
+        """Attend le prochain événement."""
+        return await self.queue.get()
+
+
+class EventBus(object):
+    """Bus d'événements, utilisable depuis n'importe quel thread."""
+
+    def __init__(self: object):
+        """Constructeur."""
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self: object, max_size: int = 100) -> Subscriber:
+        """Abonne la boucle asyncio courante à tous les événements."""
+        subscriber = Subscriber(asyncio.get_running_loop(), max_size)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self: object, subscriber: Subscriber):
+        """Désabonne un abonné."""
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self: object, topic: str, id_: int):
+        """Publie un événement à tous les abonnés."""
+        event = Event(topic, id_)
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber._put, event)
+            except RuntimeError:
+                # Boucle fermée, l'abonné n'existe plus
+                self.unsubscribe(subscriber)
+
+
+bus = EventBus()
@@ -0,0 +1,168 @@
+""" LPGL - IUT Metz
+Zachary Arnaise
+
+Recherche plein texte sur les personnes et les films, via des index SQLite
+FTS5.
+
+Les index `person_search` et `movie_search` sont des tables FTS5 à contenu
+externe (les données restent dans `person` et `movie`), tenues à jour par des
+triggers: toute insertion, y compris via les mutations `createPerson` et
+`createMovie`, est donc immédiatement cherchable. Le tokenizer `unicode61`
+avec `remove_diacritics 2` rend la recherche insensible à la casse et aux
+accents ("element" trouve "Le Cinquième Élément").
+
+FTS5 n'existant que sous SQLite, les autres bases (PostgreSQL) utilisent une
+recherche plus simple: chaque mot doit commencer l'un des mots des colonnes
+indexées (`ILIKE`, sans classement par pertinence ni insensibilité aux
+accents).
+"""
+
+import re
+
+from sqlalchemy import and_, or_, text
+
+from models import Movie, Person
+
+# Table indexée -> (table FTS5, colonnes indexées)
+INDEXES = {
+    "person": ("person_search", ("firstName", "lastName")),
+    "movie": ("movie_search", ("frenchTitle", "originalTitle")),
+}
+
+_WORDS = re.compile(r"\w+", re.UNICODE)
+
+
+def create_indexes(connection):
+    """Crée les index FTS5 et leurs triggers s'ils n'existent pas encore.
+
+    Un index nouvellement créé est rempli à partir de sa table. Sans effet
+    hors SQLite.
+    """
+    if connection.dialect.name != "sqlite":
+        return
+    for table, (index, columns) in INDEXES.items():
+        exists = connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE name = :name"),
+            name=index,
+        ).first()
+        if exists:
+            continue
+
+        names = ", ".join(f'"{column}"' for column in columns)
+        new = ", ".join(f'new."{column}"' for column in columns)
+        old = ", ".join(f'old."{column}"' for column in columns)
+        connection.execute(
+            f"CREATE VIRTUAL TABLE {index} USING fts5({names}, "
+            f"content='{table}', content_rowid='id', "
+            f"tokenize='unicode61 remove_diacritics 2')"
+        )
+        connection.execute(
+            f"CREATE TRIGGER {index}_ai AFTER INSERT ON {table} BEGIN "
+            f"INSERT INTO {index}(rowid, {names}) VALUES (new.id, {new}); "
+            f"END"
+        )
+        connection.execute(
+            f"CREATE TRIGGER {index}_ad AFTER DELETE ON {table} BEGIN "
+            f"INSERT INTO {index}({index}, rowid, {names}) "
+            f"VALUES ('delete', old.id, {old}); "
+            f"END"
+        )
+        connection.execute(
+            f"CREATE TRIGGER {index}_au AFTER UPDATE ON {table} BEGIN "
+            f"INSERT INTO {index}({index}, rowid, {names}) "
+            f"VALUES ('delete', old.id, {old}); "
+            f"INSERT INTO {index}(rowid, {names}) VALUES (new.id, {new}); "
+            f"END"
+        )
+        connection.execute(f"INSERT INTO {index}({index}) VALUES ('rebuild')")
+
+
+def match_expression(q: str) -> str:
+    """Transforme la saisie de l'utilisateur en expression FTS5.
+
+    Chaque mot est cherché comme préfixe ("arr" trouve "Arrête-moi"), tous les
+    mots doivent être présents. Renvoie `None` si la saisie ne contient aucun
+    mot.
+    """
+    words = _WORDS.findall(q or "")
+    if not words:
+        return None
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def _ranked_ids(session, index: str, expression: str, first: int) -> list:
+    """IDs (et score bm25) des `first` meilleurs résultats d'un index."""
+    return session.execute(
+        text(
+            f"SELECT rowid, rank FROM {index} WHERE {index} MATCH :q "
+            f"ORDER BY rank LIMIT :first"
+        ),
+        {"q": expression, "first": first},
+    ).fetchall()
+
+
+def _escape_like(word: str) -> str:
+    """Échappe les caractères spéciaux de `LIKE` (`%`, `_`) d'un mot, avec
+    `\\` comme caractère d'échappement."""
+    return word.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _like_ranked_ids(session, model, words: list, first: int) -> list:
+    """IDs des `first` premiers résultats sans index FTS5, tous au même
+    rang."""
+    columns = [
+        getattr(model, column) for column in INDEXES[model.__tablename__][1]
+    ]
+    conditions = [
+        or_(
+            *(
+                condition
+                for column in columns
+                for condition in (
+                    column.ilike(f"{word}%", escape="\\"),
+                    column.ilike(f"% {word}%", escape="\\"),
+                )
+            )
+        )
+        for word in map(_escape_like, words)
+    ]
+    query = session.query(model.id).filter(and_(*conditions))
+    return [(id_, 0) for id_, in query.order_by(model.id).limit(first)]
+
+
+def search(session, q: str, first: int) -> list:
+    """Personnes et films correspondant à `q`, les plus pertinents d'abord.
+
+    Returns:
+        list: Au plus `first` objets `Person` ou `Movie`.
+    """
+    expression = match_expression(q)
+    if expression is None or first <= 0:
+        return []
+
+    fts = session.get_bind().dialect.name == "sqlite"
+    words = _WORDS.findall(q)
+    ranked = []
+    for model in (Person, Movie):
+        index = INDEXES[model.__tablename__][0]
+        if fts:
+            rows = _ranked_ids(session, index, expression, first)
+        else:
+            rows = _like_ranked_ids(session, model, words, first)
+        ranked.extend((rank, model, id_) for id_, rank in rows)
+    # Le rang bm25 est négatif, les meilleurs résultats ont le plus petit
+    ranked.sort(key=lambda row: row[0])
+    ranked = ranked[:first]
+
+    entities = {}
+    for model in (Person, Movie):
+        ids = [id_ for _, row_model, id_ in ranked if row_model is model]
+        if ids:
+            for entity in session.query(model).filter(model.id.in_(ids)):
+                entities[(model, entity.id)] = entity
+
+    return [
+        entities[(model, id_)]
+        for _, model, id_ in ranked
+        if (model, id_) in entities
+    ]
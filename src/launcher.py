@@ -0,0 +1,422 @@
+""" LPGL - IUT Metz
+Zachary Arnaise
+
+Lanceur de production: plusieurs processus waitress (workers) partageant le
+même socket d'écoute, pour exécuter les requêtes GraphQL sur tous les coeurs
+malgré le GIL.
+
+    python launcher.py
+
+Configuration par l'environnement:
+- `HOST`, `PORT`: adresse d'écoute (`0.0.0.0:80` par défaut);
+- `WEB_CONCURRENCY`: nombre de workers (nombre de coeurs par défaut);
+- `WAITRESS_THREADS`: threads par worker (4 par défaut);
+- `WARMUP_TIMEOUT`: délai maximal de démarrage d'un worker, en secondes;
+- `GRACEFUL_TIMEOUT`: délai laissé aux requêtes en cours à l'arrêt d'un
+  worker, en secondes;
+- `MAX_EARLY_EXITS`: nombre d'arrêts consécutifs de workers peu après leur
+  démarrage (moins de `MIN_UPTIME` secondes) au-delà duquel le lanceur
+  s'arrête (5 par défaut);
+- `METRICS_DIR`: dossier où les workers écrivent leurs métriques, sommées
+  par la route `/metrics` de chacun d'eux (dossier temporaire par défaut).
+
+Chaque worker importe l'application après le fork (moteur, pool de connexions
+et sessions propres au processus) et se prépare avant d'accepter des
+connexions: construction du schéma, configuration des mappers SQLAlchemy,
+chargement des données de référence et exécution d'une requête d'amorçage.
+
+Signaux reçus par le processus principal:
+- `SIGHUP`: rechargement sans interruption, de nouveaux workers (avec le
+  nouveau code) sont démarrés puis les anciens arrêtés une fois les nouveaux
+  prêts;
+- `SIGTERM`, `SIGINT`: arrêt, les requêtes en cours sont terminées.
+Un worker qui s'arrête de manière inattendue est remplacé, après un délai
+doublé à chaque nouvel arrêt peu après le démarrage (de 0,5 à 30 secondes).
+
+Le lanceur ne sert que l'application WSGI (`app`): les subscriptions, servies
+en WebSocket, ne sont disponibles qu'avec le point d'entrée ASGI (`asgi`)
+lancé par uvicorn en un seul processus, le bus d'événements (`events`) étant
+propre à chaque processus.
+"""
+
+import _thread
+import logging
+import os
+import select
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+import falcon.testing
+import sqlalchemy.orm
+import waitress.server
+
+import metrics
+
+logger = logging.getLogger("launcher")
+
+# Durée de vie en dessous de laquelle l'arrêt d'un worker compte comme un
+# échec de démarrage, en secondes
+MIN_UPTIME = 30
+# Délais avant le remplacement d'un worker arrêté, en secondes
+RESPAWN_DELAY = 0.5
+MAX_RESPAWN_DELAY = 30
+
+# Requête exécutée par chaque worker avant d'accepter des connexions
+PRIMING_QUERY = (
+    "{ moviesConnection(first: 1) { edges { node { id frenchTitle status "
+    "directors { id fullName } actors { id fullName } } } } }"
+)
+
+
+def _env_int(name: str, default: int) -> int:
+    """Valeur entière d'une variable d'environnement."""
+    return int(os.environ.get(name) or default)
+
+
+def create_socket(host: str, port: int) -> socket.socket:
+    """Socket d'écoute, créé avant le fork et partagé par les workers."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(1024)
+    sock.setblocking(False)
+    return sock
+
+
+def warm_up():
+    """Importe et prépare l'application.
+
+    Returns:
+        falcon.App: Application WSGI, prête à servir.
+    """
+    # Moteur, migrations, schéma et données de référence (voir `app`)
+    import app
+
+    sqlalchemy.orm.configure_mappers()
+    result = falcon.testing.simulate_post(
+        app.app, "/graphql", json={"query": PRIMING_QUERY}
+    )
+    if result.status_code != 200:
+        raise RuntimeError(f"Requête d'amorçage en échec: {result.text}")
+    return app.app
+
+
+class Worker(object):
+    """Processus worker, vu depuis le processus principal."""
+
+    def __init__(self: object, pid: int, ready_fd: int):
+        """Constructeur."""
+        self.pid = pid
+        self.ready_fd = ready_fd
+        self.ready = False
+        self.started = time.monotonic()
+
+
+def _busy(server: waitress.server.BaseWSGIServer) -> bool:
+    """Vrai si une requête est en cours de traitement ou d'envoi."""
+    return any(
+        channel.requests or channel.total_outbufs_len
+        for channel in list(server.active_channels.values())
+    )
+
+
+def _serve(
+    sock: socket.socket,
+    ready_fd: int,
+    threads: int,
+    timeout: int,
+    metrics_dir: str = None,
+):
+    """Corps d'un worker: préparation, puis service des requêtes jusqu'à
+    `SIGTERM`."""
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    if metrics_dir is not None:
+        metrics.registry.share(metrics_dir)
+    application = warm_up()
+    server = waitress.server.create_server(
+        application, sockets=[sock], threads=threads
+    )
+
+    # À l'arrêt: plus de nouvelles connexions, puis arrêt de la boucle
+    # waitress une fois les requêtes en cours terminées (ou le délai dépassé)
+    stopping = threading.Event()
+
+    def drain():
+        stopping.wait()
+        deadline = time.monotonic() + timeout
+        while _busy(server) and time.monotonic() < deadline:
+            time.sleep(0.1)
+        _thread.interrupt_main()
+
+    def stop(signum, frame):
+        server.accepting = False
+        stopping.set()
+
+    threading.Thread(target=drain, daemon=True).start()
+    signal.signal(signal.SIGTERM, stop)
+    os.write(ready_fd, b"1")
+    os.close(ready_fd)
+    logger.info("Worker %d prêt", os.getpid())
+    try:
+        server.run()
+    finally:
+        metrics.registry.dump()
+
+
+class Launcher(object):
+    """Processus principal: démarre, surveille et recharge les workers."""
+
+    def __init__(
+        self: object,
+        sock: socket.socket,
+        workers: int,
+        threads: int = 4,
+        warmup_timeout: int = 60,
+        graceful_timeout: int = 30,
+        metrics_dir: str = None,
+        max_early_exits: int = 5,
+    ):
+        """Constructeur."""
+        self.sock = sock
+        self.size = workers
+        self.threads = threads
+        self.warmup_timeout = warmup_timeout
+        self.graceful_timeout = graceful_timeout
+        self.metrics_dir = metrics_dir
+        self.max_early_exits = max_early_exits
+        self.workers = {}
+        self._signals = []
+        # Arrêts consécutifs peu après le démarrage, workers à remplacer et
+        # date de leur remplacement
+        self._early_exits = 0
+        self._pending = 0
+        self._respawn_at = 0
+
+    def spawn(self: object) -> Worker:
+        """Démarre un worker."""
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            for worker in self.workers.values():
+                os.close(worker.ready_fd)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.default_int_handler)
+            status = 0
+            try:
+                _serve(
+                    self.sock,
+                    write_fd,
+                    self.threads,
+                    self.graceful_timeout,
+                    self.metrics_dir,
+                )
+            except KeyboardInterrupt:
+                pass
+            except BaseException:
+                logger.exception("Arrêt du worker %d", os.getpid())
+                status = 1
+            finally:
+                logging.shutdown()
+                os._exit(status)
+
+        os.close(write_fd)
+        worker = Worker(pid, read_fd)
+        self.workers[pid] = worker
+        return worker
+
+    def _wait_ready(self: object, workers: list) -> bool:
+        """Attend que `workers` soient prêts (préparation terminée)."""
+        deadline = time.monotonic() + self.warmup_timeout
+        pending = {
+            worker.ready_fd: worker for worker in workers if not worker.ready
+        }
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            readable, _, _ = select.select(list(pending), [], [], remaining)
+            for fd in readable:
+                worker = pending.pop(fd)
+                # Fin de fichier sans message: le worker s'est arrêté
+                if not os.read(fd, 1):
+                    return False
+                worker.ready = True
+        return True
+
+    def start_generation(self: object) -> list:
+        """Démarre `size` workers: le premier seul (il applique les
+        migrations), puis les autres en parallèle.
+
+        Returns:
+            list: Workers démarrés, `None` si l'un d'eux n'a pas pu être
+            préparé (ils sont alors arrêtés).
+        """
+        started = [self.spawn()]
+        if self._wait_ready(started):
+            started += [self.spawn() for _ in range(self.size - 1)]
+            if self._wait_ready(started):
+                return started
+        self.stop(started, graceful=False)
+        return None
+
+    def stop(self: object, workers: list, graceful: bool = True):
+        """Arrête `workers` et attend leur fin."""
+        deadline = time.monotonic() + self.graceful_timeout + 5
+        for worker in workers:
+            self._kill(worker, signal.SIGTERM if graceful else signal.SIGKILL)
+        while any(worker.pid in self.workers for worker in workers):
+            if time.monotonic() > deadline:
+                for worker in workers:
+                    self._kill(worker, signal.SIGKILL)
+            time.sleep(0.1)
+            self.reap()
+
+    def _kill(self: object, worker: Worker, signum: int):
+        """Envoie `signum` à `worker`, s'il existe encore."""
+        try:
+            os.kill(worker.pid, signum)
+        except ProcessLookupError:
+            pass
+
+    def reap(self: object):
+        """Récupère les workers terminés."""
+        while self.workers:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            worker = self.workers.pop(pid, None)
+            if worker is not None:
+                os.close(worker.ready_fd)
+
+    def replace_stopped(self: object, current: list) -> bool:
+        """Remplace les workers de `current` arrêtés de manière inattendue.
+
+        Le délai avant remplacement double à chaque arrêt consécutif peu
+        après le démarrage (`MIN_UPTIME`), jusqu'à `MAX_RESPAWN_DELAY`.
+
+        Returns:
+            bool: Faux si `max_early_exits` workers se sont arrêtés de suite
+            peu après leur démarrage: le lanceur doit s'arrêter.
+        """
+        self.reap()
+        now = time.monotonic()
+        for worker in list(current):
+            if worker.pid in self.workers:
+                continue
+            current.remove(worker)
+            self._pending += 1
+            if now - worker.started < MIN_UPTIME:
+                self._early_exits += 1
+            else:
+                self._early_exits = 0
+            if self._early_exits >= self.max_early_exits:
+                return False
+            delay = min(
+                RESPAWN_DELAY * 2 ** max(self._early_exits - 1, 0),
+                MAX_RESPAWN_DELAY,
+            )
+            self._respawn_at = max(self._respawn_at, now + delay)
+            logger.warning(
+                "Worker %d arrêté, remplacé dans %.1f s", worker.pid, delay
+            )
+
+        if self._pending and now >= self._respawn_at:
+            current.extend(self.spawn() for _ in range(self._pending))
+            self._pending = 0
+        return True
+
+    def _on_signal(self: object, signum, frame):
+        """Note un signal, traité par la boucle de `run`."""
+        self._signals.append(signum)
+
+    def run(self: object):
+        """Démarre les workers puis les surveille jusqu'à l'arrêt."""
+        for signum in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, self._on_signal)
+
+        current = self.start_generation()
+        if current is None:
+            logger.error("Démarrage des workers impossible")
+            sys.exit(1)
+        logger.info(
+            "%d workers à l'écoute sur %s:%d",
+            len(current),
+            *self.sock.getsockname()[:2],
+        )
+
+        while True:
+            if not self._signals:
+                time.sleep(0.5)
+            while self._signals:
+                signum = self._signals.pop(0)
+                if signum == signal.SIGHUP:
+                    logger.info("Rechargement des workers")
+                    generation = self.start_generation()
+                    if generation is None:
+                        logger.error("Rechargement impossible, workers gardés")
+                    else:
+                        self.stop(current)
+                        current = generation
+                        self._pending = 0
+                else:
+                    logger.info("Arrêt des workers")
+                    self.stop(list(self.workers.values()))
+                    return
+
+            # Remplacement des workers arrêtés de manière inattendue
+            if not self.replace_stopped(current):
+                logger.error(
+                    "%d workers arrêtés peu après leur démarrage, arrêt",
+                    self._early_exits,
+                )
+                self.stop(list(self.workers.values()))
+                sys.exit(1)
+
+
+def main():
+    # Même configuration que `app`, les messages du lanceur étant toujours
+    # affichés
+    logging.basicConfig(
+        level=os.environ.get("LOG_LEVEL", "WARNING").upper(),
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    )
+    logger.setLevel(logging.INFO)
+    sock = create_socket(
+        os.environ.get("HOST") or "0.0.0.0", _env_int("PORT", 80)
+    )
+
+    # Métriques des workers précédents (dossier configuré) effacées
+    metrics_dir = os.environ.get("METRICS_DIR")
+    if metrics_dir:
+        os.makedirs(metrics_dir, exist_ok=True)
+        for name in os.listdir(metrics_dir):
+            if name.endswith(".json"):
+                os.remove(os.path.join(metrics_dir, name))
+    else:
+        metrics_dir = tempfile.mkdtemp(prefix="graphql-metrics-")
+    try:
+        Launcher(
+            sock,
+            workers=_env_int("WEB_CONCURRENCY", os.cpu_count() or 1),
+            threads=_env_int("WAITRESS_THREADS", 4),
+            warmup_timeout=_env_int("WARMUP_TIMEOUT", 60),
+            graceful_timeout=_env_int("GRACEFUL_TIMEOUT", 30),
+            metrics_dir=metrics_dir,
+            max_early_exits=_env_int("MAX_EARLY_EXITS", 5),
+        ).run()
+    finally:
+        if not os.environ.get("METRICS_DIR"):
+            shutil.rmtree(metrics_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
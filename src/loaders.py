@@ -0,0 +1,92 @@
+""" LPGL - IUT Metz
+Zachary Arnaise
+
+DataLoaders utilisés par les resolvers pour regrouper les chargements de
+l'équipe d'un film (`crew`) et de la carrière d'une personne (`career`) en une
+seule requête SQL `IN (...)` par niveau de champ.
+"""
+
+from promise import Promise
+from promise.dataloader import DataLoader
+
+from models import Movie, MoviePersons, Person
+from references import roles
+
+
+class _RoleLoader(DataLoader):
+    """Charge par lots les entités liées via `movie_persons` pour un rôle.
+
+    Attributes:
+        key (str): Colonne de `MoviePersons` utilisée comme clé de lot.
+        model (Base): Modèle chargé pour chaque clé.
+        relation (str): Relation de `MoviePersons` vers `model`.
+    """
+
+    key = None
+    model = None
+    relation = None
+
+    def __init__(self: object, session, role: str):
+        """Constructeur."""
+        super().__init__()
+        self.session = session
+        self.role = role
+
+    def batch_load_fn(self: object, keys: list):
+        """Une seule requête pour toutes les clés demandées."""
+        column = getattr(MoviePersons, self.key)
+        role_id = roles.id_of(self.session, self.role)
+        rows = (
+            self.session.query(column, self.model)
+            .join(self.model, getattr(MoviePersons, self.relation))
+            .filter(column.in_(keys), MoviePersons.person_role_id == role_id)
+            .order_by(MoviePersons.id)
+            .all()
+        )
+
+        grouped = {key: [] for key in keys}
+        for key, entity in rows:
+            grouped[key].append(entity)
+        return Promise.resolve([grouped[key] for key in keys])
+
+
+class CrewLoader(_RoleLoader):
+    """Personnes ayant un rôle donné sur un film, par `movie_id`."""
+
+    key = "movie_id"
+    model = Person
+    relation = "person"
+
+
+class CareerLoader(_RoleLoader):
+    """Films dans lesquels une personne a eu un rôle donné, par `person_id`."""
+
+    key = "person_id"
+    model = Movie
+    relation = "movie"
+
+
+class Loaders(object):
+    """DataLoaders d'une requête GraphQL.
+
+    Une instance est créée pour chaque requête HTTP, le cache des DataLoaders
+    ne survit donc pas à la requête.
+    """
+
+    def __init__(self: object, session):
+        """Constructeur."""
+        self.session = session
+        self._crew = {}
+        self._career = {}
+
+    def crew(self: object, role: str) -> CrewLoader:
+        """Loader des personnes d'un film ayant le rôle `role`."""
+        if role not in self._crew:
+            self._crew[role] = CrewLoader(self.session, role)
+        return self._crew[role]
+
+    def career(self: object, role: str) -> CareerLoader:
+        """Loader des films d'une personne ayant eu le rôle `role`."""
+        if role not in self._career:
+            self._career[role] = CareerLoader(self.session, role)
+        return self._career[role]
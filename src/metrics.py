@@ -0,0 +1,344 @@
+""" LPGL - IUT Metz
+Zachary Arnaise
+
+Métriques du serveur (compteurs et histogrammes), exposées au format texte
+de Prometheus par la route `/metrics`:
+https://prometheus.io/docs/instrumenting/exposition_formats/
+
+Les métriques sont propres à chaque processus. Avec plusieurs processus
+(voir `launcher`), chacun écrit régulièrement ses valeurs dans un dossier
+partagé (`Registry.share`) et la route `/metrics` expose leur somme.
+"""
+
+import bisect
+import contextlib
+import glob
+import json
+import os
+import threading
+import time
+
+import sqlalchemy
+
+# Bornes des histogrammes de durée, en secondes
+DURATION_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+)
+# Bornes des histogrammes de nombre de requêtes SQL
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+# Bornes des histogrammes de nombre d'objets chargés
+OBJECT_BUCKETS = (0, 10, 100, 1000, 10000, 100000, 1000000)
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    """Labels d'une ligne d'exposition: `{name="value",...}`."""
+    labels = [
+        '{}="{}"'.format(
+            name,
+            str(value)
+            .replace("\\", "\\\\")
+            .replace('"', '\\"')
+            .replace("\n", "\\n"),
+        )
+        for name, value in zip(names, values)
+    ]
+    if extra:
+        labels.append(extra)
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+
+def _format_value(value: float) -> str:
+    """Valeur d'une ligne d'exposition."""
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter(object):
+    """Compteur, avec un total par combinaison de labels."""
+
+    type = "counter"
+
+    def __init__(self: object, name: str, documentation: str, labels=()):
+        """Constructeur."""
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self: object, amount: float = 1, **labels):
+        """Incrémente le compteur."""
+        key = tuple(labels[name] for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def snapshot(self: object) -> list:
+        """Valeurs du compteur, sérialisables en JSON."""
+        with self._lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+    @staticmethod
+    def merge(values: dict, snapshot: list):
+        """Ajoute les valeurs `snapshot` d'un processus à `values`."""
+        for key, value in snapshot:
+            key = tuple(key)
+            values[key] = values.get(key, 0) + value
+
+    def samples(self: object, values: dict = None):
+        """Lignes d'exposition du compteur, pour ses propres valeurs ou pour
+        `values`."""
+        if values is None:
+            with self._lock:
+                values = dict(self._values)
+        for key, value in sorted(values.items()):
+            labels = _format_labels(self.labels, key)
+            yield f"{self.name}{labels} {_format_value(value)}"
+
+
+class Histogram(object):
+    """Histogramme, avec une distribution par combinaison de labels."""
+
+    type = "histogram"
+
+    def __init__(
+        self: object,
+        name: str,
+        documentation: str,
+        labels=(),
+        buckets: tuple = DURATION_BUCKETS,
+    ):
+        """Constructeur."""
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self: object, value: float, **labels):
+        """Ajoute une observation."""
+        key = tuple(labels[name] for name in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(key, (None, 0))
+            if counts is None:
+                counts = [0] * (len(self.buckets) + 1)
+            counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    def snapshot(self: object) -> list:
+        """Distributions de l'histogramme, sérialisables en JSON."""
+        with self._lock:
+            return [
+                [list(key), [list(counts), total]]
+                for key, (counts, total) in self._values.items()
+            ]
+
+    @staticmethod
+    def merge(values: dict, snapshot: list):
+        """Ajoute les distributions `snapshot` d'un processus à `values`."""
+        for key, (counts, total) in snapshot:
+            key = tuple(key)
+            previous = values.get(key)
+            if previous is not None:
+                counts = [a + b for a, b in zip(previous[0], counts)]
+                total += previous[1]
+            values[key] = (counts, total)
+
+    def samples(self: object, values: dict = None):
+        """Lignes d'exposition de l'histogramme (cumulées par borne), pour
+        ses propres distributions ou pour `values`."""
+        if values is None:
+            with self._lock:
+                values = {
+                    key: (list(counts), total)
+                    for key, (counts, total) in self._values.items()
+                }
+        for key, (counts, total) in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                labels = _format_labels(
+                    self.labels, key, f'le="{_format_value(bound)}"'
+                )
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labels, key)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class Registry(object):
+    """Ensemble des métriques exposées.
+
+    Attributes:
+        directory (str): Dossier partagé par les processus (`share`), `None`
+            si les métriques du seul processus courant sont exposées.
+    """
+
+    def __init__(self: object):
+        """Constructeur."""
+        self._metrics = []
+        self.directory = None
+
+    def counter(self: object, *args, **kwargs) -> Counter:
+        """Crée et enregistre un compteur."""
+        metric = Counter(*args, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self: object, *args, **kwargs) -> Histogram:
+        """Crée et enregistre un histogramme."""
+        metric = Histogram(*args, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def share(self: object, directory: str, interval: float = 5):
+        """Partage les métriques du processus courant avec ceux qui écrivent
+        dans `directory`.
+
+        Les valeurs du processus sont écrites dans `<directory>/<pid>.json`
+        toutes les `interval` secondes, et à chaque exposition: celles des
+        autres processus ont au plus `interval` secondes de retard. Les
+        fichiers des processus arrêtés sont gardés, les compteurs restant
+        ainsi croissants.
+        """
+        self.directory = directory
+
+        def _dump_periodically():
+            while True:
+                time.sleep(interval)
+                self.dump()
+
+        threading.Thread(target=_dump_periodically, daemon=True).start()
+
+    def dump(self: object):
+        """Écrit les valeurs du processus courant dans le dossier partagé."""
+        if self.directory is None:
+            return
+        path = os.path.join(self.directory, f"{os.getpid()}.json")
+        snapshot = {metric.name: metric.snapshot() for metric in self._metrics}
+        with open(path + ".tmp", "w") as file:
+            json.dump(snapshot, file)
+        os.replace(path + ".tmp", path)
+
+    def _collect(self: object) -> dict:
+        """Somme des valeurs de tous les processus du dossier partagé,
+        indexées par nom de métrique."""
+        values = {metric.name: {} for metric in self._metrics}
+        for path in glob.glob(os.path.join(self.directory, "*.json")):
+            try:
+                with open(path) as file:
+                    snapshot = json.load(file)
+            except (OSError, ValueError):
+                continue  # Fichier retiré entre-temps
+            for metric in self._metrics:
+                metric.merge(values[metric.name], snapshot.get(metric.name, []))
+        return values
+
+    def expose(self: object) -> str:
+        """Toutes les métriques, au format texte de Prometheus."""
+        values = {}
+        if self.directory is not None:
+            self.dump()
+            values = self._collect()
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples(values.get(metric.name)))
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+operations = registry.counter(
+    "graphql_operations_total",
+    "Opérations GraphQL exécutées.",
+    labels=("operation", "status"),
+)
+operation_duration = registry.histogram(
+    "graphql_operation_duration_seconds",
+    "Durée d'exécution des opérations GraphQL.",
+    labels=("operation",),
+)
+operation_statements = registry.histogram(
+    "graphql_operation_sql_statements",
+    "Nombre de requêtes SQL par opération GraphQL.",
+    labels=("operation",),
+    buckets=COUNT_BUCKETS,
+)
+operation_sql_duration = registry.histogram(
+    "graphql_operation_sql_duration_seconds",
+    "Durée cumulée des requêtes SQL par opération GraphQL.",
+    labels=("operation",),
+)
+resolver_duration = registry.histogram(
+    "graphql_resolver_duration_seconds",
+    "Durée des resolvers des champs objets et listes d'objets.",
+    labels=("type", "field"),
+)
+statement_duration = registry.histogram(
+    "sql_statement_duration_seconds",
+    "Durée des requêtes SQL.",
+)
+session_objects = registry.histogram(
+    "sqlalchemy_session_objects",
+    "Objets chargés par les sessions d'une requête.",
+    buckets=OBJECT_BUCKETS,
+)
+
+
+class SQLStats(object):
+    """Nombre et durée cumulée (en secondes) des requêtes SQL exécutées."""
+
+    def __init__(self: object):
+        """Constructeur."""
+        self.statements = 0
+        self.duration = 0.0
+
+
+_local = threading.local()
+
+
+@contextlib.contextmanager
+def collect_sql():
+    """Compte les requêtes SQL exécutées par le thread courant dans le
+    bloc `with`."""
+    stats = SQLStats()
+    previous = getattr(_local, "stats", None)
+    _local.stats = stats
+    try:
+        yield stats
+    finally:
+        _local.stats = previous
+
+
+def instrument_engine(engine: sqlalchemy.engine.Engine):
+    """Mesure la durée des requêtes SQL exécutées par `engine`."""
+
+    @sqlalchemy.event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, *args):
+        conn.info.setdefault("statement_start", []).append(time.perf_counter())
+
+    @sqlalchemy.event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, *args):
+        duration = time.perf_counter() - conn.info["statement_start"].pop()
+        statement_duration.observe(duration)
+        stats = getattr(_local, "stats", None)
+        if stats is not None:
+            stats.statements += 1
+            stats.duration += duration
@@ -0,0 +1,42 @@
+""" LPGL - IUT Metz
+Zachary Arnaise
+
+Migrations de la base, appliquées au démarrage du serveur.
+
+Chaque étape est idempotente: elle peut être rejouée sur une base déjà à jour
+sans effet.
+"""
+
+import sqlalchemy
+
+import data_version
+import fulltext
+from models import Base
+
+
+def create_indexes(connection):
+    """Crée les index déclarés dans les modèles qui n'existent pas encore en
+    base."""
+    inspector = sqlalchemy.inspect(connection)
+    for table in Base.metadata.sorted_tables:
+        existing = {
+            index["name"] for index in inspector.get_indexes(table.name)
+        }
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(connection)
+
+
+# Étapes de migration, dans leur ordre d'application
+MIGRATIONS = [
+    create_indexes,
+    fulltext.create_indexes,
+    data_version.create_table,
+]
+
+
+def migrate(engine: sqlalchemy.engine.Engine):
+    """Applique toutes les migrations, dans une seule transaction."""
+    with engine.begin() as connection:
+        for step in MIGRATIONS:
+            step(connection)
@@ -2,7 +2,7 @@
 Zachary Arnaise
 """
 
-from sqlalchemy import Column, Date, ForeignKey, Integer, String
+from sqlalchemy import Column, Date, ForeignKey, Index, Integer, String
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relation
 
@@ -13,6 +13,11 @@ class Person(Base):
     """Représente une personne."""
 
     __tablename__ = "person"
+    __table_args__ = (
+        # Recherche par prénom ou par nom (`Query.person`)
+        Index("ix_person_first_name", "firstName"),
+        Index("ix_person_last_name", "lastName"),
+    )
     id = Column(Integer, primary_key=True)
     firstName = Column(String, nullable=False)
     lastName = Column(String, nullable=False)
@@ -34,6 +39,14 @@ class MoviePersons(Base):
     """Lien entre `Movie` `Person`, `PersonRole` (relation many-to-many)."""
 
     __tablename__ = "movie_persons"
+    __table_args__ = (
+        # Liste des personnes ayant un rôle donné (acteurs, réalisateurs, ...)
+        Index("ix_movie_persons_role_person", "person_role_id", "person_id"),
+        # Équipe d'un film et carrière d'une personne, par rôle (DataLoaders
+        # et chargement anticipé)
+        Index("ix_movie_persons_movie_role", "movie_id", "person_role_id"),
+        Index("ix_movie_persons_person_role", "person_id", "person_role_id"),
+    )
     id = Column(Integer, primary_key=True)
     movie_id = Column(Integer, ForeignKey("movie.id"), primary_key=True)
     person_id = Column(Integer, ForeignKey("person.id"), primary_key=True)
@@ -58,6 +71,11 @@ class Movie(Base):
     """Représente un film."""
 
     __tablename__ = "movie"
+    __table_args__ = (
+        # Recherche par titre (`Query.movie`)
+        Index("ix_movie_french_title", "frenchTitle"),
+        Index("ix_movie_original_title", "originalTitle"),
+    )
     id = Column(Integer, primary_key=True)
     frenchTitle = Column(String, nullable=False)
     originalTitle = Column(String, nullable=False)
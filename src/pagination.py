@@ -0,0 +1,108 @@
+""" LPGL - IUT Metz
+Zachary Arnaise
+
+Pagination par curseur (connexions Relay) basée sur la clé primaire.
+
+La page suivante est lue avec `WHERE id > :after ORDER BY id LIMIT :first`
+(keyset pagination): le coût d'une page ne dépend pas de sa position dans la
+table, contrairement à un `OFFSET`.
+"""
+
+import base64
+import binascii
+
+import graphene
+from graphql import GraphQLError
+
+# Taille de page si `first` n'est pas précisé, et taille maximale
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+_CURSOR_PREFIX = "cursor:"
+
+
+def encode_cursor(key: int) -> str:
+    """Curseur opaque correspondant à une clé primaire."""
+    raw = f"{_CURSOR_PREFIX}{key}".encode("utf-8")
+    return base64.b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> int:
+    """Clé primaire correspondant à un curseur.
+
+    Raises:
+        GraphQLError: Le curseur n'a pas été produit par `encode_cursor`.
+    """
+    try:
+        raw = base64.b64decode(cursor.encode("ascii"), validate=True)
+        raw = raw.decode("utf-8")
+        if raw.startswith(_CURSOR_PREFIX):
+            return int(raw[len(_CURSOR_PREFIX) :])
+    except (binascii.Error, UnicodeError, ValueError):
+        pass
+    raise GraphQLError(f"Invalid cursor: {cursor}")
+
+
+class CountableConnection(graphene.relay.Connection):
+    """Connexion Relay avec un champ `totalCount`.
+
+    Le nombre total d'éléments n'est calculé (`COUNT`) que si le champ est
+    demandé.
+    """
+
+    class Meta:
+        abstract = True
+
+    totalCount = graphene.Int()
+
+    def resolve_totalCount(root: object, info: graphene.ResolveInfo):
+        return root.query.count()
+
+
+def connection_field(connection_type) -> graphene.Field:
+    """Champ renvoyant une page de `connection_type`, avec les arguments
+    `first` et `after`."""
+    return graphene.Field(
+        connection_type, first=graphene.Int(), after=graphene.String()
+    )
+
+
+def keyset_connection(
+    connection_type, query, key, first: int = None, after: str = None
+):
+    """Construit une page de `connection_type` à partir de `query`.
+
+    Args:
+        connection_type (CountableConnection): Type de la connexion.
+        query (sqlalchemy.orm.Query): Requête non paginée.
+        key (Column): Clé primaire servant d'ordre et de curseur.
+        first (int): Nombre d'éléments demandés.
+        after (str): Curseur du dernier élément de la page précédente.
+    """
+    if first is None:
+        first = DEFAULT_PAGE_SIZE
+    if first < 0:
+        raise GraphQLError("Argument first must be a non-negative integer.")
+    first = min(first, MAX_PAGE_SIZE)
+
+    page = query
+    if after is not None:
+        page = page.filter(key > decode_cursor(after))
+    # Un élément de plus que demandé pour savoir s'il existe une page suivante
+    rows = page.order_by(key).limit(first + 1).all()
+
+    edges = [
+        connection_type.Edge(node=row, cursor=encode_cursor(row.id))
+        for row in rows[:first]
+    ]
+    connection = connection_type(
+        edges=edges,
+        page_info=graphene.relay.PageInfo(
+            start_cursor=edges[0].cursor if edges else None,
+            end_cursor=edges[-1].cursor if edges else None,
+            has_next_page=len(rows) > first,
+            has_previous_page=False,
+        ),
+    )
+    connection.query = query
+    return connection
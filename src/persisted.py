@@ -0,0 +1,149 @@
+""" LPGL - IUT Metz
+Zachary Arnaise
+
+Stockage des requêtes persistées automatiquement (Automatic Persisted Queries).
+
+Protocole: https://github.com/apollographql/apollo-link-persisted-queries
+Le client envoie `extensions.persistedQuery.sha256Hash` sans la requête; si le
+hash est inconnu, il renvoie la requête complète accompagnée du hash, qui est
+alors enregistrée pour les appels suivants, si elle est valide.
+"""
+
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def query_hash(query: str) -> str:
+    """Hash SHA-256 (hexadécimal) d'une requête, tel que calculé par le
+    client."""
+    return hashlib.sha256(query.encode("utf-8")).hexdigest()
+
+
+class MemoryQueryStore(object):
+    """Stockage en mémoire du processus, perdu au redémarrage.
+
+    LRU borné à `max_size` requêtes; les requêtes de plus de `max_length`
+    caractères ne sont pas enregistrées.
+    """
+
+    def __init__(self: object, max_size: int = 1024, max_length: int = 16384):
+        """Constructeur."""
+        self.max_size = max_size
+        self.max_length = max_length
+        self._queries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self: object, sha256_hash: str) -> str:
+        """Renvoie la requête associée au hash, ou `None`."""
+        with self._lock:
+            query = self._queries.get(sha256_hash)
+            if query is not None:
+                self._queries.move_to_end(sha256_hash)
+            return query
+
+    def set(self: object, sha256_hash: str, query: str):
+        """Enregistre une requête."""
+        if len(query) > self.max_length:
+            return
+        with self._lock:
+            self._queries[sha256_hash] = query
+            self._queries.move_to_end(sha256_hash)
+            while len(self._queries) > self.max_size:
+                self._queries.popitem(last=False)
+
+
+class SQLiteQueryStore(object):
+    """Stockage dans une base SQLite sur disque, partagée entre processus et
+    conservée entre les redémarrages.
+
+    LRU borné à `max_size` requêtes, d'après leur date de dernière
+    utilisation (mise à jour au plus une fois par `TOUCH_INTERVAL` secondes,
+    pour ne pas écrire à chaque lecture); les requêtes de plus de
+    `max_length` caractères ne sont pas enregistrées.
+
+    Une connexion est ouverte par thread, les connexions `sqlite3` ne pouvant
+    pas être partagées entre threads.
+    """
+
+    TOUCH_INTERVAL = 60
+
+    def __init__(
+        self: object,
+        path: str,
+        max_size: int = 10000,
+        max_length: int = 16384,
+    ):
+        """Constructeur."""
+        self.path = path
+        self.max_size = max_size
+        self.max_length = max_length
+        self._local = threading.local()
+        with self._connection() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS persisted_queries ("
+                "hash TEXT PRIMARY KEY, query TEXT NOT NULL, "
+                "used REAL NOT NULL DEFAULT 0)"
+            )
+            columns = [
+                row[1]
+                for row in connection.execute(
+                    "PRAGMA table_info(persisted_queries)"
+                )
+            ]
+            if "used" not in columns:
+                # Table créée avant la limite de taille
+                connection.execute(
+                    "ALTER TABLE persisted_queries "
+                    "ADD COLUMN used REAL NOT NULL DEFAULT 0"
+                )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS ix_persisted_queries_used "
+                "ON persisted_queries (used)"
+            )
+
+    def _connection(self: object) -> sqlite3.Connection:
+        """Connexion SQLite du thread courant."""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5)
+            self._local.connection = connection
+        return connection
+
+    def get(self: object, sha256_hash: str) -> str:
+        """Renvoie la requête associée au hash, ou `None`."""
+        connection = self._connection()
+        row = connection.execute(
+            "SELECT query, used FROM persisted_queries WHERE hash = ?",
+            (sha256_hash,),
+        ).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if row[1] < now - self.TOUCH_INTERVAL:
+            with connection:
+                connection.execute(
+                    "UPDATE persisted_queries SET used = ? WHERE hash = ?",
+                    (now, sha256_hash),
+                )
+        return row[0]
+
+    def set(self: object, sha256_hash: str, query: str):
+        """Enregistre une requête, puis retire les moins récemment utilisées
+        au-delà de `max_size`."""
+        if len(query) > self.max_length:
+            return
+        with self._connection() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO persisted_queries (hash, query, used) "
+                "VALUES (?, ?, ?)",
+                (sha256_hash, query, time.time()),
+            )
+            connection.execute(
+                "DELETE FROM persisted_queries WHERE hash IN ("
+                "SELECT hash FROM persisted_queries ORDER BY used DESC "
+                "LIMIT -1 OFFSET ?)",
+                (self.max_size,),
+            )
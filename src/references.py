@@ -0,0 +1,108 @@
+""" LPGL - IUT Metz
+Zachary Arnaise
+
+Données de référence (petites tables `id`/`description`) gardées en mémoire,
+pour filtrer par ID en SQL sans jointure ni comparaison de chaînes.
+"""
+
+import threading
+
+import sqlalchemy
+
+import data_version
+import signals
+from models import MovieStatus, PersonRole
+
+# Descriptions des rôles, telles qu'enregistrées dans la table `person_roles`
+DIRECTOR = "réalisateur"
+ACTOR = "acteur"
+SONG_WRITER = "compositeur"
+
+
+class LookupTable(object):
+    """Correspondance description <-> ID d'une table de référence.
+
+    La table est chargée une fois (`load`, au démarrage ou au premier accès),
+    puis invalidée dès qu'une ligne est ajoutée, modifiée ou supprimée via
+    l'ORM; elle est alors rechargée au prochain accès. Elle l'est aussi quand
+    la version des données (`data_version`, lue une fois par transaction) a
+    changé depuis son chargement, après un commit d'un autre processus.
+    """
+
+    def __init__(self: object, model):
+        """Constructeur."""
+        self.model = model
+        # (version des données, (description -> ID, ID -> description)),
+        # remplacés ensemble pour qu'un lecteur ne voie jamais l'un sans
+        # l'autre
+        self._loaded = None
+        self._lock = threading.Lock()
+
+        for event in ("after_insert", "after_update", "after_delete"):
+            sqlalchemy.event.listen(model, event, self._on_change)
+
+    def _on_change(self: object, mapper, connection, target):
+        """Invalide la table lors d'une modification via l'ORM."""
+        self.invalidate()
+
+    def load(self: object, session) -> tuple:
+        """Charge (ou recharge) la table depuis la base.
+
+        Returns:
+            tuple: Correspondances description -> ID et ID -> description
+            chargées, à utiliser directement: la table peut être invalidée
+            par un autre thread dès la fin du chargement.
+        """
+        version = data_version.of_session(session)
+        rows = session.query(self.model.id, self.model.description).all()
+        maps = (
+            {description: id_ for id_, description in rows},
+            {id_: description for id_, description in rows},
+        )
+        # Une transaction qui modifie la table voit des lignes pas encore
+        # validées: elles ne sont pas partagées avec les autres sessions
+        if self.model.__table__.name not in signals.changed_tables(session):
+            with self._lock:
+                self._loaded = (version, maps)
+        return maps
+
+    def invalidate(self: object):
+        """Force le rechargement de la table au prochain accès."""
+        with self._lock:
+            self._loaded = None
+
+    def _current(self: object, session) -> tuple:
+        """Correspondances de la table, chargées si besoin."""
+        loaded = self._loaded
+        if loaded is None or loaded[0] != data_version.of_session(session):
+            return self.load(session)
+        return loaded[1]
+
+    def id_of(self: object, session, description: str) -> int:
+        """ID correspondant à `description`, `None` si inconnue."""
+        ids, _ = self._current(session)
+        return ids.get(description)
+
+    def description_of(self: object, session, id_: int) -> str:
+        """Description correspondant à `id_`, `None` si inconnu."""
+        _, descriptions = self._current(session)
+        return descriptions.get(id_)
+
+
+roles = LookupTable(PersonRole)
+statuses = LookupTable(MovieStatus)
+
+TABLES = (roles, statuses)
+
+
+def load(session):
+    """Charge toutes les tables de référence (au démarrage)."""
+    for table in TABLES:
+        table.load(session)
+
+
+def invalidate():
+    """Force le rechargement de toutes les tables de référence, par exemple
+    après une modification faite hors de l'ORM."""
+    for table in TABLES:
+        table.invalidate()
@@ -6,13 +6,37 @@ https://github.com/alecrasmussen/falcon-graphql-server/blob/master/falcon_graphq
 """
 
 
+import asyncio
+import hashlib
 import json
+import time
 from collections import OrderedDict
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
 from functools import partial
 
 import falcon
+import falcon.asgi
 import graphene
 import sqlalchemy
+from graphql.error import GraphQLSyntaxError
+from graphql.execution import ExecutionResult
+from graphql.execution.middleware import MiddlewareManager
+from promise import Promise, is_thenable
+
+import data_version
+import metrics
+import sessions
+import signals
+from backend import CachedDocumentBackend
+from complexity import ComplexityAnalyzer
+from compression import coded_etag
+from encoders import JSONEncoder, get_encoder
+from events import bus
+from loaders import Loaders
+from persisted import query_hash
+from result_cache import cache_key, read_tables
+from tracing import Trace, TracingMiddleware
 
 
 def set_graphql_allow_header(
@@ -23,18 +47,87 @@ def set_graphql_allow_header(
     resp.set_header("Allow", "GET, POST, OPTIONS")
 
 
+async def set_graphql_allow_header_async(
+    req: falcon.Request, resp: falcon.Response, resource: object
+):
+    """Version asynchrone de `set_graphql_allow_header`, les hooks d'une
+    resource ASGI devant être des coroutines."""
+    # Le hook est aussi appelé pour les connexions WebSocket, sans en-têtes
+    if not isinstance(resp, falcon.asgi.WebSocket):
+        set_graphql_allow_header(req, resp, resource)
+
+
 @falcon.after(set_graphql_allow_header)
 class ResourceGraphQL(object):
-    """Resource GraphQL, définit l'endpoint que le serveur Falcon utilisera."""
+    """Resource GraphQL, définit l'endpoint que le serveur Falcon utilisera.
+
+    Les sessions ouvertes pendant une requête sont fermées à sa fin par
+    `sessions.SessionMiddleware`, à ajouter à l'application.
+    """
 
     def __init__(
         self: object,
         schema: graphene.Schema,
         scoped_session: sqlalchemy.orm.scoped_session,
+        backend: CachedDocumentBackend = None,
+        persisted_queries: object = None,
+        max_batch_size: int = 50,
+        result_cache: object = None,
+        encoder: JSONEncoder = None,
+        stream_responses: bool = False,
+        complexity: ComplexityAnalyzer = None,
+        read_scoped_session: sqlalchemy.orm.scoped_session = None,
+        cache_control: str = "no-cache",
     ):
-        """Constructeur."""
+        """Constructeur.
+
+        Args:
+            backend (CachedDocumentBackend): Backend graphql-core utilisé pour
+            parser et valider les requêtes, un cache LRU par défaut.
+            persisted_queries (object): Stockage des requêtes persistées
+            (voir `persisted`), `None` pour désactiver les APQ.
+            max_batch_size (int): Nombre maximum d'opérations acceptées dans
+            une requête POST groupée (batch).
+            result_cache (object): Cache des résultats des requêtes en
+            lecture seule (voir `result_cache`), `None` pour le désactiver.
+            encoder (JSONEncoder): Encodeur JSON des réponses (voir
+            `encoders`), le plus rapide disponible par défaut.
+            stream_responses (bool): Envoie les réponses par morceaux
+            (`Transfer-Encoding: chunked`) au fur et à mesure de leur
+            encodage, au lieu de construire la chaîne JSON complète. Le
+            résultat de l'exécution est lui toujours construit en entier.
+            complexity (ComplexityAnalyzer): Limites de profondeur et de coût
+            vérifiées avant l'exécution (voir `complexity`), `None` pour ne
+            pas les vérifier.
+            read_scoped_session (sqlalchemy.orm.scoped_session): Session liée
+            à des connexions en lecture seule (fichier SQLite ouvert en
+            lecture seule ou réplicas), utilisée par les opérations `query`;
+            `None` pour tout exécuter avec `scoped_session`.
+            cache_control (str): En-tête `Cache-Control` des réponses aux
+            requêtes `query` faites en GET, qui portent un ETag (voir
+            `_etag`). Par défaut, les caches doivent revalider la réponse
+            (`If-None-Match`) avant de la réutiliser.
+        """
         self.schema = schema
         self.scoped_session = scoped_session
+        self.read_scoped_session = read_scoped_session
+        self.backend = backend if backend else CachedDocumentBackend()
+        self.persisted_queries = persisted_queries
+        self.max_batch_size = max_batch_size
+        self.result_cache = result_cache
+        self.encoder = encoder if encoder else get_encoder()
+        self.stream_responses = stream_responses
+        self.complexity = complexity
+        self.cache_control = cache_control
+        # Sans `wrap_in_promise`, graphql-core envelopperait le résultat de
+        # chaque resolver dans une Promise (plusieurs fois plus lent sur les
+        # longues listes); le middleware renvoie lui-même une Promise pour
+        # les resolvers en attente d'un DataLoader
+        self.middleware = MiddlewareManager(
+            TracingMiddleware(), wrap_in_promise=False
+        )
+        if result_cache is not None:
+            signals.on_commit(result_cache.invalidate)
 
         self._resp_forbidden = partial(
             self._resp_error,
@@ -66,14 +159,45 @@ class ResourceGraphQL(object):
             status=falcon.HTTP_400,
             reason="POST body is invalid JSON.",
         )
+        self._resp_batch_too_large = partial(
+            self._resp_error,
+            status=falcon.HTTP_400,
+            reason="Too many operations in batch.",
+        )
         self._resp_no_query_provided = partial(
             self._resp_error,
             status=falcon.HTTP_400,
             reason="Must provide query string.",
         )
+        # Les clients APQ attendent ce message avec un statut 200 pour
+        # renvoyer la requête complète
+        self._resp_persisted_query_not_found = partial(
+            self._resp_error,
+            status=falcon.HTTP_200,
+            reason="PersistedQueryNotFound",
+            code="PERSISTED_QUERY_NOT_FOUND",
+        )
+        self._resp_persisted_query_not_supported = partial(
+            self._resp_error,
+            status=falcon.HTTP_400,
+            reason="PersistedQueryNotSupported",
+            code="PERSISTED_QUERY_NOT_SUPPORTED",
+        )
+        self._resp_persisted_query_bad_version = partial(
+            self._resp_error,
+            status=falcon.HTTP_400,
+            reason="Unsupported persisted query version.",
+        )
+        self._resp_persisted_query_bad_hash = partial(
+            self._resp_error,
+            status=falcon.HTTP_400,
+            reason="Provided sha256Hash does not match query.",
+        )
 
     @staticmethod
-    def _resp_error(resp: falcon.Response, status: str, reason: str):
+    def _resp_error(
+        resp: falcon.Response, status: str, reason: str, code: str = None
+    ):
         """Construit un objet `Response` pour décrire une erreur.
 
         Le contenu renvoyé suit le format d'erreur tel que défini dans la spec
@@ -81,9 +205,436 @@ class ResourceGraphQL(object):
         """
         resp = resp if resp else falcon.Response()
         resp.status = status
-        resp.body = json.dumps({"errors": [{"message": reason}]})
+        error = {"message": reason}
+        if code:
+            error["extensions"] = {"code": code}
+        resp.text = json.dumps({"errors": [error]})
         return resp
 
+    def _persisted_query(
+        self: object, resp: falcon.Response, query: str, extensions: dict
+    ) -> str:
+        """Applique le protocole des requêtes persistées (APQ).
+
+        Renvoie la requête à exécuter: celle reçue, ou celle retrouvée à
+        partir de `extensions.persistedQuery.sha256Hash`. Renvoie `None` si une
+        réponse d'erreur a été construite.
+        """
+        persisted = None
+        if isinstance(extensions, dict):
+            persisted = extensions.get("persistedQuery")
+        if not persisted:
+            if query is None:
+                self._resp_no_query_provided(resp=resp)
+            return query
+
+        if self.persisted_queries is None:
+            self._resp_persisted_query_not_supported(resp=resp)
+            return None
+        if not isinstance(persisted, dict) or persisted.get("version") != 1:
+            self._resp_persisted_query_bad_version(resp=resp)
+            return None
+
+        sha256_hash = str(persisted.get("sha256Hash"))
+        if query is None:
+            query = self.persisted_queries.get(sha256_hash)
+            if query is None:
+                self._resp_persisted_query_not_found(resp=resp)
+            return query
+
+        if query_hash(query) != sha256_hash:
+            self._resp_persisted_query_bad_hash(resp=resp)
+            return None
+        if self._is_valid(query):
+            self.persisted_queries.set(sha256_hash, query)
+        return query
+
+    def _is_valid(self: object, query: str) -> bool:
+        """Vrai si `query` est parsable et valide pour le schéma. Le document
+        reste en cache dans le backend pour l'exécution qui suit."""
+        try:
+            document = self.backend.document_from_string(self.schema, query)
+        except GraphQLSyntaxError:
+            return False
+        return not document.validation_errors
+
+    def _run(
+        self: object,
+        query: str,
+        variables: dict,
+        operationName: str,
+        context: dict,
+        extensions: dict = None,
+    ) -> tuple:
+        """Exécute une requête GraphQL et enregistre ses métriques.
+
+        Si le client le demande (extension `tracing`), la durée de chaque
+        resolver et les requêtes SQL sont renvoyées dans
+        `extensions.tracing` et `extensions.sql`.
+
+        Returns:
+            tuple: Statut HTTP et contenu de la réponse (non sérialisé).
+        """
+        trace = None
+        if isinstance(extensions, dict) and extensions.get("tracing"):
+            trace = Trace()
+            context = dict(context, tracing=trace)
+
+        start = time.perf_counter()
+        with metrics.collect_sql() as sql:
+            status, payload, operation = self._run_operation(
+                query, variables, operationName, context, trace is None
+            )
+        duration = time.perf_counter() - start
+
+        metrics.operations.inc(operation=operation, status=status[:3])
+        metrics.operation_duration.observe(duration, operation=operation)
+        metrics.operation_statements.observe(
+            sql.statements, operation=operation
+        )
+        metrics.operation_sql_duration.observe(
+            sql.duration, operation=operation
+        )
+
+        if trace is not None:
+            trace.finish()
+            payload = dict(payload)
+            payload["extensions"] = dict(
+                payload.get("extensions") or {},
+                tracing=trace.as_dict(),
+                sql={
+                    "statements": sql.statements,
+                    "duration": int(sql.duration * 1e9),
+                },
+            )
+        return status, payload
+
+    def _run_operation(
+        self: object,
+        query: str,
+        variables: dict,
+        operationName: str,
+        context: dict,
+        use_cache: bool,
+    ) -> tuple:
+        """Exécute une requête GraphQL.
+
+        Returns:
+            tuple: Statut HTTP, contenu de la réponse (non sérialisé) et type
+            d'opération (`invalid` si la requête n'a pas pu être parsée).
+        """
+        document = None
+        operation = None
+        try:
+            document = self.backend.document_from_string(self.schema, query)
+            operation = document.get_operation_type(operationName)
+        except GraphQLSyntaxError:
+            pass  # L'erreur sera renvoyée par l'exécution
+        operation = operation or "invalid"
+
+        # Les subscriptions ne sont servies qu'en WebSocket, par le serveur
+        # ASGI (`AsyncResourceGraphQL`)
+        if operation == "subscription":
+            error = {
+                "message": "Subscriptions are only available over WebSocket "
+                "on the ASGI server.",
+                "extensions": {"code": "SUBSCRIPTIONS_NOT_SUPPORTED"},
+            }
+            return falcon.HTTP_400, {"errors": [error]}, operation
+
+        extensions = None
+        if document is not None:
+            extensions, error = self._complexity(
+                document, variables, operationName
+            )
+            if error is not None:
+                return falcon.HTTP_400, error, operation
+
+        # Seules les opérations `query` passent par le cache de résultats
+        key = version = None
+        if use_cache and self.result_cache is not None and operation == "query":
+            key = cache_key(document, variables, operationName)
+            payload = self.result_cache.get(key)
+            if payload is not None:
+                return falcon.HTTP_200, payload, operation
+            version = data_version.current(self._session(True))
+
+        result = self.schema.execute(
+            request_string=query,
+            variable_values=variables,
+            operation_name=operationName,
+            context_value=context,
+            middleware=self.middleware,
+            backend=self.backend,
+        )
+
+        # Traitement du résultat de la requête GraphQL, les erreurs d'un
+        # résultat partiel sont renvoyées avec les données
+        if result.data:
+            payload = {"data": result.data}
+            if result.errors:
+                payload["errors"] = [{"message": str(i)} for i in result.errors]
+            if extensions:
+                payload["extensions"] = extensions
+            if key is not None and not result.errors:
+                self._cache_result(key, payload, document, version)
+            return falcon.HTTP_200, payload, operation
+        elif result.errors:
+            messages = [{"message": str(i)} for i in result.errors]
+            return falcon.HTTP_400, {"errors": messages}, operation
+        else:
+            raise RuntimeError
+
+    def _cache_result(
+        self: object, key: str, payload: dict, document, version: int
+    ):
+        """Met en cache le résultat d'une requête exécutée à partir de la
+        version `version` des données.
+
+        Une transaction validée pendant l'exécution a pu invalider le cache
+        avant l'ajout de ce résultat, peut-être périmé: il est retiré si la
+        version a changé. Une transaction validée après cette vérification
+        invalide elle-même le résultat.
+        """
+        self.result_cache.set(key, payload, read_tables(document))
+        if data_version.current(self._session(True)) != version:
+            self.result_cache.discard(key)
+
+    def _complexity(
+        self: object, document, variables: dict, operationName: str
+    ) -> tuple:
+        """Vérifie la profondeur et le coût d'une opération.
+
+        Returns:
+            tuple: Extensions à ajouter à la réponse, et contenu de la réponse
+            d'erreur si l'opération dépasse les limites (`None` sinon).
+        """
+        if self.complexity is None:
+            return None, None
+        depth, cost = self.complexity.analyze(
+            document, self._session(True), variables, operationName
+        )
+        limits = self.complexity
+        details = {
+            "depth": depth,
+            "maxDepth": limits.max_depth,
+            "cost": cost,
+            "maxCost": limits.max_cost,
+        }
+
+        error = None
+        if depth > limits.max_depth:
+            error = {
+                "message": f"Query is too deep: depth {depth} exceeds the "
+                f"maximum of {limits.max_depth}.",
+                "extensions": dict(details, code="QUERY_TOO_DEEP"),
+            }
+        elif limits.max_cost is not None and cost > limits.max_cost:
+            error = {
+                "message": f"Query is too complex: cost {cost} exceeds the "
+                f"maximum of {limits.max_cost}.",
+                "extensions": dict(details, code="QUERY_TOO_COMPLEX"),
+            }
+        if error is not None:
+            return None, {"errors": [error]}
+        return {"complexity": details}, None
+
+    def _write(self: object, resp: falcon.Response, payload: object):
+        """Écrit le contenu JSON `payload` dans la réponse."""
+        if self.stream_responses:
+            resp.stream = self.encoder.iter_encode(payload)
+        else:
+            resp.data = self.encoder.encode(payload)
+
+    def _execute(
+        self: object,
+        resp: falcon.Response,
+        query: str,
+        variables: dict,
+        operationName: str,
+        extensions: dict = None,
+    ):
+        """Exécute une requête GraphQL et construit la réponse.
+
+        Returns:
+            dict: Contenu de la réponse (non sérialisé).
+        """
+        context = self._context(self._read_only([(query, operationName)]))
+        resp.status, payload = self._run(
+            query, variables, operationName, context, extensions
+        )
+        self._write(resp, payload)
+        return payload
+
+    def _etag(
+        self: object,
+        query: str,
+        variables: dict,
+        operationName: str,
+        extensions: dict,
+    ) -> str:
+        """ETag de la réponse à une requête GET.
+
+        Il est calculé à partir de la requête normalisée, des variables, du
+        nom d'opération et de la version des données (voir `data_version`):
+        il change dès qu'une mutation a été validée. Renvoie `None` pour les
+        réponses qui ne doivent pas être mises en cache (mutation, requête
+        invalide, tracing).
+        """
+        if isinstance(extensions, dict) and extensions.get("tracing"):
+            return None
+        try:
+            document = self.backend.document_from_string(self.schema, query)
+        except GraphQLSyntaxError:
+            return None
+        if document.get_operation_type(operationName) != "query":
+            return None
+
+        version = data_version.current(self._session(True))
+        raw = f"{cache_key(document, variables, operationName)}:{version}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+    def _execute_batch(self: object, resp: falcon.Response, operations: list):
+        """Exécute une liste d'opérations reçue en une seule requête POST.
+
+        Les opérations partagent la même session et les mêmes DataLoaders; la
+        réponse est la liste des résultats, dans l'ordre des opérations. Une
+        opération invalide n'empêche pas l'exécution des suivantes.
+        """
+        if not operations:
+            self._resp_no_query_provided(resp=resp)
+            return
+        if len(operations) > self.max_batch_size:
+            self._resp_batch_too_large(resp=resp)
+            return
+
+        items = []
+        for operation in operations:
+            # Les erreurs d'une opération sont construites dans une réponse
+            # à part puis ajoutées aux résultats
+            item = falcon.Response()
+            parsed = None
+            if isinstance(operation, dict):
+                parsed = self._json_operation(item, operation)
+            else:
+                self._resp_body_invalid_json(resp=item)
+            items.append((item, parsed))
+
+        # Une seule mutation suffit pour exécuter tout le batch avec la
+        # session principale
+        context = self._context(
+            self._read_only(
+                [(parsed[0], parsed[2]) for _, parsed in items if parsed]
+            )
+        )
+        results = []
+        for item, parsed in items:
+            if parsed is None:
+                results.append(json.loads(item.text))
+                continue
+            query, variables, operationName, extensions = parsed
+            _, payload = self._run(
+                query, variables, operationName, context, extensions
+            )
+            results.append(payload)
+
+        resp.status = falcon.HTTP_200
+        self._write(resp, results)
+
+    def _json_operation(
+        self: object,
+        resp: falcon.Response,
+        data: dict,
+        query: str = None,
+        variables: dict = None,
+        operationName: str = None,
+        extensions: dict = None,
+    ) -> tuple:
+        """Extrait une opération d'un objet JSON `{query, variables,
+        operationName, extensions}`.
+
+        Les valeurs déjà connues (params URL) sont prioritaires sur celles de
+        `data`. Renvoie la requête (après résolution APQ), les variables, le
+        nom d'opération et les extensions, ou `None` si une réponse d'erreur a
+        été construite.
+        """
+        # Si pas de query dans l'URL, on essaye depuis le JSON
+        if query is None and data.get("query"):
+            query = str(data["query"])
+
+        # Si pas de variables dans l'URL, on essaye depuis le JSON
+        if variables is None:
+            if "variables" in data and data["variables"]:
+                try:
+                    variables = data["variables"]
+                    if not isinstance(variables, OrderedDict):
+                        variables = json.loads(
+                            str(data["variables"]),
+                            object_pairs_hook=OrderedDict,
+                        )
+                except json.decoder.JSONDecodeError:
+                    self._resp_variables_invalid_json(resp=resp)
+                    return None
+            else:
+                variables = ""
+
+        # Si pas de nom d'opération dans l'URL, on essaye depuis le JSON
+        if operationName is None:
+            if "operationName" in data:
+                operationName = str(data["operationName"])
+
+        # Si pas d'extensions dans l'URL, on essaye depuis le JSON
+        if extensions is None and data.get("extensions"):
+            try:
+                extensions = data["extensions"]
+                if not isinstance(extensions, dict):
+                    extensions = json.loads(str(extensions))
+            except json.decoder.JSONDecodeError:
+                self._resp_extensions_invalid_json(resp=resp)
+                return None
+
+        query = self._persisted_query(resp, query, extensions)
+        if query is None:
+            return None
+        return query, variables, operationName, extensions
+
+    def _session(self: object, read_only: bool):
+        """Session à utiliser, en lecture seule si possible et demandé."""
+        if read_only and self.read_scoped_session is not None:
+            return self.read_scoped_session
+        return self.scoped_session
+
+    def _read_only(self: object, operations: list) -> bool:
+        """Vrai si toutes les opérations `(query, operationName)` sont des
+        requêtes `query`, exécutables en lecture seule.
+
+        Les requêtes invalides n'écrivent rien, elles ne sont pas prises en
+        compte.
+        """
+        for query, operationName in operations:
+            try:
+                document = self.backend.document_from_string(self.schema, query)
+            except GraphQLSyntaxError:
+                continue
+            if document.get_operation_type(operationName) != "query":
+                return False
+        return True
+
+    def _context(self: object, read_only: bool = False) -> dict:
+        """Construit le contexte partagé par les resolvers d'une requête.
+
+        Les DataLoaders sont recréés à chaque requête pour que leur cache ne
+        renvoie jamais des données d'une requête précédente. La session est
+        celle du thread courant, commune aux opérations de la requête et
+        fermée à sa fin (voir `sessions`).
+
+        Args:
+            read_only (bool): Utilise la session en lecture seule, pour les
+            requêtes sans mutation.
+        """
+        session = self._session(read_only)()
+        return {"session": session, "loaders": Loaders(session)}
+
     def on_put(self: object, req: falcon.Request, resp: falcon.Response):
         "Handles PUT requests. Not supported."
         self._resp_method_not_allowed(resp=resp)
@@ -106,12 +657,18 @@ class ResourceGraphQL(object):
 
     def on_get(self: object, req: falcon.Request, resp: falcon.Response):
         "Handles GET requests."
-        # Traitement de la query
+        self._get(req, resp)
+
+    def on_post(self: object, req: falcon.Request, resp: falcon.Response):
+        "Handles POST requests."
+        self._post(req, resp, req.bounded_stream.read())
+
+    def _get(self: object, req: falcon.Request, resp: falcon.Response):
+        """Traitement d'une requête GET."""
+        # Traitement de la query, absente si requête persistée
+        query = None
         if req.params and "query" in req.params and req.params["query"]:
             query = str(req.params["query"])
-        else:
-            self._resp_no_query_provided(resp=resp)
-            return
 
         # Traitement variables, si spécifiées
         variables = ""
@@ -129,27 +686,66 @@ class ResourceGraphQL(object):
         if "operationName" in req.params and req.params["operationName"]:
             operationName = str(req.params["operationName"])
 
-        # Exécution requête
-        result = self.schema.execute(
-            request_string=query,
-            variable_values=variables,
-            operation_name=operationName,
-            context_value={"session": self.scoped_session},
+        # Traitement extensions, si spécifiées
+        extensions = None
+        if "extensions" in req.params and req.params["extensions"]:
+            try:
+                extensions = json.loads(str(req.params["extensions"]))
+            except json.decoder.JSONDecodeError:
+                self._resp_extensions_invalid_json(resp=resp)
+                return
+
+        query = self._persisted_query(resp, query, extensions)
+        if query is None:
+            return
+
+        # Réponse inchangée depuis celle détenue par le client: rien à
+        # exécuter ni à envoyer
+        etag = self._etag(query, variables, operationName, extensions)
+        matched = self._matching_etag(req, etag)
+        if matched is not None:
+            resp.status = falcon.HTTP_304
+            resp.etag = matched
+            resp.cache_control = [self.cache_control]
+            return
+
+        payload = self._execute(
+            resp, query, variables, operationName, extensions
         )
+        # Seuls les résultats complets sont mis en cache
+        if etag is not None and resp.status == falcon.HTTP_200:
+            if "errors" not in payload:
+                resp.etag = etag
+                resp.cache_control = [self.cache_control]
 
-        # Traitement du résultat de la requête GraphQL
-        if result.data:
-            resp.status = falcon.HTTP_200
-            resp.body = json.dumps({"data": result.data})
-        elif result.errors:
-            messages = [{"message": str(i)} for i in result.errors]
-            resp.status = falcon.HTTP_400
-            resp.body = json.dumps({"errors": messages})
-        else:
-            raise RuntimeError
+    @staticmethod
+    def _matching_etag(req: falcon.Request, etag: str) -> str:
+        """ETag de `If-None-Match` correspondant à `etag`, `None` si aucun.
 
-    def on_post(self: object, req: falcon.Request, resp: falcon.Response):
-        "Handles POST requests."
+        L'ETag d'une réponse compressée porte le suffixe de son codage (voir
+        `compression`): seul celui du codage négocié pour cette requête
+        correspond, le client ne détenant pas forcément une représentation
+        qu'il pourrait décoder sinon. Les réponses trop petites pour être
+        compressées gardent l'ETag d'origine, qui correspond toujours. L'ETag
+        trouvé est renvoyé tel quel avec la réponse 304.
+        """
+        if etag is None or not req.if_none_match:
+            return None
+        current = {etag}
+        coding = req.context.get("content_coding")
+        if coding is not None:
+            current.add(coded_etag(etag, coding))
+        for value in req.if_none_match:
+            if value == "*":
+                return etag
+            if value in current:
+                return value
+        return None
+
+    def _post(
+        self: object, req: falcon.Request, resp: falcon.Response, body: bytes
+    ):
+        """Traitement d'une requête POST, dont le corps `body` a déjà été lu."""
         # Traitement de la query, si spécifiée dans les params URL
         query = None
         if req.params and "query" in req.params and req.params["query"]:
@@ -171,6 +767,15 @@ class ResourceGraphQL(object):
         if "operationName" in req.params and req.params["operationName"]:
             operationName = str(req.params["operationName"])
 
+        # Traitement extensions, si spécifiées dans les params URL
+        extensions = None
+        if "extensions" in req.params and req.params["extensions"]:
+            try:
+                extensions = json.loads(str(req.params["extensions"]))
+            except json.decoder.JSONDecodeError:
+                self._resp_extensions_invalid_json(resp=resp)
+                return
+
         # Traitement si requête au format JSON
         if req.content_type and "application/json" in req.content_type:
             if req.content_length is None or req.content_length == 0:
@@ -178,7 +783,7 @@ class ResourceGraphQL(object):
                 return
 
             # Lecture du corps de la requête et parse du JSON
-            raw_json = req.stream.read().decode("utf-8")
+            raw_json = body.decode("utf-8")
             try:
                 req.context["post_data"] = json.loads(
                     raw_json, object_pairs_hook=OrderedDict
@@ -186,74 +791,405 @@ class ResourceGraphQL(object):
             except json.decoder.JSONDecodeError:
                 self._resp_body_invalid_json(resp=resp)
                 return
+            postData = req.context["post_data"]
 
-            # Si pas de query dans l'URL, on essaye depuis le JSON
-            if query is None:
-                if "query" in req.context["post_data"]:
-                    query = str(req.context["post_data"]["query"])
-                else:
-                    self._resp_no_query_provided(resp=resp)
-                    return
-
-            # Si pas de variables dans l'URL, on essaye depuis le JSON
-            if variables is None:
-                if (
-                    "variables" in req.context["post_data"]
-                    and req.context["post_data"]["variables"]
-                ):
-                    try:
-                        variables = req.context["post_data"]["variables"]
-                        if not isinstance(variables, OrderedDict):
-                            variables = json.loads(
-                                str(req.context["post_data"]["variables"]),
-                                object_pairs_hook=OrderedDict,
-                            )
-                    except json.decoder.JSONDecodeError:
-                        self._resp_variables_invalid_json(resp=resp)
-                        return
-                else:
-                    variables = ""
+            # Plusieurs opérations dans une même requête (batch)
+            if isinstance(postData, list):
+                self._execute_batch(resp, postData)
+                return
+            if not isinstance(postData, dict):
+                self._resp_body_invalid_json(resp=resp)
+                return
 
-            # Si pas de nom d'opération dans l'URL, on essaye depuis le JSON
-            if operationName is None:
-                if "operationName" in req.context["post_data"]:
-                    postData = req.context["post_data"]
-                    operationName = str(postData["operationName"])
+            parsed = self._json_operation(
+                resp, postData, query, variables, operationName, extensions
+            )
+            if parsed is None:
+                return
+            self._execute(resp, *parsed)
+            return
 
         # Traitement si requête au format GraphQL
         elif req.content_type and "application/graphql" in req.content_type:
             # Lecture du corps de la requête
-            req.context["post_data"] = req.stream.read().decode("utf-8")
+            req.context["post_data"] = body.decode("utf-8")
 
             # Si pas de query dans l'URL, on essaye de la récupérer ici
-            if query is None:
-                if req.context["post_data"]:
-                    query = str(req.context["post_data"])
-                else:
-                    self._resp_no_query_provided(resp=resp)
-                    return
+            if query is None and req.context["post_data"]:
+                query = str(req.context["post_data"])
 
         # Si on a pas de query à ce stade, c'est dû à un Content-Type autre
-        # que JSON ou GraphQL et/ou rien dans les params de l'URL
-        elif query is None:
-            self._resp_no_query_provided(resp=resp)
+        # que JSON ou GraphQL et/ou rien dans les params de l'URL, sauf si
+        # c'est une requête persistée
+        query = self._persisted_query(resp, query, extensions)
+        if query is None:
             return
 
-        # Exécution requête
-        result = self.schema.execute(
-            request_string=query,
+        self._execute(resp, query, variables, operationName, extensions)
+
+
+@falcon.after(set_graphql_allow_header_async)
+class AsyncResourceGraphQL(ResourceGraphQL):
+    """Resource GraphQL pour le serveur ASGI (`falcon.asgi.App`).
+
+    Le corps des requêtes est lu sur la boucle asyncio, puis le traitement
+    (parse, exécution GraphQL et accès SQLAlchemy, tous synchrones) est
+    délégué à un pool de threads borné: la boucle reste libre pour accepter
+    d'autres clients pendant qu'une requête attend la base de données.
+
+    Les subscriptions sont servies en WebSocket, avec le protocole
+    `graphql-ws` de subscriptions-transport-ws:
+    https://github.com/apollographql/subscriptions-transport-ws/blob/master/PROTOCOL.md
+    """
+
+    def __init__(
+        self: object,
+        *args,
+        max_workers: int = 8,
+        subscriber_queue_size: int = 100,
+        keepalive_interval: float = 20,
+        **kwargs,
+    ):
+        """Constructeur.
+
+        Args:
+            max_workers (int): Nombre de threads du pool, c'est-à-dire de
+            requêtes GraphQL exécutées en parallèle.
+            subscriber_queue_size (int): Nombre maximum d'événements en
+            attente pour une subscription, les plus anciens sont abandonnés
+            au-delà.
+            keepalive_interval (float): Intervalle en secondes entre deux
+            messages `ka` envoyés aux clients WebSocket.
+        """
+        super().__init__(*args, **kwargs)
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="graphql"
+        )
+        self.subscriber_queue_size = subscriber_queue_size
+        self.keepalive_interval = keepalive_interval
+
+    def _in_thread(self: object, handler, *args):
+        """Exécute `handler` dans un thread du pool.
+
+        Les sessions du thread sont fermées à la fin de la requête (voir
+        `sessions.release`), `SessionMiddleware` ne pouvant pas le faire
+        depuis la boucle asyncio: les threads du pool étant réutilisés, elles
+        ne doivent pas garder les objets chargés.
+        """
+        try:
+            return handler(*args)
+        finally:
+            sessions.release(self.scoped_session, self.read_scoped_session)
+
+    async def _iter_in_pool(self: object, chunks: Iterator):
+        """Itérateur asynchrone sur les morceaux d'une réponse, encodés dans
+        le pool de threads pour ne pas bloquer la boucle."""
+        loop = asyncio.get_running_loop()
+        while True:
+            chunk = await loop.run_in_executor(
+                self.executor, next, chunks, None
+            )
+            if chunk is None:
+                break
+            yield chunk
+
+    def _async_stream(self: object, resp: falcon.Response):
+        """Adapte une réponse en streaming au serveur ASGI, qui attend un
+        itérateur asynchrone."""
+        if isinstance(resp.stream, Iterator):
+            resp.stream = self._iter_in_pool(resp.stream)
+
+    async def _run_in_pool(self: object, handler, *args):
+        """Attend l'exécution de `handler` dans le pool de threads et renvoie
+        son résultat."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, partial(self._in_thread, handler, *args)
+        )
+
+    async def on_put(self: object, req: falcon.Request, resp: falcon.Response):
+        "Handles PUT requests. Not supported."
+        super().on_put(req, resp)
+
+    async def on_patch(
+        self: object, req: falcon.Request, resp: falcon.Response
+    ):
+        "Handles PATCH requests. Not supported."
+        super().on_patch(req, resp)
+
+    async def on_delete(
+        self: object, req: falcon.Request, resp: falcon.Response
+    ):
+        "Handles DELETE requests. Not supported."
+        super().on_delete(req, resp)
+
+    async def on_options(
+        self: object, req: falcon.Request, resp: falcon.Response
+    ):
+        "Handles OPTIONS requests. No content."
+        super().on_options(req, resp)
+
+    async def on_head(self: object, req: falcon.Request, resp: falcon.Response):
+        "Handles HEAD requests. No content."
+        super().on_head(req, resp)
+
+    async def on_get(self: object, req: falcon.Request, resp: falcon.Response):
+        "Handles GET requests."
+        await self._run_in_pool(self._get, req, resp)
+        self._async_stream(resp)
+
+    async def on_post(self: object, req: falcon.Request, resp: falcon.Response):
+        "Handles POST requests."
+        body = await req.stream.read()
+        await self._run_in_pool(self._post, req, resp, body)
+        self._async_stream(resp)
+
+    @staticmethod
+    def _result_payload(result: ExecutionResult) -> dict:
+        """Contenu d'un message `data` pour un résultat d'exécution."""
+        data = result.data
+        if is_thenable(data):
+            data = Promise.resolve(data).get()
+        payload = {"data": data}
+        if result.errors:
+            payload["errors"] = [{"message": str(i)} for i in result.errors]
+        return payload
+
+    def _subscription_results(
+        self: object,
+        document,
+        variables: dict,
+        operationName: str,
+        event: object,
+    ) -> list:
+        """Exécute une subscription pour un événement du bus.
+
+        Appelée sans événement (`None`) au démarrage de la subscription, pour
+        renvoyer ses erreurs éventuelles avant de s'abonner au bus.
+
+        Returns:
+            list: Contenu des messages `data` à envoyer au client.
+        """
+        result = document.execute(
+            root_value=event,
+            context_value=self._context(read_only=True),
             variable_values=variables,
             operation_name=operationName,
-            context_value={"session": self.scoped_session},
+            allow_subscriptions=True,
         )
+        if isinstance(result, ExecutionResult):
+            return [self._result_payload(result)]
+        results = []
+        result.subscribe(results.append)
+        return [self._result_payload(i) for i in results]
 
-        # Traitement du résultat de la requête GraphQL
-        if result.data:
-            resp.status = falcon.HTTP_200
-            resp.body = json.dumps({"data": result.data})
-        elif result.errors:
-            messages = [{"message": str(i)} for i in result.errors]
-            resp.status = falcon.HTTP_400
-            resp.body = json.dumps({"errors": messages})
+    def _run_with_context(
+        self: object,
+        query: str,
+        variables: dict,
+        operationName: str,
+        read_only: bool,
+        extensions: dict = None,
+    ) -> tuple:
+        """Exécute une requête ou une mutation reçue en WebSocket.
+
+        Le contexte est construit ici, dans le thread du pool: la session
+        utilisée est celle de ce thread, fermée à la fin de l'opération (voir
+        `_in_thread`), et non celle de la boucle asyncio.
+        """
+        context = self._context(read_only)
+        return self._run(query, variables, operationName, context, extensions)
+
+    def _operation_document(self: object, payload: dict) -> tuple:
+        """Parse l'opération d'un message `start`.
+
+        Returns:
+            tuple: Document, variables et nom d'opération.
+        """
+        variables = payload.get("variables") or None
+        operationName = payload.get("operationName") or None
+        document = self.backend.document_from_string(
+            self.schema, str(payload.get("query") or "")
+        )
+        return document, variables, operationName
+
+    async def _stream(
+        self: object,
+        ws: falcon.asgi.WebSocket,
+        op_id: str,
+        subscriber: object,
+        operation: tuple,
+    ):
+        """Envoie au client les résultats d'une subscription, un par événement
+        reçu, jusqu'à son arrêt."""
+        try:
+            while True:
+                event = await subscriber.get()
+                payloads = await self._run_in_pool(
+                    self._subscription_results, *operation, event
+                )
+                for payload in payloads:
+                    await ws.send_media(
+                        {"type": "data", "id": op_id, "payload": payload}
+                    )
+        except falcon.WebSocketDisconnected:
+            pass
+        finally:
+            bus.unsubscribe(subscriber)
+
+    async def _start(
+        self: object, ws: falcon.asgi.WebSocket, op_id: str, payload: dict
+    ):
+        """Démarre une opération reçue par un message `start`.
+
+        Renvoie la tâche envoyant les résultats d'une subscription, ou `None`
+        si l'opération est terminée (requête, mutation ou erreur).
+        """
+        try:
+            operation = await self._run_in_pool(
+                self._operation_document, payload
+            )
+        except GraphQLSyntaxError as error:
+            await ws.send_media(
+                {
+                    "type": "error",
+                    "id": op_id,
+                    "payload": {"message": str(error)},
+                }
+            )
+            return None
+        document = operation[0]
+
+        operation_type = document.get_operation_type(operation[2])
+        if operation_type != "subscription":
+            _, result = await self._run_in_pool(
+                self._run_with_context,
+                document.document_string,
+                operation[1],
+                operation[2],
+                operation_type == "query",
+                payload.get("extensions"),
+            )
+            await ws.send_media(
+                {"type": "data", "id": op_id, "payload": result}
+            )
+            await ws.send_media({"type": "complete", "id": op_id})
+            return None
+
+        _, error = await self._run_in_pool(self._complexity, *operation)
+        if error is not None:
+            await ws.send_media(
+                {"type": "error", "id": op_id, "payload": error["errors"][0]}
+            )
+            return None
+
+        # Abonnement au bus avant la vérification, pour ne manquer aucun
+        # événement publié entre les deux
+        subscriber = bus.subscribe(self.subscriber_queue_size)
+        payloads = await self._run_in_pool(
+            self._subscription_results, *operation, None
+        )
+        errors = [i for payload in payloads for i in payload.get("errors", ())]
+        if errors:
+            bus.unsubscribe(subscriber)
+            await ws.send_media(
+                {"type": "error", "id": op_id, "payload": errors[0]}
+            )
+            return None
+        return asyncio.ensure_future(
+            self._stream(ws, op_id, subscriber, operation)
+        )
+
+    async def _keepalive(self: object, ws: falcon.asgi.WebSocket):
+        """Envoie périodiquement un message `ka` pour garder la connexion
+        ouverte."""
+        try:
+            while True:
+                await asyncio.sleep(self.keepalive_interval)
+                await ws.send_media({"type": "ka"})
+        except falcon.WebSocketDisconnected:
+            pass
+
+    async def on_websocket(
+        self: object, req: falcon.Request, ws: falcon.asgi.WebSocket
+    ):
+        "Handles WebSocket connections (GraphQL subscriptions)."
+        if "graphql-ws" in ws.subprotocols:
+            await ws.accept(subprotocol="graphql-ws")
         else:
-            raise RuntimeError
+            await ws.accept()
+
+        streams = {}
+        keepalive = None
+        try:
+            while True:
+                message = await ws.receive_media()
+                if not isinstance(message, dict):
+                    await ws.send_media(
+                        {
+                            "type": "error",
+                            "payload": {"message": "Invalid message."},
+                        }
+                    )
+                    continue
+                message_type = message.get("type")
+                op_id = message.get("id")
+
+                if message_type == "connection_init":
+                    await ws.send_media({"type": "connection_ack"})
+                    await ws.send_media({"type": "ka"})
+                    if keepalive is None:
+                        keepalive = asyncio.ensure_future(self._keepalive(ws))
+                elif message_type == "start":
+                    if op_id in streams:
+                        streams.pop(op_id).cancel()
+                    payload = message.get("payload")
+                    stream = await self._start(
+                        ws, op_id, payload if isinstance(payload, dict) else {}
+                    )
+                    if stream is not None:
+                        streams[op_id] = stream
+                elif message_type == "stop":
+                    stream = streams.pop(op_id, None)
+                    if stream is not None:
+                        stream.cancel()
+                    await ws.send_media({"type": "complete", "id": op_id})
+                elif message_type == "connection_terminate":
+                    await ws.close()
+                    break
+                else:
+                    await ws.send_media(
+                        {
+                            "type": "error",
+                            "id": op_id,
+                            "payload": {"message": "Unknown message type."},
+                        }
+                    )
+        except falcon.WebSocketDisconnected:
+            pass
+        finally:
+            for stream in streams.values():
+                stream.cancel()
+            if keepalive is not None:
+                keepalive.cancel()
+
+
+class ResourceMetrics(object):
+    """Resource exposant les métriques du serveur au format Prometheus."""
+
+    def __init__(self: object, registry: metrics.Registry = metrics.registry):
+        """Constructeur."""
+        self.registry = registry
+
+    def on_get(self: object, req: falcon.Request, resp: falcon.Response):
+        "Handles GET requests."
+        resp.content_type = "text/plain; version=0.0.4; charset=utf-8"
+        resp.text = self.registry.expose()
+
+
+class AsyncResourceMetrics(ResourceMetrics):
+    """Resource des métriques pour le serveur ASGI."""
+
+    async def on_get(self: object, req: falcon.Request, resp: falcon.Response):
+        "Handles GET requests."
+        super().on_get(req, resp)
@@ -0,0 +1,231 @@
+""" LPGL - IUT Metz
+Zachary Arnaise
+
+Cache des résultats des requêtes GraphQL en lecture seule (`query`).
+
+Un résultat est indexé par la requête normalisée, ses variables et le nom de
+l'opération. Il est conservé au plus `ttl` secondes et invalidé dès qu'une
+transaction modifiant l'une des tables qu'il lit est validée (voir `signals`).
+Un résultat calculé pendant une telle transaction est retiré du cache si la
+version des données (`data_version`) a changé depuis le début de son
+exécution (voir `resources`).
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import sqlalchemy
+from graphql.language.printer import print_ast
+from graphql.language.visitor import TypeInfoVisitor, Visitor, visit
+from graphql.type.definition import GraphQLUnionType, get_named_type
+from graphql.utils.type_info import TypeInfo
+
+import references
+
+
+def cache_key(document, variables: dict, operationName: str) -> str:
+    """Clé de cache d'une opération.
+
+    La requête est normalisée (réimprimée depuis son AST) pour que les
+    différences d'espacement ou de commentaires ne changent pas la clé.
+    """
+    normalized = getattr(document, "normalized", None)
+    if normalized is None:
+        normalized = print_ast(document.document_ast)
+        document.normalized = normalized
+    raw = json.dumps(
+        [normalized, variables or None, operationName],
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _model_tables(graphql_type) -> set:
+    """Tables lues pour résoudre un type GraphQL basé sur un modèle: la table
+    du modèle, celles de ses relations et les tables de référence (voir
+    `references`), utilisées par les champs filtrés par rôle (`directors`,
+    `actors`, ...) ou par statut."""
+    graphene_type = getattr(graphql_type, "graphene_type", None)
+    model = getattr(getattr(graphene_type, "_meta", None), "model", None)
+    if model is None:
+        return set()
+    tables = {model.__table__.name}
+    for relationship in sqlalchemy.inspect(model).relationships:
+        tables.add(relationship.mapper.local_table.name)
+    tables.update(table.model.__table__.name for table in references.TABLES)
+    return tables
+
+
+class _TablesVisitor(Visitor):
+    """Collecte les tables lues par les champs d'un document."""
+
+    def __init__(self: object, schema, type_info: TypeInfo):
+        """Constructeur."""
+        self.schema = schema
+        self.type_info = type_info
+        self.tables = set()
+
+    def enter_Field(self: object, node, *args):
+        named_type = get_named_type(self.type_info.get_type())
+        types = [named_type]
+        if isinstance(named_type, GraphQLUnionType):
+            types = self.schema.get_possible_types(named_type)
+        for graphql_type in types:
+            self.tables |= _model_tables(graphql_type)
+
+
+def read_tables(document) -> frozenset:
+    """Tables dont dépend le résultat d'un document."""
+    tables = getattr(document, "read_tables", None)
+    if tables is None:
+        type_info = TypeInfo(document.schema)
+        visitor = _TablesVisitor(document.schema, type_info)
+        visit(document.document_ast, TypeInfoVisitor(type_info, visitor))
+        tables = frozenset(visitor.tables)
+        document.read_tables = tables
+    return tables
+
+
+class MemoryResultCache(object):
+    """Cache en mémoire du processus, LRU borné à `max_size` résultats.
+
+    Chaque processus a son propre cache, invalidé par ses propres commits
+    seulement: avec plusieurs processus, un résultat peut rester périmé
+    jusqu'à l'expiration de son `ttl`.
+    """
+
+    def __init__(self: object, ttl: float = 60, max_size: int = 1024):
+        """Constructeur."""
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self: object, key: str) -> dict:
+        """Résultat associé à `key`, `None` s'il est absent ou expiré."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, tables, payload = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return payload
+
+    def set(self: object, key: str, payload: dict, tables: frozenset):
+        """Enregistre un résultat dépendant de `tables`."""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, tables, payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def discard(self: object, key: str):
+        """Supprime le résultat associé à `key`."""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def invalidate(self: object, tables: frozenset):
+        """Supprime les résultats dépendant d'au moins une table de
+        `tables`."""
+        with self._lock:
+            stale = [
+                key
+                for key, (_, entry_tables, _) in self._entries.items()
+                if entry_tables & tables
+            ]
+            for key in stale:
+                del self._entries[key]
+
+
+class SQLiteResultCache(object):
+    """Cache stocké dans une base SQLite sur disque, partagé par tous les
+    processus qui l'ouvrent: un commit dans l'un invalide le cache de tous.
+
+    Une connexion est ouverte par thread, les connexions `sqlite3` ne pouvant
+    pas être partagées entre threads.
+    """
+
+    def __init__(
+        self: object, path: str, ttl: float = 60, max_size: int = 10000
+    ):
+        """Constructeur."""
+        self.path = path
+        self.ttl = ttl
+        self.max_size = max_size
+        self._local = threading.local()
+        with self._connection() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS result_cache ("
+                "key TEXT PRIMARY KEY, payload TEXT NOT NULL, "
+                "tables TEXT NOT NULL, expires REAL NOT NULL)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS ix_result_cache_expires "
+                "ON result_cache (expires)"
+            )
+
+    def _connection(self: object) -> sqlite3.Connection:
+        """Connexion SQLite du thread courant."""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5)
+            self._local.connection = connection
+        return connection
+
+    def get(self: object, key: str) -> dict:
+        """Résultat associé à `key`, `None` s'il est absent ou expiré."""
+        row = (
+            self._connection()
+            .execute(
+                "SELECT payload FROM result_cache "
+                "WHERE key = ? AND expires >= ?",
+                (key, time.time()),
+            )
+            .fetchone()
+        )
+        return json.loads(row[0]) if row else None
+
+    def set(self: object, key: str, payload: dict, tables: frozenset):
+        """Enregistre un résultat dépendant de `tables`."""
+        # Tables encadrées de virgules pour pouvoir les chercher avec LIKE
+        tables = "," + ",".join(sorted(tables)) + ","
+        now = time.time()
+        with self._connection() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO result_cache "
+                "(key, payload, tables, expires) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(payload), tables, now + self.ttl),
+            )
+            connection.execute(
+                "DELETE FROM result_cache WHERE expires < ?", (now,)
+            )
+            connection.execute(
+                "DELETE FROM result_cache WHERE key IN ("
+                "SELECT key FROM result_cache ORDER BY expires DESC "
+                "LIMIT -1 OFFSET ?)",
+                (self.max_size,),
+            )
+
+    def discard(self: object, key: str):
+        """Supprime le résultat associé à `key`."""
+        with self._connection() as connection:
+            connection.execute("DELETE FROM result_cache WHERE key = ?", (key,))
+
+    def invalidate(self: object, tables: frozenset):
+        """Supprime les résultats dépendant d'au moins une table de
+        `tables`."""
+        with self._connection() as connection:
+            for table in tables:
+                connection.execute(
+                    "DELETE FROM result_cache WHERE tables LIKE ?",
+                    (f"%,{table},%",),
+                )
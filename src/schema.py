@@ -3,10 +3,68 @@ Zachary Arnaise
 """
 
 import graphene
+from graphql import GraphQLError
+from rx import Observable
 
+import eager
+import fulltext
+from events import MOVIE_CREATED, PERSON_CREATED, Event
 from models import Movie, MoviePersons, Person
-from schema_mutations import CreateMovie, CreatePerson
-from schema_types import MovieType, PersonType, SearchResult
+from pagination import connection_field, keyset_connection
+from references import ACTOR, DIRECTOR, SONG_WRITER, roles, statuses
+from schema_mutations import (
+    AddCrew,
+    CreateMovie,
+    CreateMovies,
+    CreatePerson,
+    CreatePersons,
+)
+from schema_types import (
+    MovieConnection,
+    MovieType,
+    PersonConnection,
+    PersonType,
+    SearchResult,
+)
+
+# Chemin des objets dans la sélection d'une connexion Relay
+_NODES = ("edges", "node")
+
+# Nombre maximum d'IDs de l'argument `ids` des listes
+MAX_IDS = 500
+
+
+def _role_members(info: graphene.ResolveInfo, role: str):
+    """Requête des personnes ayant eu le rôle `role` sur au moins un film.
+
+    Une seule requête `SELECT DISTINCT person.* ... JOIN movie_persons`,
+    servie par l'index `(person_role_id, person_id)`.
+    """
+    role_id = roles.id_of(info.context["session"], role)
+    return (
+        PersonType.get_query(info=info)
+        .join(MoviePersons, Person.career)
+        .filter(MoviePersons.person_role_id == role_id)
+        .distinct()
+    )
+
+
+def _by_ids(query, model, ids: list) -> list:
+    """Entités d'IDs `ids`, chargées en une seule requête `IN`.
+
+    Returns:
+        list: Entités dans l'ordre de `ids`, `None` pour un ID inconnu.
+
+    Raises:
+        GraphQLError: Plus de `MAX_IDS` IDs demandés.
+    """
+    if len(ids) > MAX_IDS:
+        raise GraphQLError(f"Too many ids: at most {MAX_IDS} are allowed.")
+    wanted = {id_ for id_ in ids if id_ is not None}
+    objects = {}
+    if wanted:
+        objects = {obj.id: obj for obj in query.filter(model.id.in_(wanted))}
+    return [objects.get(id_) for id_ in ids]
 
 
 class Query(graphene.ObjectType):
@@ -18,15 +76,22 @@ class Query(graphene.ObjectType):
         movie (graphene.Field): Champ permettant l'accès à un film
         via son ID, titre français, titre original ou status.
 
-        persons (graphene.List): Liste de toutes les personnes, sans filtrage.
-        movies (graphene.List): Liste de tous les films.
+        persons (graphene.List): Liste de toutes les personnes, ou de celles
+        d'IDs `ids` (dans cet ordre, au plus `MAX_IDS`).
+        movies (graphene.List): Liste de tous les films, ou de ceux d'IDs
+        `ids`.
         directors (graphene.List): Liste de toutes les personnes ayant au moins
         réalisé un film.
         actors (graphene.List): Liste de toutes les personnes ayant au moins
         joué dans un film.
         songWriters (graphene.List): Liste de toutes les personnes ayant au
         moins composé la musique d'un film.
-        search (graphene.List): Liste de champs pour la fonction de recherche.
+        personsConnection, moviesConnection, directorsConnection,
+        actorsConnection, songWritersConnection (graphene.Field): Versions
+        paginées (connexions Relay, arguments `first`/`after`) des listes
+        précédentes.
+        search (graphene.List): Résultats de la recherche plein texte,
+        limités aux `first` plus pertinents (100 au maximum).
     """
 
     person = graphene.Field(
@@ -47,6 +112,7 @@ class Query(graphene.ObjectType):
     def resolve_person(parent: object, info: graphene.ResolveInfo, **kwargs):
         """Méthode qui cherche une personne selon un ou plusieurs critères."""
         query = PersonType.get_query(info=info)
+        query = query.options(*eager.load_options(Person, info))
 
         if "id" in kwargs:
             query = query.filter(Person.id == kwargs["id"])
@@ -60,102 +126,182 @@ class Query(graphene.ObjectType):
     def resolve_movie(parent: object, info: graphene.ResolveInfo, **kwargs):
         """Méthode qui cherche un film selon un ou plusieurs critères."""
         query = MovieType.get_query(info=info)
+        query = query.options(*eager.load_options(Movie, info))
 
         if "id" in kwargs:
             query = query.filter(Movie.id == kwargs["id"])
         if "frenchTitle" in kwargs:
             query = query.filter(Movie.frenchTitle == kwargs["frenchTitle"])
         if "originalTitle" in kwargs:
-            query = query.filter(Movie.frenchTitle == kwargs["originalTitle"])
+            query = query.filter(Movie.originalTitle == kwargs["originalTitle"])
         if "status" in kwargs:
-            query = query.filter(Movie.status == kwargs["status"])
+            status_id = statuses.id_of(
+                info.context["session"], kwargs["status"]
+            )
+            query = query.filter(Movie.statusId == status_id)
 
         return query.first()
 
-    persons = graphene.List(PersonType)
-    movies = graphene.List(MovieType)
+    persons = graphene.List(PersonType, ids=graphene.List(graphene.Int))
+    movies = graphene.List(MovieType, ids=graphene.List(graphene.Int))
     directors = graphene.List(PersonType)
     actors = graphene.List(PersonType)
     songWriters = graphene.List(PersonType)
 
-    def resolve_persons(root: object, info: graphene.ResolveInfo, **kwargs):
+    def resolve_persons(
+        root: object, info: graphene.ResolveInfo, ids=None, **kwargs
+    ):
         query = PersonType.get_query(info=info)
+        query = query.options(*eager.load_options(Person, info))
+        if ids is not None:
+            return _by_ids(query, Person, ids)
         return query.all()
 
-    def resolve_movies(root: object, info: graphene.ResolveInfo, **kwargs):
+    def resolve_movies(
+        root: object, info: graphene.ResolveInfo, ids=None, **kwargs
+    ):
         query = MovieType.get_query(info=info)
+        query = query.options(*eager.load_options(Movie, info))
+        if ids is not None:
+            return _by_ids(query, Movie, ids)
         return query.all()
 
     def resolve_directors(root: object, info: graphene.ResolveInfo, **kwargs):
-        session = info.context["session"]
-        return [
-            res.person
-            for res in session.query(MoviePersons)
-            .filter_by(person_role_id=1)
-            .group_by(MoviePersons.person_id)
-            .all()
-        ]
+        query = _role_members(info, DIRECTOR)
+        query = query.options(*eager.load_options(Person, info))
+        return query.order_by(Person.id).all()
 
     def resolve_actors(root: object, info: graphene.ResolveInfo, **kwargs):
-        session = info.context["session"]
-        return [
-            res.person
-            for res in session.query(MoviePersons)
-            .filter_by(person_role_id=2)
-            .group_by(MoviePersons.person_id)
-            .all()
-        ]
+        query = _role_members(info, ACTOR)
+        query = query.options(*eager.load_options(Person, info))
+        return query.order_by(Person.id).all()
 
     def resolve_songWriters(root: object, info: graphene.ResolveInfo, **kwargs):
-        session = info.context["session"]
-        return [
-            res.person
-            for res in session.query(MoviePersons)
-            .filter_by(person_role_id=3)
-            .group_by(MoviePersons.person_id)
-            .all()
-        ]
-
-    search = graphene.List(SearchResult, q=graphene.String())
+        query = _role_members(info, SONG_WRITER)
+        query = query.options(*eager.load_options(Person, info))
+        return query.order_by(Person.id).all()
+
+    personsConnection = connection_field(PersonConnection)
+    moviesConnection = connection_field(MovieConnection)
+    directorsConnection = connection_field(PersonConnection)
+    actorsConnection = connection_field(PersonConnection)
+    songWritersConnection = connection_field(PersonConnection)
+
+    def resolve_personsConnection(
+        root: object, info: graphene.ResolveInfo, first=None, after=None
+    ):
+        query = PersonType.get_query(info=info)
+        query = query.options(*eager.load_options(Person, info, _NODES))
+        return keyset_connection(
+            PersonConnection, query, Person.id, first, after
+        )
+
+    def resolve_moviesConnection(
+        root: object, info: graphene.ResolveInfo, first=None, after=None
+    ):
+        query = MovieType.get_query(info=info)
+        query = query.options(*eager.load_options(Movie, info, _NODES))
+        return keyset_connection(MovieConnection, query, Movie.id, first, after)
+
+    def resolve_directorsConnection(
+        root: object, info: graphene.ResolveInfo, first=None, after=None
+    ):
+        query = _role_members(info, DIRECTOR)
+        query = query.options(*eager.load_options(Person, info, _NODES))
+        return keyset_connection(
+            PersonConnection, query, Person.id, first, after
+        )
+
+    def resolve_actorsConnection(
+        root: object, info: graphene.ResolveInfo, first=None, after=None
+    ):
+        query = _role_members(info, ACTOR)
+        query = query.options(*eager.load_options(Person, info, _NODES))
+        return keyset_connection(
+            PersonConnection, query, Person.id, first, after
+        )
+
+    def resolve_songWritersConnection(
+        root: object, info: graphene.ResolveInfo, first=None, after=None
+    ):
+        query = _role_members(info, SONG_WRITER)
+        query = query.options(*eager.load_options(Person, info, _NODES))
+        return keyset_connection(
+            PersonConnection, query, Person.id, first, after
+        )
+
+    search = graphene.List(
+        SearchResult,
+        q=graphene.String(),
+        first=graphene.Int(default_value=20),
+    )
 
     def resolve_search(root: object, info: graphene.ResolveInfo, **kwargs):
-        # Requête de recherche
-        q = kwargs.get("q")
-
-        # Recherche d'une personne
-        personsQuery = PersonType.get_query(info)
-        persons = personsQuery.filter(
-            Person.firstName.contains(q) | Person.lastName.contains(q)
-        ).all()
-        # Recherche d'un film
-        moviesQuery = MovieType.get_query(info)
-        movies = moviesQuery.filter(
-            Movie.frenchTitle.contains(q) | Movie.originalTitle.contains(q)
-        ).all()
+        """Recherche plein texte, les résultats les plus pertinents d'abord.
 
-        return persons + movies
+        Chaque mot de `q` est cherché comme préfixe des prénoms/noms et des
+        titres, sans tenir compte de la casse ni des accents.
+        """
+        first = kwargs.get("first")
+        first = 20 if first is None else min(first, 100)
+        return fulltext.search(info.context["session"], kwargs.get("q"), first)
 
 
 class Mutations(graphene.ObjectType):
-    """Mutations, objet principal pour les mutations GraphQL."""
+    """Mutations, objet principal pour les mutations GraphQL.
+
+    Attributes:
+        create_person, create_movie (graphene.Field): Ajout d'une personne,
+        d'un film.
+        create_persons, create_movies, add_crew (graphene.Field): Ajout en
+        masse de personnes, de films et de membres de l'équipe des films, en
+        une seule transaction.
+    """
 
     create_person = CreatePerson.Field()
     create_movie = CreateMovie.Field()
+    create_persons = CreatePersons.Field()
+    create_movies = CreateMovies.Field()
+    add_crew = AddCrew.Field()
+
+
+def _event_stream(
+    root: object, info: graphene.ResolveInfo, topic: str, object_type
+):
+    """Flux d'une subscription pour l'événement `root`.
+
+    Le document d'une subscription est exécuté une fois par événement publié
+    sur le bus (voir `events`), avec l'événement comme valeur racine: le flux
+    contient l'entité créée si l'événement correspond à `topic`, et est vide
+    sinon.
+    """
+    if not isinstance(root, Event) or root.topic != topic:
+        return Observable.empty()
+    model = object_type._meta.model
+    query = object_type.get_query(info=info)
+    query = query.options(*eager.load_options(model, info))
+    instance = query.filter(model.id == root.id).first()
+    return Observable.just(instance) if instance else Observable.empty()
 
 
 class Subscription(graphene.ObjectType):
-    """Subscription permettant de voir les nouveau film ajoutés."""
+    """Subscription permettant de voir les nouveaux films et les nouvelles
+    personnes ajoutés.
+
+    Attributes:
+        new_movie (graphene.Field): Film créé par la mutation `createMovie`.
+        new_person (graphene.Field): Personne créée par la mutation
+        `createPerson`.
+    """
 
     new_movie = graphene.Field(MovieType)
+    new_person = graphene.Field(PersonType)
 
     def resolve_new_movie(root: object, info: graphene.ResolveInfo):
-        import ipdb
+        return _event_stream(root, info, MOVIE_CREATED, MovieType)
 
-        ipdb.set_trace()
-        return root.filter(
-            lambda event: event.operation == CREATED
-            and isinstance(event.instance, MovieType)
-        ).map(lambda event: event.instance)
+    def resolve_new_person(root: object, info: graphene.ResolveInfo):
+        return _event_stream(root, info, PERSON_CREATED, PersonType)
 
 
 schema = graphene.Schema(
@@ -4,10 +4,23 @@ Zachary Arnaise
 
 import graphene
 import sqlalchemy.orm
+from sqlalchemy import text
 
 import models
+import signals
+from events import MOVIE_CREATED, PERSON_CREATED, bus
+from references import roles, statuses
 from schema_types import MovieType, PersonType
 
+# Nombre maximum d'IDs par clause `IN`, sous la limite de variables de SQLite
+_IN_CHUNK_SIZE = 500
+
+# IDs tirés de la séquence d'une colonne `SERIAL` (PostgreSQL)
+_NEXTVAL = text(
+    "SELECT nextval(pg_get_serial_sequence(:table, 'id')) "
+    "FROM generate_series(1, :count)"
+)
+
 
 class PersonInput(graphene.InputObjectType):
     firstName = graphene.String(required=True)
@@ -35,6 +48,7 @@ class CreatePerson(graphene.Mutation):
         # Ajout en base
         session.add(newPerson)
         session.commit()
+        bus.publish(PERSON_CREATED, newPerson.id)
         return CreatePerson(person=newPerson)
 
 
@@ -58,14 +72,286 @@ class CreateMovie(graphene.Mutation):
         newMovie.frenchTitle = movie_data.frenchTitle
         newMovie.originalTitle = movie_data.originalTitle
         # Recherche correspondance ID status
-        for movieStatus in session.query(models.MovieStatus):
-            if movieStatus.description == movie_data.status:
-                newMovie.statusId = movieStatus.id
-                break
+        newMovie.statusId = statuses.id_of(session, movie_data.status)
         if not newMovie.statusId:
             raise RuntimeError
 
         # Ajout en base
         session.add(newMovie)
         session.commit()
+        bus.publish(MOVIE_CREATED, newMovie.id)
         return CreateMovie(movie=newMovie)
+
+
+class MutationItemError(graphene.ObjectType):
+    """Erreur sur un élément d'une mutation en masse, repéré par sa position
+    dans la liste reçue."""
+
+    index = graphene.Int(required=True)
+    message = graphene.String(required=True)
+
+
+def _chunks(values: list):
+    """Découpe `values` en listes utilisables dans une clause `IN`."""
+    for start in range(0, len(values), _IN_CHUNK_SIZE):
+        yield values[start : start + _IN_CHUNK_SIZE]
+
+
+def _max_id(session, model) -> int:
+    """Plus grand ID de la table de `model`, 0 si elle est vide."""
+    return session.query(sqlalchemy.func.max(model.id)).scalar() or 0
+
+
+def _lock(session, table: sqlalchemy.Table):
+    """Verrou d'écriture sur `table`, conservé jusqu'à la fin de la
+    transaction de `session`.
+
+    pysqlite n'ouvre la transaction qu'à la première écriture: le verrou de
+    la base est alors pris dès le début (`BEGIN IMMEDIATE`), ou l'est déjà si
+    la transaction a écrit.
+    """
+    connection = session.connection()
+    if connection.dialect.name == "sqlite":
+        if not connection.connection.in_transaction:
+            connection.execute(text("BEGIN IMMEDIATE"))
+    else:
+        connection.execute(
+            text(f"LOCK TABLE {table.name} IN SHARE ROW EXCLUSIVE MODE")
+        )
+
+
+def _new_ids(session, model, count: int) -> list:
+    """IDs de `count` nouvelles lignes de `model`.
+
+    Avec PostgreSQL, les IDs d'une clé `SERIAL` sont réservés dans sa
+    séquence. Sinon ils suivent le plus grand ID, lu après avoir verrouillé
+    la table en écriture: aucune autre transaction ne peut les attribuer
+    avant la fin de celle de `session`.
+    """
+    table = model.__table__
+    dialect = session.get_bind().dialect.name
+    if dialect == "postgresql" and list(table.primary_key) == [table.c.id]:
+        params = {"table": table.name, "count": count}
+        return [id_ for id_, in session.execute(_NEXTVAL, params)]
+    _lock(session, table)
+    first = _max_id(session, model) + 1
+    return list(range(first, first + count))
+
+
+def _insert(session, model, rows: list) -> list:
+    """Insère `rows` (dictionnaires de colonnes) en une seule requête
+    `INSERT` exécutée pour toutes les lignes (`executemany`), sans passer par
+    l'unité de travail de la session.
+
+    Les IDs sont attribués explicitement (`_new_ids`) plutôt que déduits
+    après coup, ce qui reste juste avec des écritures concurrentes.
+
+    Returns:
+        list: IDs attribués, dans l'ordre de `rows`.
+    """
+    if not rows:
+        return []
+    ids = _new_ids(session, model, len(rows))
+    rows = [dict(row, id=id_) for row, id_ in zip(rows, ids)]
+    session.execute(model.__table__.insert(), rows)
+    signals.mark_changed(session, model.__table__.name)
+    return ids
+
+
+def _load(session, model, ids: list) -> dict:
+    """Objets `model` d'IDs `ids`, indexés par ID."""
+    objects = {}
+    for chunk in _chunks(ids):
+        for obj in session.query(model).filter(model.id.in_(chunk)):
+            objects[obj.id] = obj
+    return objects
+
+
+def _created(session, model, indexes: list, ids: list, size: int) -> list:
+    """Liste des objets créés alignée sur la liste reçue (`None` pour les
+    éléments en erreur)."""
+    objects = _load(session, model, ids)
+    created = [None] * size
+    for index, id_ in zip(indexes, ids):
+        created[index] = objects.get(id_)
+    return created
+
+
+class CreatePersons(graphene.Mutation):
+    """Ajoute plusieurs personnes, en une seule transaction.
+
+    Les éléments invalides sont ignorés et signalés dans `errors`; `persons`
+    est alignée sur la liste reçue, avec `null` pour ces éléments.
+    """
+
+    class Arguments:
+        persons_data = graphene.List(
+            graphene.NonNull(PersonInput), required=True
+        )
+
+    persons = graphene.List(PersonType)
+    errors = graphene.List(graphene.NonNull(MutationItemError))
+
+    def mutate(root: object, info: graphene.ResolveInfo, persons_data=None):
+        session = info.context["session"]
+
+        rows, indexes, errors = [], [], []
+        for index, data in enumerate(persons_data):
+            if not data.firstName.strip() or not data.lastName.strip():
+                message = "firstName and lastName must not be empty."
+            elif data.dateOfDeath and data.dateOfDeath < data.dateOfBirth:
+                message = "dateOfDeath must not be before dateOfBirth."
+            else:
+                message = None
+            if message:
+                errors.append(MutationItemError(index=index, message=message))
+                continue
+            rows.append(
+                {
+                    "firstName": data.firstName,
+                    "lastName": data.lastName,
+                    "dateOfBirth": data.dateOfBirth,
+                    "dateOfDeath": data.dateOfDeath,
+                }
+            )
+            indexes.append(index)
+
+        # Ajout en base
+        ids = _insert(session, models.Person, rows)
+        session.commit()
+        for id_ in ids:
+            bus.publish(PERSON_CREATED, id_)
+
+        persons = _created(
+            session, models.Person, indexes, ids, len(persons_data)
+        )
+        return CreatePersons(persons=persons, errors=errors)
+
+
+class CreateMovies(graphene.Mutation):
+    """Ajoute plusieurs films, en une seule transaction.
+
+    Les éléments invalides (status inconnu) sont ignorés et signalés dans
+    `errors`; `movies` est alignée sur la liste reçue, avec `null` pour ces
+    éléments.
+    """
+
+    class Arguments:
+        movies_data = graphene.List(graphene.NonNull(MovieInput), required=True)
+
+    movies = graphene.List(MovieType)
+    errors = graphene.List(graphene.NonNull(MutationItemError))
+
+    def mutate(root: object, info: graphene.ResolveInfo, movies_data=None):
+        session = info.context["session"]
+
+        rows, indexes, errors = [], [], []
+        for index, data in enumerate(movies_data):
+            status_id = statuses.id_of(session, data.status)
+            if status_id is None:
+                errors.append(
+                    MutationItemError(
+                        index=index, message=f"Unknown status: {data.status}"
+                    )
+                )
+                continue
+            rows.append(
+                {
+                    "frenchTitle": data.frenchTitle,
+                    "originalTitle": data.originalTitle,
+                    "statusId": status_id,
+                    "statusDate": data.statusDate,
+                }
+            )
+            indexes.append(index)
+
+        # Ajout en base
+        ids = _insert(session, models.Movie, rows)
+        session.commit()
+        for id_ in ids:
+            bus.publish(MOVIE_CREATED, id_)
+
+        movies = _created(session, models.Movie, indexes, ids, len(movies_data))
+        return CreateMovies(movies=movies, errors=errors)
+
+
+class CrewInput(graphene.InputObjectType):
+    movieId = graphene.Int(required=True)
+    personId = graphene.Int(required=True)
+    role = graphene.String(required=True)
+
+
+class AddCrew(graphene.Mutation):
+    """Ajoute des personnes à l'équipe de films (table `movie_persons`), en
+    une seule transaction.
+
+    Les éléments invalides (film, personne ou rôle inconnu) et ceux déjà
+    présents sont ignorés et signalés dans `errors`.
+    """
+
+    class Arguments:
+        crew_data = graphene.List(graphene.NonNull(CrewInput), required=True)
+
+    added = graphene.Int()
+    errors = graphene.List(graphene.NonNull(MutationItemError))
+
+    def mutate(root: object, info: graphene.ResolveInfo, crew_data=None):
+        session = info.context["session"]
+
+        movie_ids = list({data.movieId for data in crew_data})
+        person_ids = list({data.personId for data in crew_data})
+        movies = set()
+        persons = set()
+        existing = set()
+        for chunk in _chunks(movie_ids):
+            movies.update(
+                id_
+                for id_, in session.query(models.Movie.id).filter(
+                    models.Movie.id.in_(chunk)
+                )
+            )
+            existing.update(
+                session.query(
+                    models.MoviePersons.movie_id,
+                    models.MoviePersons.person_id,
+                    models.MoviePersons.person_role_id,
+                ).filter(models.MoviePersons.movie_id.in_(chunk))
+            )
+        for chunk in _chunks(person_ids):
+            persons.update(
+                id_
+                for id_, in session.query(models.Person.id).filter(
+                    models.Person.id.in_(chunk)
+                )
+            )
+
+        rows, errors = [], []
+        for index, data in enumerate(crew_data):
+            role_id = roles.id_of(session, data.role)
+            key = (data.movieId, data.personId, role_id)
+            if data.movieId not in movies:
+                message = f"Unknown movie: {data.movieId}"
+            elif data.personId not in persons:
+                message = f"Unknown person: {data.personId}"
+            elif role_id is None:
+                message = f"Unknown role: {data.role}"
+            elif key in existing:
+                message = "Already in the crew."
+            else:
+                message = None
+            if message:
+                errors.append(MutationItemError(index=index, message=message))
+                continue
+            existing.add(key)
+            rows.append(
+                {
+                    "movie_id": data.movieId,
+                    "person_id": data.personId,
+                    "person_role_id": role_id,
+                }
+            )
+
+        # Ajout en base
+        _insert(session, models.MoviePersons, rows)
+        session.commit()
+        return AddCrew(added=len(rows), errors=errors)
@@ -3,9 +3,33 @@ Zachary Arnaise
 """
 
 import graphene
+import sqlalchemy
 from graphene_sqlalchemy import SQLAlchemyObjectType
 
 from models import Movie, Person
+from pagination import CountableConnection
+from references import ACTOR, DIRECTOR, SONG_WRITER, roles, statuses
+
+
+def _related(parent, info: graphene.ResolveInfo, relation: str, role: str):
+    """Entités liées à `parent` avec le rôle `role` via `movie_persons`.
+
+    Si la relation a déjà été chargée (eager loading), on l'utilise
+    directement, sinon le chargement est délégué au DataLoader de la requête.
+    """
+    if relation == "crew":
+        target, loader = "person", info.context["loaders"].crew(role)
+    else:
+        target, loader = "movie", info.context["loaders"].career(role)
+
+    if relation not in sqlalchemy.inspect(parent).unloaded:
+        role_id = roles.id_of(info.context["session"], role)
+        return [
+            getattr(assoc, target)
+            for assoc in getattr(parent, relation)
+            if assoc.person_role_id == role_id
+        ]
+    return loader.load(parent.id)
 
 
 class PersonType(SQLAlchemyObjectType):
@@ -36,25 +60,13 @@ class PersonType(SQLAlchemyObjectType):
         return f"{parent.firstName} {parent.lastName}"
 
     def resolve_directed(parent: object, info: graphene.ResolveInfo):
-        return [
-            assoc.movie
-            for assoc in parent.career
-            if assoc.role.description == "réalisateur"
-        ]
+        return _related(parent, info, "career", DIRECTOR)
 
     def resolve_playedIn(parent: object, info: graphene.ResolveInfo):
-        return [
-            assoc.movie
-            for assoc in parent.career
-            if assoc.role.description == "acteur"
-        ]
+        return _related(parent, info, "career", ACTOR)
 
     def resolve_composed(parent: object, info: graphene.ResolveInfo):
-        return [
-            assoc.movie
-            for assoc in parent.career
-            if assoc.role.description == "compositeur"
-        ]
+        return _related(parent, info, "career", SONG_WRITER)
 
 
 class MovieType(SQLAlchemyObjectType):
@@ -87,28 +99,28 @@ class MovieType(SQLAlchemyObjectType):
     songWriters = graphene.List(of_type=PersonType)
 
     def resolve_status(parent: object, info: graphene.ResolveInfo):
-        return parent.status.description
+        # Description depuis la table en mémoire, sans jointure ni chargement
+        # de la relation `status`
+        return statuses.description_of(info.context["session"], parent.statusId)
 
     def resolve_directors(parent: object, info: graphene.ResolveInfo):
-        return [
-            assoc.person
-            for assoc in parent.crew
-            if assoc.role.description == "réalisateur"
-        ]
+        return _related(parent, info, "crew", DIRECTOR)
 
     def resolve_actors(parent: object, info: graphene.ResolveInfo):
-        return [
-            assoc.person
-            for assoc in parent.crew
-            if assoc.role.description == "acteur"
-        ]
+        return _related(parent, info, "crew", ACTOR)
 
     def resolve_songWriters(parent: object, info: graphene.ResolveInfo):
-        return [
-            assoc.person
-            for assoc in parent.crew
-            if assoc.role.description == "compositeur"
-        ]
+        return _related(parent, info, "crew", SONG_WRITER)
+
+
+class PersonConnection(CountableConnection):
+    class Meta:
+        node = PersonType
+
+
+class MovieConnection(CountableConnection):
+    class Meta:
+        node = MovieType
 
 
 class SearchResult(graphene.Union):
@@ -0,0 +1,111 @@
+""" LPGL - IUT Metz
+Zachary Arnaise
+
+Cycle de vie des sessions SQLAlchemy: une session par requête HTTP.
+
+La session est ouverte à la première utilisation par le registre
+`scoped_session` (une par thread), puis partagée par tous les resolvers et
+toutes les opérations d'une requête groupée: un objet chargé une fois est
+retrouvé dans l'identity map sans nouvelle requête SQL.
+
+À la fin de la requête, la transaction en cours est annulée et la session
+fermée: les threads du serveur étant réutilisés, la requête suivante repart
+d'une session vide, sans objets périmés, et la mémoire occupée par les objets
+chargés est libérée. Le nombre d'objets chargés par requête est mesuré
+(métrique `sqlalchemy_session_objects`) une fois `instrument` appelée.
+"""
+
+import logging
+
+import falcon
+import sqlalchemy.orm
+
+import metrics
+
+logger = logging.getLogger("sessions")
+
+
+def _loaded_as_persistent(session, instance):
+    session.info["objects"] = session.info.get("objects", 0) + 1
+
+
+def instrument():
+    """Compte les objets chargés par les sessions du processus.
+
+    Les sessions en lecture seule étant créées par une fabrique répartissant
+    les requêtes entre les réplicas (voir `database`), l'événement est écouté
+    sur la classe `Session` plutôt que sur chaque registre.
+    """
+    session_class = sqlalchemy.orm.Session
+    if not sqlalchemy.event.contains(
+        session_class, "loaded_as_persistent", _loaded_as_persistent
+    ):
+        sqlalchemy.event.listen(
+            session_class, "loaded_as_persistent", _loaded_as_persistent
+        )
+
+
+def release(*registries: sqlalchemy.orm.scoped_session) -> int:
+    """Annule la transaction en cours et ferme les sessions du thread courant.
+
+    Args:
+        registries (sqlalchemy.orm.scoped_session): Registres des sessions,
+        les `None` sont ignorés.
+
+    Returns:
+        int: Nombre d'objets chargés par les sessions (voir `instrument`).
+    """
+    objects = 0
+    for registry in registries:
+        if registry is None:
+            continue
+        # Pas de session ouverte par la requête: rien à fermer
+        if registry.registry.has():
+            session = registry()
+            objects += session.info.get("objects", 0)
+            session.rollback()
+        registry.remove()
+    metrics.session_objects.observe(objects)
+    logger.debug("Sessions fermées, %d objets chargés", objects)
+    return objects
+
+
+class SessionMiddleware(object):
+    """Middleware Falcon (WSGI) fermant les sessions à la fin de chaque
+    requête.
+
+    Les resources sont exécutées dans le thread de la requête: les sessions
+    de ce thread sont celles de la requête. Le nombre d'objets chargés est
+    conservé dans `req.context.session_objects`.
+
+    La version ASGI de la resource GraphQL, qui exécute les requêtes dans son
+    propre pool de threads, ferme elle-même les sessions (voir
+    `AsyncResourceGraphQL`).
+    """
+
+    def __init__(self: object, *registries: sqlalchemy.orm.scoped_session):
+        """Constructeur.
+
+        Args:
+            registries (sqlalchemy.orm.scoped_session): Registres des
+            sessions à fermer, les `None` sont ignorés.
+        """
+        self.registries = registries
+
+    def process_request(
+        self: object, req: falcon.Request, resp: falcon.Response
+    ):
+        # Session laissée ouverte hors d'une requête (démarrage...): la
+        # requête ne doit pas en hériter
+        for registry in self.registries:
+            if registry is not None:
+                registry.remove()
+
+    def process_response(
+        self: object,
+        req: falcon.Request,
+        resp: falcon.Response,
+        resource: object,
+        req_succeeded: bool,
+    ):
+        req.context.session_objects = release(*self.registries)
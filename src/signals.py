@@ -0,0 +1,62 @@
+""" LPGL - IUT Metz
+Zachary Arnaise
+
+Notification des tables modifiées par une transaction, une fois celle-ci
+validée (`commit`).
+
+Les objets ajoutés, modifiés ou supprimés via l'ORM sont suivis
+automatiquement; les insertions en masse, qui contournent l'unité de travail
+de la session, doivent être signalées avec `mark_changed`.
+"""
+
+import itertools
+
+import sqlalchemy
+import sqlalchemy.orm
+
+_CHANGED_TABLES = "changed_tables"
+
+_listeners = []
+
+
+def on_commit(callback):
+    """Enregistre `callback(tables)`, appelé après chaque commit ayant
+    modifié au moins une table.
+
+    Args:
+        callback (callable): Reçoit l'ensemble des noms de tables modifiées.
+    """
+    _listeners.append(callback)
+
+
+def mark_changed(session, *tables: str):
+    """Signale que la transaction en cours de `session` modifie `tables`."""
+    session.info.setdefault(_CHANGED_TABLES, set()).update(tables)
+
+
+def changed_tables(session) -> frozenset:
+    """Tables modifiées par la transaction en cours de `session` (flushées
+    ou signalées avec `mark_changed`)."""
+    return frozenset(session.info.get(_CHANGED_TABLES, ()))
+
+
+@sqlalchemy.event.listens_for(sqlalchemy.orm.Session, "after_flush")
+def _after_flush(session, flush_context):
+    """Note les tables des objets écrits par le flush."""
+    for obj in itertools.chain(session.new, session.dirty, session.deleted):
+        mark_changed(session, obj.__table__.name)
+
+
+@sqlalchemy.event.listens_for(sqlalchemy.orm.Session, "after_commit")
+def _after_commit(session):
+    """Notifie les tables modifiées par la transaction validée."""
+    tables = session.info.pop(_CHANGED_TABLES, None)
+    if tables:
+        for callback in _listeners:
+            callback(frozenset(tables))
+
+
+@sqlalchemy.event.listens_for(sqlalchemy.orm.Session, "after_rollback")
+def _after_rollback(session):
+    """Oublie les tables d'une transaction annulée."""
+    session.info.pop(_CHANGED_TABLES, None)
@@ -0,0 +1,105 @@
+""" LPGL - IUT Metz
+Zachary Arnaise
+
+Mesure de la durée des resolvers, pour les métriques et pour le bloc
+`extensions.tracing` des réponses, au format Apollo Tracing:
+https://github.com/apollographql/apollo-tracing
+"""
+
+import datetime
+import time
+
+from graphql.type.definition import get_named_type, is_leaf_type
+from promise import Promise, is_thenable
+
+import metrics
+
+
+def _timestamp(value: datetime.datetime) -> str:
+    """Date au format RFC 3339, en UTC."""
+    return value.strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+
+class Trace(object):
+    """Durées des resolvers d'une opération GraphQL."""
+
+    def __init__(self: object):
+        """Constructeur."""
+        self.start_time = datetime.datetime.utcnow()
+        self.end_time = None
+        self.start = time.perf_counter()
+        self.duration = None
+        self.resolvers = []
+
+    def _offset(self: object, instant: float) -> int:
+        """Nanosecondes écoulées entre le début de l'opération et
+        `instant`."""
+        return int((instant - self.start) * 1e9)
+
+    def add_resolver(self: object, info, start: float, end: float):
+        """Enregistre l'exécution d'un resolver."""
+        self.resolvers.append(
+            {
+                "path": list(info.path),
+                "parentType": str(info.parent_type),
+                "fieldName": info.field_name,
+                "returnType": str(info.return_type),
+                "startOffset": self._offset(start),
+                "duration": int((end - start) * 1e9),
+            }
+        )
+
+    def finish(self: object):
+        """Marque la fin de l'opération."""
+        self.end_time = datetime.datetime.utcnow()
+        self.duration = self._offset(time.perf_counter())
+
+    def as_dict(self: object) -> dict:
+        """Bloc `extensions.tracing` de la réponse."""
+        return {
+            "version": 1,
+            "startTime": _timestamp(self.start_time),
+            "endTime": _timestamp(self.end_time),
+            "duration": self.duration,
+            "execution": {"resolvers": self.resolvers},
+        }
+
+
+class TracingMiddleware(object):
+    """Middleware graphql-core mesurant la durée des resolvers.
+
+    Les champs objets et listes d'objets, ceux qui accèdent à la base, sont
+    toujours mesurés pour les métriques. Tous les champs le sont si
+    l'opération est tracée (`Trace` dans `context["tracing"]`).
+    """
+
+    def resolve(self: object, next, root, info, **args):
+        trace = None
+        if isinstance(info.context, dict):
+            trace = info.context.get("tracing")
+        leaf = is_leaf_type(get_named_type(info.return_type))
+        if trace is None and leaf:
+            return next(root, info, **args)
+
+        start = time.perf_counter()
+        result = next(root, info, **args)
+        if is_thenable(result):
+            # Resolver en attente d'un DataLoader: mesuré jusqu'à sa valeur
+            return Promise.resolve(result).then(
+                lambda value: self._record(trace, leaf, info, start, value)
+            )
+        return self._record(trace, leaf, info, start, result)
+
+    @staticmethod
+    def _record(trace: Trace, leaf: bool, info, start: float, value):
+        """Enregistre la durée d'un resolver et renvoie sa valeur."""
+        end = time.perf_counter()
+        if not leaf:
+            metrics.resolver_duration.observe(
+                end - start,
+                type=str(info.parent_type),
+                field=info.field_name,
+            )
+        if trace is not None:
+            trace.add_resolver(info, start, end)
+        return value
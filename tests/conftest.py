@@ -0,0 +1,133 @@
+""" LPGL - IUT Metz
+Zachary Arnaise
+
+Fixtures des tests: serveur GraphQL sur une copie temporaire de
+`data/movies.db`, avec comptage des requêtes SQL.
+
+    python -m pytest tests
+"""
+
+import os
+import shutil
+import sys
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+import falcon  # noqa: E402
+import falcon.asgi  # noqa: E402
+import falcon.testing  # noqa: E402
+import sqlalchemy  # noqa: E402
+import sqlalchemy.orm  # noqa: E402
+
+import database  # noqa: E402
+import migrations  # noqa: E402
+import references  # noqa: E402
+import sessions  # noqa: E402
+from resources import AsyncResourceGraphQL, ResourceGraphQL  # noqa: E402
+from schema import schema  # noqa: E402
+
+# Base de référence, copiée pour chaque test
+DATABASE = os.path.join(ROOT, "data", "movies.db")
+
+
+class Database(object):
+    """Copie de `data/movies.db` dans `directory`, migrée comme au
+    démarrage du serveur."""
+
+    def __init__(self: object, directory: str):
+        """Constructeur."""
+        self.path = os.path.join(str(directory), "movies.db")
+        shutil.copy(DATABASE, self.path)
+        self.engine = database.create_engine(
+            {"DATABASE_URL": f"sqlite:///{self.path}"}
+        )
+        migrations.migrate(self.engine)
+        self.statements = 0
+        sqlalchemy.event.listen(
+            self.engine, "before_cursor_execute", self._count
+        )
+        self.scoped_session = sqlalchemy.orm.scoped_session(
+            sqlalchemy.orm.sessionmaker(bind=self.engine)
+        )
+        references.invalidate()
+        references.load(self.scoped_session)
+        self.scoped_session.remove()
+
+    def _count(self: object, *args):
+        self.statements += 1
+
+    def close(self: object):
+        """Ferme les sessions et les connexions."""
+        self.scoped_session.remove()
+        self.engine.dispose()
+        references.invalidate()
+
+
+class Client(object):
+    """Client de test de l'endpoint `/graphql`."""
+
+    def __init__(self: object, app, db: Database):
+        """Constructeur."""
+        self.client = falcon.testing.TestClient(app)
+        self.db = db
+
+    def post(self: object, body, **kwargs) -> falcon.testing.Result:
+        """Envoie `body` (opération ou liste d'opérations) en POST."""
+        self.db.statements = 0
+        return self.client.simulate_post("/graphql", json=body, **kwargs)
+
+    def query(self: object, query: str, **variables) -> dict:
+        """Exécute `query` en POST et renvoie la réponse décodée."""
+        result = self.post({"query": query, "variables": variables or None})
+        return result.json
+
+    def get(self: object, query: str, **kwargs) -> falcon.testing.Result:
+        """Envoie `query` en GET."""
+        self.db.statements = 0
+        return self.client.simulate_get(
+            "/graphql", params={"query": query}, **kwargs
+        )
+
+
+@pytest.fixture
+def db(tmp_path):
+    """Base de test."""
+    sessions.instrument()
+    db = Database(tmp_path)
+    yield db
+    db.close()
+
+
+@pytest.fixture
+def resource(db):
+    """Resource GraphQL (WSGI) sur la base de test."""
+    return ResourceGraphQL(schema=schema, scoped_session=db.scoped_session)
+
+
+@pytest.fixture
+def client(db, resource):
+    """Client du serveur WSGI, avec la gestion des sessions par requête."""
+    app = falcon.App(middleware=[sessions.SessionMiddleware(db.scoped_session)])
+    app.add_route("/graphql", resource)
+    return Client(app, db)
+
+
+@pytest.fixture
+def async_resource(db):
+    """Resource GraphQL (ASGI) sur la base de test."""
+    resource = AsyncResourceGraphQL(
+        schema=schema, scoped_session=db.scoped_session, max_workers=2
+    )
+    yield resource
+    resource.executor.shutdown(wait=True)
+
+
+@pytest.fixture
+def async_client(db, async_resource):
+    """Client du serveur ASGI."""
+    app = falcon.asgi.App()
+    app.add_route("/graphql", async_resource)
+    return Client(app, db)
@@ -0,0 +1,55 @@
+""" LPGL - IUT Metz
+Zachary Arnaise
+
+Serveur ASGI (`AsyncResourceGraphQL`): mêmes réponses que le serveur WSGI,
+traitement des requêtes dans le pool de threads.
+"""
+
+import asyncio
+import threading
+
+import falcon.asgi
+import falcon.testing
+
+QUERY = "{ movie(id: 1) { id frenchTitle actors { id fullName } } }"
+
+
+def test_same_responses_as_wsgi(client, async_client):
+    for query in (QUERY, "{ persons { id } }", "{ movie(id: 0) { id } }"):
+        expected = client.post({"query": query})
+        result = async_client.post({"query": query})
+        assert result.status_code == expected.status_code
+        assert result.json == expected.json
+    assert async_client.get(QUERY).json == client.get(QUERY).json
+
+
+def test_requests_run_in_pool(async_resource):
+    app = falcon.asgi.App()
+    app.add_route("/graphql", async_resource)
+    post = async_resource._post
+    # Deux requêtes doivent être traitées en même temps pour franchir la
+    # barrière, chacune dans un thread du pool
+    barrier = threading.Barrier(2, timeout=10)
+    threads = []
+
+    def _post(*args):
+        threads.append(threading.current_thread().name)
+        barrier.wait()
+        return post(*args)
+
+    async_resource._post = _post
+
+    async def run():
+        async with falcon.testing.ASGIConductor(app) as conductor:
+            return await asyncio.gather(
+                *[
+                    conductor.simulate_post("/graphql", json={"query": QUERY})
+                    for _ in range(2)
+                ]
+            )
+
+    results = falcon.async_to_sync(run)
+    assert [result.status_code for result in results] == [200, 200]
+    assert all("errors" not in result.json for result in results)
+    assert len(set(threads)) == 2
+    assert all(name.startswith("graphql") for name in threads)
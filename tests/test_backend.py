@@ -0,0 +1,65 @@
+""" LPGL - IUT Metz
+Zachary Arnaise
+
+Cache LRU des documents parsés et validés (`backend`).
+"""
+
+import pytest
+from graphql.error import GraphQLSyntaxError
+
+from backend import CachedDocumentBackend
+from schema import schema
+
+
+def test_documents_are_parsed_once():
+    backend = CachedDocumentBackend(max_size=2)
+    first = backend.document_from_string(schema, "{ movies { id } }")
+    assert backend.document_from_string(schema, "{ movies { id } }") is first
+    assert backend.stats() == {
+        "size": 1,
+        "maxSize": 2,
+        "hits": 1,
+        "misses": 1,
+        "evictions": 0,
+    }
+
+
+def test_least_recently_used_documents_are_evicted():
+    backend = CachedDocumentBackend(max_size=2)
+    a = backend.document_from_string(schema, "{ a: movies { id } }")
+    backend.document_from_string(schema, "{ b: movies { id } }")
+    # `a` devient le plus récemment utilisé, `b` est retiré
+    assert backend.document_from_string(schema, "{ a: movies { id } }") is a
+    backend.document_from_string(schema, "{ c: movies { id } }")
+
+    stats = backend.stats()
+    assert (stats["size"], stats["evictions"]) == (2, 1)
+    assert backend.document_from_string(schema, "{ a: movies { id } }") is a
+    backend.document_from_string(schema, "{ b: movies { id } }")
+    assert backend.stats()["misses"] == 4
+
+
+def test_validation_errors_are_cached_with_the_document():
+    backend = CachedDocumentBackend()
+    document = backend.document_from_string(schema, "{ movies { nope } }")
+    assert document.validation_errors
+    result = document.execute()
+    assert result.invalid
+    assert backend.document_from_string(schema, "{ movies { nope } }") is (
+        document
+    )
+
+
+def test_syntax_errors_are_not_cached():
+    backend = CachedDocumentBackend()
+    for _ in range(2):
+        with pytest.raises(GraphQLSyntaxError):
+            backend.document_from_string(schema, "{ movies {")
+    assert backend.stats()["size"] == 0
+
+
+def test_resource_reuses_cached_documents(client, resource):
+    client.query("{ movie(id: 1) { id } }")
+    misses = resource.backend.stats()["misses"]
+    client.query("{ movie(id: 1) { id } }")
+    assert resource.backend.stats()["misses"] == misses
@@ -0,0 +1,62 @@
+""" LPGL - IUT Metz
+Zachary Arnaise
+
+Requêtes groupées (batch): liste d'opérations dans un seul POST.
+"""
+
+MOVIE = "query ($id: Int) { movie(id: $id) { id } }"
+
+
+def test_results_follow_the_operations_order(client):
+    result = client.post(
+        [
+            {"query": MOVIE, "variables": {"id": 2}},
+            {"query": "{ person(id: 1) { lastName } }"},
+            {"query": MOVIE, "variables": {"id": 1}},
+        ]
+    )
+    assert result.status_code == 200
+    assert result.json == [
+        {"data": {"movie": {"id": "2"}}},
+        {"data": {"person": {"lastName": "Chabbat"}}},
+        {"data": {"movie": {"id": "1"}}},
+    ]
+
+
+def test_invalid_operations_do_not_stop_the_batch(client):
+    result = client.post(
+        [
+            "not an operation",
+            {"variables": {}},
+            {"query": "{ movie(id: 1) { nope } }"},
+            {"query": MOVIE, "variables": {"id": 1}},
+        ]
+    ).json
+    assert len(result) == 4
+    assert result[0]["errors"][0]["message"] == "POST body is invalid JSON."
+    assert result[1]["errors"][0]["message"] == "Must provide query string."
+    assert result[2]["errors"]
+    assert result[3] == {"data": {"movie": {"id": "1"}}}
+
+
+def test_operations_share_one_context(client, resource, monkeypatch):
+    contexts = []
+    build = resource._context
+
+    def _context(*args):
+        contexts.append(build(*args))
+        return contexts[-1]
+
+    monkeypatch.setattr(resource, "_context", _context)
+    client.post([{"query": MOVIE, "variables": {"id": i}} for i in (1, 2)])
+    assert len(contexts) == 1
+
+
+def test_batch_size_is_limited(client, resource):
+    assert client.post([]).status_code == 400
+    resource.max_batch_size = 2
+    result = client.post([{"query": MOVIE}] * 3)
+    assert result.status_code == 400
+    assert result.json["errors"][0]["message"] == (
+        "Too many operations in batch."
+    )
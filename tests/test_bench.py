@@ -0,0 +1,92 @@
+""" LPGL - IUT Metz
+Zachary Arnaise
+
+Benchmark (`bench/`): génération d'un catalogue synthétique et mesure des
+documents représentatifs.
+"""
+
+import os
+import sqlite3
+import sys
+
+import pytest
+
+import references
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "bench")
+)
+
+import generate  # noqa: E402
+import run as bench  # noqa: E402
+
+MOVIES = 200
+PERSONS = 100
+
+
+def _rows(path: str, table: str) -> list:
+    connection = sqlite3.connect(path)
+    try:
+        return connection.execute(
+            f"SELECT * FROM {table} ORDER BY id"
+        ).fetchall()
+    finally:
+        connection.close()
+
+
+@pytest.fixture(scope="module")
+def catalogue(tmp_path_factory):
+    """Petit catalogue généré."""
+    path = str(tmp_path_factory.mktemp("bench") / "catalogue.db")
+    generate.generate(path, MOVIES, PERSONS, seed=3)
+    return path
+
+
+def test_catalogue_is_deterministic(catalogue, tmp_path):
+    other = str(tmp_path / "other.db")
+    generate.generate(other, MOVIES, PERSONS, seed=3)
+    for table in ("person", "movie", "movie_persons"):
+        assert _rows(other, table) == _rows(catalogue, table)
+
+    generate.generate(other, MOVIES, PERSONS, seed=4)
+    assert _rows(other, "movie") != _rows(catalogue, "movie")
+
+
+def test_catalogue_content(catalogue):
+    assert len(_rows(catalogue, "movie")) == MOVIES
+    assert len(_rows(catalogue, "person")) == PERSONS
+    assert _rows(catalogue, "movie_status") == list(generate.STATUSES)
+
+    crew = {}
+    for _, movie_id, person_id, role_id in _rows(catalogue, "movie_persons"):
+        crew.setdefault((movie_id, role_id), []).append(person_id)
+    for movie_id in range(1, MOVIES + 1):
+        assert 1 <= len(crew[(movie_id, 1)]) <= 2
+        assert 3 <= len(set(crew[(movie_id, 2)])) <= 12
+        assert len(crew.get((movie_id, 3), ())) <= 1
+    # Pas de doublon (film, personne, rôle)
+    assert all(len(set(ids)) == len(ids) for ids in crew.values())
+
+
+def test_measure(catalogue):
+    server = bench.Catalogue(catalogue)
+    try:
+        assert server.sizes["movie"] == MOVIES
+        for name in bench.DOCUMENTS:
+            result = bench.measure(server, name, iterations=3, warmup=1, seed=1)
+            latency = result["latency_ms"]
+            assert 0 < latency["min"] <= latency["p50"] <= latency["max"]
+            assert result["sql_statements"]["min"] >= 1
+            assert result["peak_memory_kib"] > 0
+    finally:
+        server.close()
+        references.invalidate()
+    # Le catalogue d'origine n'est pas modifié
+    assert len(_rows(catalogue, "movie")) == MOVIES
+
+
+def test_percentile():
+    values = [1.0, 2.0, 3.0, 4.0]
+    assert bench._percentile(values, 0) == 1.0
+    assert bench._percentile(values, 50) == 2.5
+    assert bench._percentile(values, 100) == 4.0
@@ -0,0 +1,113 @@
+""" LPGL - IUT Metz
+Zachary Arnaise
+
+Profondeur et coût des opérations (`complexity`), vérifiés avant
+l'exécution.
+"""
+
+import pytest
+
+from complexity import ComplexityAnalyzer
+from resources import ResourceGraphQL
+from schema import schema
+
+NESTED = "{ movie(id: 1) { actors { playedIn { id } } } }"
+
+
+@pytest.fixture
+def analyze(db):
+    """Profondeur et coût d'une requête."""
+    analyzer = ComplexityAnalyzer()
+    backend = ResourceGraphQL(
+        schema=schema, scoped_session=db.scoped_session
+    ).backend
+
+    def _analyze(query: str, **variables):
+        document = backend.document_from_string(schema, query)
+        return analyzer.analyze(document, db.scoped_session(), variables)
+
+    yield _analyze
+    db.scoped_session.remove()
+
+
+def _count(db, table: str) -> int:
+    with db.engine.connect() as connection:
+        return connection.execute(f"SELECT COUNT(*) FROM {table}").scalar()
+
+
+def test_depth(analyze):
+    assert analyze("{ movie(id: 1) { id } }").depth == 2
+    assert analyze(NESTED).depth == 4
+
+
+def test_cost_of_root_lists(db, analyze):
+    # Une ligne par film
+    assert analyze("{ movies { id } }").cost == _count(db, "movie")
+    assert analyze("{ movies(ids: [1, 2]) { id } }").cost == 2
+    assert (
+        analyze(
+            "query ($ids: [Int]) { movies(ids: $ids) { id } }", ids=[1, 2, 3]
+        ).cost
+        == 3
+    )
+
+
+def test_cost_of_pages(analyze):
+    # Connexion (1) + 3 edges, chacun avec son node (2)
+    query = "{ moviesConnection(first: 3) { edges { node { id } } } }"
+    assert analyze(query).cost == 1 + 3 * 2
+
+
+def test_cost_of_nested_lists(db, analyze):
+    # Liste imbriquée: nombre moyen d'entrées d'équipe par film
+    per_movie = -(-_count(db, "movie_persons") // _count(db, "movie"))
+    assert analyze("{ movie(id: 1) { actors { id } } }").cost == 1 + per_movie
+
+
+def test_recursive_fragments_terminate(analyze):
+    query = """
+    { movie(id: 1) { ...M } }
+    fragment M on MovieType { id actors { playedIn { ...M } } }
+    """
+    assert analyze(query).depth > 10
+
+
+@pytest.fixture
+def resource(db):
+    """Resource GraphQL limitant la profondeur et le coût."""
+    return ResourceGraphQL(
+        schema=schema,
+        scoped_session=db.scoped_session,
+        complexity=ComplexityAnalyzer(max_depth=4, max_cost=20),
+    )
+
+
+def test_accepted_queries_report_their_cost(client):
+    result = client.post({"query": "{ movie(id: 1) { actors { id } } }"})
+    assert result.status_code == 200
+    assert "errors" not in result.json
+    complexity = result.json["extensions"]["complexity"]
+    assert complexity["depth"] == 3 and complexity["maxDepth"] == 4
+    assert 0 < complexity["cost"] <= complexity["maxCost"] == 20
+
+
+@pytest.mark.parametrize(
+    "query, code",
+    [
+        (
+            "{ movie(id: 1) { actors { playedIn { actors { id } } } } }",
+            "QUERY_TOO_DEEP",
+        ),
+        (
+            "{ moviesConnection(first: 30) { edges { node { id } } } }",
+            "QUERY_TOO_COMPLEX",
+        ),
+    ],
+)
+def test_rejected_queries(client, query, code):
+    result = client.post({"query": query})
+    assert result.status_code == 400
+    assert "data" not in result.json
+    error = result.json["errors"][0]
+    assert error["extensions"]["code"] == code
+    assert error["message"].startswith("Query is too")
@@ -0,0 +1,68 @@
+""" LPGL - IUT Metz
+Zachary Arnaise
+
+Compression des réponses et ETag de la représentation négociée
+(`compression`).
+"""
+
+import gzip
+
+import falcon
+import falcon.testing
+import pytest
+
+from compression import CompressionMiddleware
+
+QUERY = "{ movies { id frenchTitle originalTitle status } }"
+
+
+@pytest.fixture
+def compressed(db, resource):
+    """Client d'un serveur compressant toutes les réponses."""
+    app = falcon.App(middleware=[CompressionMiddleware(min_size=0)])
+    app.add_route("/graphql", resource)
+    return falcon.testing.TestClient(app)
+
+
+def _get(client, **headers) -> falcon.testing.Result:
+    return client.simulate_get(
+        "/graphql", params={"query": QUERY}, headers=headers
+    )
+
+
+def test_gzip_response_and_etag(compressed):
+    plain = _get(compressed, **{"Accept-Encoding": "identity"})
+    coded = _get(compressed, **{"Accept-Encoding": "gzip"})
+
+    assert "content-encoding" not in plain.headers
+    assert coded.headers["content-encoding"] == "gzip"
+    assert gzip.decompress(coded.content) == plain.content
+    assert coded.headers["etag"] == plain.headers["etag"][:-1] + '-gzip"'
+    assert coded.headers["vary"] == "Accept-Encoding"
+
+
+def test_304_for_the_negotiated_representation(compressed):
+    etag = _get(compressed, **{"Accept-Encoding": "gzip"}).headers["etag"]
+    result = _get(
+        compressed, **{"Accept-Encoding": "gzip", "If-None-Match": etag}
+    )
+    assert result.status_code == 304
+    assert result.headers["etag"] == etag
+
+
+def test_no_304_for_another_representation(compressed):
+    etag = _get(compressed, **{"Accept-Encoding": "gzip"}).headers["etag"]
+    result = _get(
+        compressed, **{"Accept-Encoding": "identity", "If-None-Match": etag}
+    )
+    assert result.status_code == 200
+    assert "content-encoding" not in result.headers
+
+
+def test_uncompressed_etag_still_matches(compressed):
+    # Représentation non compressée détenue par un client acceptant gzip
+    etag = _get(compressed, **{"Accept-Encoding": "identity"}).headers["etag"]
+    result = _get(
+        compressed, **{"Accept-Encoding": "gzip", "If-None-Match": etag}
+    )
+    assert result.status_code == 304
@@ -0,0 +1,108 @@
+""" LPGL - IUT Metz
+Zachary Arnaise
+
+Moteur SQLAlchemy configuré par l'environnement (`database`): pool de
+connexions, pragmas SQLite, bases en lecture seule.
+"""
+
+import pytest
+import sqlalchemy
+from sqlalchemy.pool import QueuePool, StaticPool
+
+import database
+
+
+def _pragma(engine, name: str):
+    with engine.connect() as connection:
+        return connection.execute(f"PRAGMA {name}").scalar()
+
+
+def test_sqlite_pragmas(db):
+    engine = database.create_engine(
+        {
+            "DATABASE_URL": f"sqlite:///{db.path}",
+            "SQLITE_CACHE_SIZE": "1024",
+            "SQLITE_SYNCHRONOUS": "FULL",
+        }
+    )
+    try:
+        assert _pragma(engine, "journal_mode") == "wal"
+        assert _pragma(engine, "synchronous") == 2  # FULL
+        assert _pragma(engine, "cache_size") == -1024
+        assert _pragma(engine, "query_only") == 0
+    finally:
+        engine.dispose()
+
+
+def test_read_only_pragmas():
+    pragmas = database.sqlite_pragmas({}, read_only=True)
+    assert "journal_mode" not in pragmas
+    assert pragmas["query_only"] == 1
+    assert database.sqlite_pragmas({})["journal_mode"] == "WAL"
+
+
+def test_pool_settings(db):
+    engine = database.create_engine(
+        {
+            "DATABASE_URL": f"sqlite:///{db.path}",
+            "DB_POOL_SIZE": "3",
+            "DB_MAX_OVERFLOW": "1",
+        }
+    )
+    try:
+        # Pool partagé par les threads du serveur
+        assert isinstance(engine.pool, QueuePool)
+        assert engine.pool.size() == 3
+        assert engine.pool._max_overflow == 1
+    finally:
+        engine.dispose()
+
+    engine = database.create_engine({"DATABASE_URL": "sqlite://"})
+    assert isinstance(engine.pool, StaticPool)
+
+
+def test_postgresql_pool_settings():
+    pytest.importorskip("psycopg2")
+    engine = database.create_engine(
+        {"DATABASE_URL": "postgresql://user@localhost/movies"}
+    )
+    assert engine.pool.size() == int(database.DEFAULTS["DB_POOL_SIZE"])
+    assert engine.pool._pre_ping
+
+
+def test_read_engines(db):
+    environ = {"DATABASE_URL": f"sqlite:///{db.path}"}
+    # Par défaut, le fichier SQLite est rouvert en lecture seule
+    [engine] = database.create_read_engines(environ)
+    try:
+        assert _pragma(engine, "query_only") == 1
+        with engine.connect() as connection:
+            assert connection.execute("SELECT COUNT(*) FROM movie").scalar()
+            with pytest.raises(sqlalchemy.exc.OperationalError):
+                connection.execute("DELETE FROM movie")
+    finally:
+        engine.dispose()
+
+    replicas = "postgresql://replica1/movies, postgresql://replica2/movies"
+    assert database.read_urls(dict(environ, DATABASE_READ_URLS=replicas)) == [
+        "postgresql://replica1/movies",
+        "postgresql://replica2/movies",
+    ]
+    assert database.read_urls({"DATABASE_URL": "postgresql://db/movies"}) == []
+
+
+def test_data_path(db):
+    environ = {"DATABASE_URL": f"sqlite:///{db.path}"}
+    assert database.data_path("cache.db", environ) == str(db.path).replace(
+        "movies.db", "cache.db"
+    )
+    assert (
+        database.data_path(
+            "cache.db", {"DATABASE_URL": "postgresql://db/movies"}
+        )
+        == "/db/cache.db"
+    )
+    assert (
+        database.data_path("cache.db", dict(environ, DATA_DIR="/data"))
+        == "/data/cache.db"
+    )
@@ -0,0 +1,75 @@
+""" LPGL - IUT Metz
+Zachary Arnaise
+
+Chargement anticipé guidé par la sélection GraphQL (`eager`): un nombre fixe
+de requêtes SQL, quel que soit le nombre d'objets renvoyés.
+"""
+
+from graphql import parse
+
+import eager
+from models import Movie, Person
+
+NESTED = "{ movies { id actors { id playedIn { id } } directors { id } } }"
+
+
+def test_unselected_relations_are_not_loaded(client):
+    result = client.query("{ movies { id frenchTitle } }")
+    assert len(result["data"]["movies"]) > 1
+    assert client.db.statements == 1
+
+
+def test_nested_relations_use_a_fixed_number_of_queries(client):
+    result = client.query(NESTED)
+    movies = result["data"]["movies"]
+    assert sum(len(movie["actors"]) for movie in movies) > len(movies)
+    # Films, version des données (rôles), équipes puis carrières des acteurs
+    assert client.db.statements == 4
+
+
+def test_fragments_are_followed(client):
+    direct = client.query("{ persons { id directed { id } } }")
+    statements = client.db.statements
+    fragment = client.query(
+        "{ persons { ...P } } fragment P on PersonType { id directed { id } }"
+    )
+    assert fragment == direct
+    assert client.db.statements == statements == 3
+
+
+def test_single_objects_are_loaded_with_their_relations(client):
+    result = client.query("{ movie(id: 1) { actors { id } directors { id } } }")
+    assert result["data"]["movie"]["actors"]
+    assert client.db.statements == 3
+
+
+def _paths(model, query: str) -> list:
+    """Relations chargées d'avance pour le premier champ de `query`."""
+    document = parse(query)
+    fragments = {
+        definition.name.value: definition
+        for definition in document.definitions[1:]
+    }
+    field = document.definitions[0].selection_set.selections[0]
+    return [
+        [str(attribute) for attribute in option.path]
+        for option in eager._options(model, [field], fragments)
+    ]
+
+
+def test_options_follow_the_selection():
+    assert _paths(Movie, "{ movies { id status } }") == []
+    # Un seul chargement pour les champs passant par la même association
+    assert _paths(Movie, NESTED) == [
+        ["Movie.crew", "MoviePersons.person"],
+        [
+            "Movie.crew",
+            "MoviePersons.person",
+            "Person.career",
+            "MoviePersons.movie",
+        ],
+    ]
+    assert _paths(
+        Person,
+        "{ persons { ...P } } fragment P on PersonType { composed { id } }",
+    ) == [["Person.career", "MoviePersons.movie"]]
@@ -0,0 +1,97 @@
+""" LPGL - IUT Metz
+Zachary Arnaise
+
+Encodeurs JSON (`encoders`) et réponses envoyées par morceaux
+(`stream_responses`).
+"""
+
+import json
+
+import falcon
+import falcon.testing
+import pytest
+
+import encoders
+import sessions
+from encoders import get_encoder
+from resources import ResourceGraphQL
+from schema import schema
+
+QUERY = "{ movies { id frenchTitle actors { id fullName } } }"
+
+NAMES = [
+    "json",
+    pytest.param(
+        "orjson",
+        marks=pytest.mark.skipif(
+            encoders.orjson is None, reason="orjson n'est pas installé"
+        ),
+    ),
+]
+
+VALUE = {
+    "data": {
+        "movies": [
+            {"id": "1", "title": 'Été "meurtrier"\n', "tags": [], "x": {}},
+            {"id": "2", "nested": [[[[[1, 2.5, None, True]]]]]},
+        ],
+        "empty": None,
+    }
+}
+
+
+@pytest.mark.parametrize("name", NAMES)
+def test_iter_encode_matches_encode(name):
+    encoder = get_encoder(name, chunk_size=8)
+    chunks = list(encoder.iter_encode(VALUE))
+    assert len(chunks) > 1
+    assert all(len(chunk) >= 8 for chunk in chunks[:-1])
+    assert json.loads(b"".join(chunks)) == VALUE
+    assert json.loads(encoder.encode(VALUE)) == VALUE
+
+
+def test_unknown_encoder():
+    with pytest.raises(ValueError):
+        get_encoder("nope")
+
+
+@pytest.fixture(params=NAMES)
+def resource(request, db):
+    """Resource GraphQL envoyant ses réponses par morceaux."""
+    return ResourceGraphQL(
+        schema=schema,
+        scoped_session=db.scoped_session,
+        encoder=get_encoder(request.param, chunk_size=64),
+        stream_responses=True,
+    )
+
+
+def _unstreamed(db) -> dict:
+    """Réponse à `QUERY` d'une Resource sans streaming."""
+    app = falcon.App(middleware=[sessions.SessionMiddleware(db.scoped_session)])
+    app.add_route(
+        "/graphql",
+        ResourceGraphQL(schema=schema, scoped_session=db.scoped_session),
+    )
+    result = falcon.testing.TestClient(app).simulate_post(
+        "/graphql", json={"query": QUERY}
+    )
+    assert "errors" not in result.json
+    return result.json
+
+
+def test_streamed_responses(db, client):
+    result = client.post({"query": QUERY})
+    assert result.status_code == 200
+    # Envoi par morceaux, sans longueur connue à l'avance
+    assert "content-length" not in result.headers
+    assert result.json == _unstreamed(db)
+
+
+def test_streamed_asgi_responses(db, async_resource, async_client):
+    async_resource.stream_responses = True
+    async_resource.encoder = get_encoder("json", chunk_size=64)
+    result = async_client.post({"query": QUERY})
+    assert result.status_code == 200
+    assert "content-length" not in result.headers
+    assert result.json == _unstreamed(db)
@@ -0,0 +1,87 @@
+""" LPGL - IUT Metz
+Zachary Arnaise
+
+ETag et réponses 304 des requêtes GET (`data_version`).
+"""
+
+import data_version
+
+QUERY = "{ movie(id: 1) { id frenchTitle } }"
+
+CREATE_PERSON = """
+mutation {
+  createPerson(personData: {
+    firstName: "Ada", lastName: "Test", dateOfBirth: "1980-01-01"
+  }) { person { id } }
+}
+"""
+
+
+def _version(db) -> int:
+    return data_version.current(db.scoped_session())
+
+
+def test_get_query_has_etag(client):
+    result = client.get(QUERY)
+    assert result.status_code == 200
+    assert result.headers["etag"].startswith('"')
+    assert result.headers["cache-control"] == "no-cache"
+
+    # Même requête, écrite autrement: même ETag
+    other = client.get("query {movie(id:1){ id   frenchTitle }}")
+    assert other.headers["etag"] == result.headers["etag"]
+
+
+def test_matching_etag_returns_304_without_execution(client):
+    etag = client.get(QUERY).headers["etag"]
+    result = client.get(QUERY, headers={"If-None-Match": etag})
+    assert result.status_code == 304
+    assert result.headers["etag"] == etag
+    assert result.content == b""
+    # Seule la version des données est lue
+    assert client.db.statements == 1
+
+    star = client.get(QUERY, headers={"If-None-Match": "*"})
+    assert star.status_code == 304
+
+
+def test_other_etag_returns_200(client):
+    result = client.get(QUERY, headers={"If-None-Match": '"other"'})
+    assert result.status_code == 200
+    assert result.json["data"]["movie"]["id"] == "1"
+
+
+def test_commit_changes_the_version_and_etag(client):
+    before = _version(client.db)
+    etag = client.get(QUERY).headers["etag"]
+
+    assert "errors" not in client.query(CREATE_PERSON)
+    assert _version(client.db) == before + 1
+
+    result = client.get(QUERY, headers={"If-None-Match": etag})
+    assert result.status_code == 200
+    assert result.headers["etag"] != etag
+
+
+def test_read_only_requests_keep_the_version(client):
+    before = _version(client.db)
+    client.query(QUERY)
+    client.query("{ persons { id } }")
+    assert _version(client.db) == before
+
+
+def test_uncacheable_responses_have_no_etag(client):
+    # Mutation en GET, champ inconnu, erreur de syntaxe et tracing
+    assert "etag" not in client.get(CREATE_PERSON).headers
+    assert "etag" not in client.get("{ movie(id: 1) { nope } }").headers
+    assert "etag" not in client.get("{ nope").headers
+    result = client.client.simulate_get(
+        "/graphql",
+        params={"query": QUERY, "extensions": '{"tracing": true}'},
+    )
+    assert result.status_code == 200
+    assert "etag" not in result.headers
+
+
+def test_post_responses_have_no_etag(client):
+    assert "etag" not in client.post({"query": QUERY}).headers
@@ -0,0 +1,197 @@
+""" LPGL - IUT Metz
+Zachary Arnaise
+
+Lanceur multi-processus (`launcher`): préparation des workers, rechargement
+et remplacement des workers arrêtés.
+"""
+
+import json
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+import pytest
+
+import launcher
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+DATABASE = os.path.join(ROOT, "data", "movies.db")
+
+
+class _Launcher(launcher.Launcher):
+    """Lanceur dont les workers ne sont pas de vrais processus."""
+
+    def __init__(self: object, **kwargs):
+        """Constructeur."""
+        super().__init__(sock=None, workers=2, **kwargs)
+        self.next_pid = 100
+
+    def spawn(self: object) -> launcher.Worker:
+        self.next_pid += 1
+        worker = launcher.Worker(self.next_pid, None)
+        self.workers[worker.pid] = worker
+        return worker
+
+    def reap(self: object):
+        pass
+
+    def crash(self: object, worker: launcher.Worker):
+        del self.workers[worker.pid]
+
+
+def _wait(condition, timeout: float = 60):
+    """Attend que `condition()` soit vraie."""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "Délai dépassé"
+        time.sleep(0.1)
+
+
+def test_stopped_workers_are_replaced_after_a_growing_delay(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: clock[0])
+    pool = _Launcher(max_early_exits=3)
+    current = [pool.spawn(), pool.spawn()]
+
+    pool.crash(current[0])
+    assert pool.replace_stopped(current)
+    assert len(current) == 1  # Remplacé dans 0,5 s
+    clock[0] += 0.5
+    assert pool.replace_stopped(current)
+    assert len(current) == 2
+
+    pool.crash(current[-1])
+    assert pool.replace_stopped(current)
+    clock[0] += 0.5
+    assert pool.replace_stopped(current)
+    assert len(current) == 1  # Deuxième arrêt consécutif: 1 s
+    clock[0] += 0.5
+    assert pool.replace_stopped(current)
+    assert len(current) == 2
+
+    # Troisième arrêt consécutif peu après le démarrage: abandon
+    pool.crash(current[-1])
+    assert not pool.replace_stopped(current)
+
+
+def test_long_lived_workers_reset_the_delay(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: clock[0])
+    pool = _Launcher(max_early_exits=2)
+    current = [pool.spawn(), pool.spawn()]
+
+    pool.crash(current[0])
+    assert pool.replace_stopped(current)
+    assert pool._early_exits == 1
+    clock[0] += 0.5
+    assert pool.replace_stopped(current)
+
+    # Worker arrêté après `MIN_UPTIME`: pas un échec de démarrage
+    clock[0] += launcher.MIN_UPTIME
+    pool.crash(current[-1])
+    assert pool.replace_stopped(current)
+    assert pool._early_exits == 0
+    clock[0] += launcher.RESPAWN_DELAY
+    assert pool.replace_stopped(current)
+    assert len(current) == 2
+
+
+def _children(pid: int) -> set:
+    """PIDs des processus enfants de `pid` (Linux)."""
+    path = f"/proc/{pid}/task/{pid}/children"
+    with open(path) as file:
+        return {int(child) for child in file.read().split()}
+
+
+@pytest.fixture
+def server(tmp_path):
+    """Lanceur avec deux workers, sur une copie de la base."""
+    if not os.path.exists(f"/proc/{os.getpid()}/task/{os.getpid()}/children"):
+        pytest.skip("Processus enfants lus dans /proc (Linux)")
+    shutil.copy(DATABASE, str(tmp_path / "movies.db"))
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    env = dict(
+        os.environ,
+        HOST="127.0.0.1",
+        PORT=str(port),
+        WEB_CONCURRENCY="2",
+        DATABASE_URL=f"sqlite:///{tmp_path / 'movies.db'}",
+        METRICS_DIR=str(tmp_path / "metrics"),
+        GRACEFUL_TIMEOUT="5",
+    )
+    process = subprocess.Popen(
+        [sys.executable, "launcher.py"],
+        cwd=os.path.join(ROOT, "src"),
+        env=env,
+    )
+    process.url = f"http://127.0.0.1:{port}"
+    try:
+        _wait(lambda: len(_children(process.pid)) == 2 and _ready(process))
+        yield process
+    finally:
+        if process.poll() is None:
+            process.terminate()
+            process.wait(timeout=30)
+
+
+def _query(server, query: str = "{ movie(id: 1) { id } }") -> dict:
+    request = urllib.request.Request(
+        server.url + "/graphql",
+        data=json.dumps({"query": query}).encode(),
+        headers={"Content-Type": "application/json"},
+    )
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.loads(response.read())
+
+
+def _ready(server) -> bool:
+    try:
+        return _query(server)["data"]["movie"]["id"] == "1"
+    except OSError:
+        return False
+
+
+def test_workers_are_warmed_up_before_serving(server):
+    assert _query(server)["data"] == {"movie": {"id": "1"}}
+    with urllib.request.urlopen(server.url + "/metrics") as response:
+        exposed = response.read().decode()
+    assert 'graphql_operations_total{operation="query",status="200"}' in (
+        exposed
+    )
+
+
+def test_reload_replaces_workers_without_downtime(server):
+    before = _children(server.pid)
+    server.send_signal(signal.SIGHUP)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        assert _query(server)["data"]["movie"]["id"] == "1"
+        after = _children(server.pid)
+        if len(after) == 2 and not after & before:
+            break
+        time.sleep(0.1)
+    else:
+        pytest.fail("Workers non rechargés")
+
+
+def test_killed_worker_is_respawned(server):
+    before = _children(server.pid)
+    victim = min(before)
+    os.kill(victim, signal.SIGKILL)
+    _wait(
+        lambda: len(_children(server.pid)) == 2
+        and victim not in _children(server.pid)
+    )
+    _wait(lambda: _ready(server))
+
+
+def test_sigterm_stops_the_launcher(server):
+    server.terminate()
+    assert server.wait(timeout=30) == 0
@@ -0,0 +1,96 @@
+""" LPGL - IUT Metz
+Zachary Arnaise
+
+Regroupement des chargements de l'équipe des films et de la carrière des
+personnes (`loaders`).
+"""
+
+from promise import Promise
+
+from loaders import CareerLoader, CrewLoader, Loaders
+from models import Movie, Person
+from references import ACTOR, DIRECTOR, roles
+
+NESTED_QUERY = """
+query ($first: Int) {
+  personsConnection(first: $first) {
+    edges { node { id playedIn { id actors { id } directors { id } } } }
+  }
+}
+"""
+
+
+def _load_many(loader, keys: list) -> list:
+    """Charge `keys` comme pendant l'exécution d'une requête: les appels à
+    `load` faits dans une même étape sont regroupés."""
+    return Promise.resolve(None).then(lambda _: loader.load_many(keys)).get()
+
+
+def _related(session, entity, relation: str, role: str) -> list:
+    """IDs liés à `entity` pour `role`, sans passer par un loader."""
+    role_id = roles.id_of(session, role)
+    links = sorted(getattr(entity, relation), key=lambda link: link.id)
+    return [
+        getattr(link, "person" if relation == "crew" else "movie").id
+        for link in links
+        if link.person_role_id == role_id
+    ]
+
+
+def test_crew_loader_batches_keys(db):
+    session = db.scoped_session()
+    movie_ids = [movie.id for movie in session.query(Movie)]
+    loader = CrewLoader(session, ACTOR)
+    # Version des données (tables de référence) lue une fois par transaction
+    roles.id_of(session, ACTOR)
+
+    db.statements = 0
+    actors = _load_many(loader, movie_ids)
+
+    assert db.statements == 1
+    for movie_id, persons in zip(movie_ids, actors):
+        movie = session.query(Movie).get(movie_id)
+        assert [person.id for person in persons] == _related(
+            session, movie, "crew", ACTOR
+        )
+
+
+def test_career_loader_batches_keys(db):
+    session = db.scoped_session()
+    person_ids = [person.id for person in session.query(Person)]
+    loader = CareerLoader(session, DIRECTOR)
+    # Version des données (tables de référence) lue une fois par transaction
+    roles.id_of(session, DIRECTOR)
+
+    db.statements = 0
+    directed = _load_many(loader, person_ids)
+
+    assert db.statements == 1
+    for person_id, movies in zip(person_ids, directed):
+        person = session.query(Person).get(person_id)
+        assert [movie.id for movie in movies] == _related(
+            session, person, "career", DIRECTOR
+        )
+
+
+def test_unknown_keys_load_empty_lists(db):
+    loader = CrewLoader(db.scoped_session(), DIRECTOR)
+    assert _load_many(loader, [-1, 99999]) == [[], []]
+
+
+def test_loaders_are_cached_per_role(db):
+    loaders = Loaders(db.scoped_session())
+    assert loaders.crew(ACTOR) is loaders.crew(ACTOR)
+    assert loaders.crew(ACTOR) is not loaders.crew(DIRECTOR)
+    assert loaders.career(ACTOR) is not loaders.crew(ACTOR)
+
+
+def test_nested_lists_do_not_depend_on_page_size(client):
+    counts = []
+    for first in (2, 20):
+        result = client.query(NESTED_QUERY, first=first)
+        assert "errors" not in result
+        edges = result["data"]["personsConnection"]["edges"]
+        assert len(edges) == first
+        counts.append(client.db.statements)
+    assert counts[0] == counts[1]
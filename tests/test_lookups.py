@@ -0,0 +1,95 @@
+""" LPGL - IUT Metz
+Zachary Arnaise
+
+Recherche d'un film par titre ou d'une personne par nom, servie par des
+index, et listes `movies(ids:)` / `persons(ids:)` chargées en une requête.
+"""
+
+import pytest
+import sqlalchemy
+
+import migrations
+from schema import MAX_IDS
+
+MOVIES = "query ($ids: [Int]) { movies(ids: $ids) { id frenchTitle } }"
+
+PERSONS = "query ($ids: [Int]) { persons(ids: $ids) { id lastName } }"
+
+
+@pytest.fixture
+def statements(db):
+    """Requêtes SQL exécutées sur la base de test."""
+    executed = []
+
+    def _record(conn, cursor, statement, *args):
+        executed.append(statement)
+
+    sqlalchemy.event.listen(db.engine, "before_cursor_execute", _record)
+    yield executed
+    sqlalchemy.event.remove(db.engine, "before_cursor_execute", _record)
+
+
+@pytest.mark.parametrize(
+    "arguments, expected",
+    [
+        ('frenchTitle: "Arrête-moi si tu peux"', {"id": "3"}),
+        ('originalTitle: "Catch Me If You Can"', {"id": "3"}),
+        # Le titre original n'est pas comparé au titre français
+        ('originalTitle: "Arrête-moi si tu peux"', None),
+    ],
+)
+def test_movie_by_title(client, arguments, expected):
+    result = client.query("{ movie(%s) { id } }" % arguments)
+    assert result["data"]["movie"] == expected
+
+
+def test_person_by_name(client):
+    result = client.query(
+        '{ person(firstName: "Gérard", lastName: "Depardieu") { id } }'
+    )
+    assert result["data"]["person"] == {"id": "2"}
+    result = client.query('{ person(lastName: "Rochefort") { id } }')
+    assert result["data"]["person"] == {"id": "4"}
+
+
+@pytest.mark.parametrize(
+    "table, column",
+    [
+        ("movie", '"frenchTitle"'),
+        ("movie", '"originalTitle"'),
+        ("person", '"firstName"'),
+        ("person", '"lastName"'),
+        ("movie_persons", "movie_id"),
+        ("movie_persons", "person_id"),
+    ],
+)
+def test_lookups_use_an_index(db, table, column):
+    # Index créés par la migration, rejouable sans effet
+    migrations.migrate(db.engine)
+    with db.engine.connect() as connection:
+        plan = connection.execute(
+            f"EXPLAIN QUERY PLAN SELECT * FROM {table} WHERE {column} = 1"
+        ).fetchall()
+    assert "USING INDEX" in " ".join(row[-1] for row in plan)
+
+
+@pytest.mark.parametrize(
+    "query, field", [(MOVIES, "movies"), (PERSONS, "persons")]
+)
+def test_ids_are_loaded_in_one_query(client, statements, query, field):
+    result = client.query(query, ids=[3, 999, 1, 3])
+    served = [s for s in statements if "IN (" in s]
+    items = result["data"][field]
+    # Ordre des IDs demandés, `null` pour un ID inconnu
+    assert [item and item["id"] for item in items] == ["3", None, "1", "3"]
+    assert len(served) == 1
+
+    assert client.query(query, ids=[])["data"][field] == []
+
+
+def test_too_many_ids(client):
+    result = client.query(MOVIES, ids=list(range(1, MAX_IDS + 2)))
+    assert result["data"]["movies"] is None
+    assert result["errors"][0]["message"] == (
+        f"Too many ids: at most {MAX_IDS} are allowed."
+    )
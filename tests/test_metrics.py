@@ -0,0 +1,72 @@
+""" LPGL - IUT Metz
+Zachary Arnaise
+
+Métriques Prometheus (`metrics`), sommées entre les processus d'un dossier
+partagé.
+"""
+
+import os
+
+import metrics
+from resources import ResourceMetrics
+
+
+def _registry(directory: str = None) -> metrics.Registry:
+    """Registre avec un compteur et un histogramme."""
+    registry = metrics.Registry()
+    registry.counter("requests_total", "Requêtes.", labels=("status",))
+    registry.histogram("duration_seconds", "Durées.", buckets=(0.1, 1))
+    registry.directory = directory
+    return registry
+
+
+def _worker(registry: metrics.Registry, status: str, duration: float):
+    counter, histogram = registry._metrics
+    counter.inc(status=status)
+    histogram.observe(duration)
+
+
+def test_expose_formats_counters_and_histograms():
+    registry = _registry()
+    _worker(registry, "200", 0.5)
+    lines = registry.expose().splitlines()
+    assert 'requests_total{status="200"} 1' in lines
+    assert 'duration_seconds_bucket{le="0.1"} 0' in lines
+    assert 'duration_seconds_bucket{le="1"} 1' in lines
+    assert 'duration_seconds_bucket{le="+Inf"} 1' in lines
+    assert "duration_seconds_count 1" in lines
+
+
+def test_shared_directory_sums_all_processes(tmp_path, monkeypatch):
+    directory = str(tmp_path)
+    # Worker arrêté, dont le fichier reste pris en compte
+    other = _registry(directory)
+    _worker(other, "200", 0.05)
+    _worker(other, "400", 2)
+    monkeypatch.setattr(os, "getpid", lambda: 1)
+    other.dump()
+    monkeypatch.undo()
+
+    registry = _registry(directory)
+    _worker(registry, "200", 0.5)
+    lines = registry.expose().splitlines()
+
+    assert sorted(os.listdir(directory)) == sorted(
+        ["1.json", f"{os.getpid()}.json"]
+    )
+    assert 'requests_total{status="200"} 2' in lines
+    assert 'requests_total{status="400"} 1' in lines
+    assert 'duration_seconds_bucket{le="0.1"} 1' in lines
+    assert 'duration_seconds_bucket{le="1"} 2' in lines
+    assert "duration_seconds_count 3" in lines
+    assert "duration_seconds_sum 2.55" in lines
+
+
+def test_metrics_route(client):
+    client.client.app.add_route("/metrics", ResourceMetrics())
+    client.query("{ movie(id: 1) { id } }")
+    result = client.client.simulate_get("/metrics")
+    assert result.headers["content-type"].startswith("text/plain")
+    assert 'graphql_operations_total{operation="query",status="200"}' in (
+        result.text
+    )
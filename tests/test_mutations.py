@@ -0,0 +1,203 @@
+""" LPGL - IUT Metz
+Zachary Arnaise
+
+Mutations en masse (`createPersons`, `createMovies`, `addCrew`): erreurs par
+élément et insertion en une seule requête.
+"""
+
+import datetime
+import threading
+import time
+
+import sqlalchemy.orm
+
+import models
+from schema_mutations import _insert
+
+CREATE_PERSONS = """
+mutation ($persons: [PersonInput!]!) {
+  createPersons(personsData: $persons) {
+    persons { id firstName lastName }
+    errors { index message }
+  }
+}
+"""
+
+CREATE_MOVIES = """
+mutation ($movies: [MovieInput!]!) {
+  createMovies(moviesData: $movies) {
+    movies { id frenchTitle status }
+    errors { index message }
+  }
+}
+"""
+
+ADD_CREW = """
+mutation ($crew: [CrewInput!]!) {
+  addCrew(crewData: $crew) { added errors { index message } }
+}
+"""
+
+
+def _person(first: str, last: str = "Test", death: str = None) -> dict:
+    return {
+        "firstName": first,
+        "lastName": last,
+        "dateOfBirth": "1980-01-01",
+        "dateOfDeath": death,
+    }
+
+
+def _movie(title: str, status: str = "sortie") -> dict:
+    return {
+        "frenchTitle": title,
+        "originalTitle": title,
+        "status": status,
+        "statusDate": "2020-01-01",
+    }
+
+
+def _count(db, table: str) -> int:
+    with db.engine.connect() as connection:
+        return connection.execute(f"SELECT COUNT(*) FROM {table}").scalar()
+
+
+def test_create_persons_reports_errors_per_item(client):
+    before = _count(client.db, "person")
+    persons = [
+        _person("Ada"),
+        _person(" "),
+        _person("Bob", death="1970-01-01"),
+        _person("Cleo"),
+    ]
+    result = client.query(CREATE_PERSONS, persons=persons)["data"]
+    created = result["createPersons"]
+
+    assert created["errors"] == [
+        {"index": 1, "message": "firstName and lastName must not be empty."},
+        {"index": 2, "message": "dateOfDeath must not be before dateOfBirth."},
+    ]
+    assert [p and p["firstName"] for p in created["persons"]] == [
+        "Ada",
+        None,
+        None,
+        "Cleo",
+    ]
+    assert _count(client.db, "person") == before + 2
+
+    # Les IDs renvoyés sont ceux des lignes insérées
+    for person in (created["persons"][0], created["persons"][3]):
+        found = client.query(
+            "query ($id: Int) { person(id: $id) { firstName } }",
+            id=int(person["id"]),
+        )
+        assert found["data"]["person"]["firstName"] == person["firstName"]
+
+
+def test_create_persons_uses_a_single_insert(client):
+    persons = [_person(f"P{i}") for i in range(100)]
+    result = client.query(CREATE_PERSONS, persons=persons)["data"]
+    ids = [int(p["id"]) for p in result["createPersons"]["persons"]]
+    assert len(set(ids)) == 100
+    assert ids == sorted(ids)
+    # Ni une requête par ligne, ni une par objet renvoyé
+    assert client.db.statements < 10
+
+
+def test_create_movies_rejects_unknown_status(client):
+    movies = [_movie("Un"), _movie("Deux", status="nope"), _movie("Trois")]
+    result = client.query(CREATE_MOVIES, movies=movies)["data"]
+    created = result["createMovies"]
+
+    assert created["errors"] == [
+        {"index": 1, "message": "Unknown status: nope"}
+    ]
+    assert created["movies"][1] is None
+    assert [created["movies"][i]["frenchTitle"] for i in (0, 2)] == [
+        "Un",
+        "Trois",
+    ]
+    assert created["movies"][0]["status"] == "sortie"
+
+
+def test_empty_lists_create_nothing(client):
+    result = client.query(CREATE_PERSONS, persons=[])["data"]
+    assert result["createPersons"] == {"persons": [], "errors": []}
+
+
+def test_add_crew_reports_errors_per_item(client):
+    movie = client.query("{ movie(id: 1) { id actors { id } } }")
+    movie = movie["data"]["movie"]
+    actor = int(movie["actors"][0]["id"])
+    before = _count(client.db, "movie_persons")
+
+    crew = [
+        {"movieId": 1, "personId": actor, "role": "acteur"},
+        {"movieId": 99999, "personId": actor, "role": "acteur"},
+        {"movieId": 1, "personId": 99999, "role": "acteur"},
+        {"movieId": 1, "personId": actor, "role": "chanteur"},
+        {"movieId": 1, "personId": actor, "role": "compositeur"},
+        {"movieId": 1, "personId": actor, "role": "compositeur"},
+    ]
+    result = client.query(ADD_CREW, crew=crew)["data"]["addCrew"]
+
+    assert result["added"] == 1
+    assert result["errors"] == [
+        {"index": 0, "message": "Already in the crew."},
+        {"index": 1, "message": "Unknown movie: 99999"},
+        {"index": 2, "message": "Unknown person: 99999"},
+        {"index": 3, "message": "Unknown role: chanteur"},
+        {"index": 5, "message": "Already in the crew."},
+    ]
+    assert _count(client.db, "movie_persons") == before + 1
+
+    writers = client.query("{ movie(id: 1) { songWriters { id } } }")
+    writers = writers["data"]["movie"]["songWriters"]
+    assert {"id": str(actor)} in writers
+
+
+def test_concurrent_inserts_get_distinct_ids(db):
+    factory = sqlalchemy.orm.sessionmaker(bind=db.engine)
+    barrier = threading.Barrier(2)
+    results, failures = [], []
+
+    def _create(name: str):
+        session = factory()
+        try:
+            # Lectures avant l'insertion, comme la validation des mutations
+            session.query(models.Person).get(1)
+            barrier.wait()
+            rows = [
+                {
+                    "firstName": name,
+                    "lastName": str(i),
+                    "dateOfBirth": datetime.date(1980, 1, 1),
+                }
+                for i in range(20)
+            ]
+            ids = _insert(session, models.Person, rows)
+            time.sleep(0.05)  # L'autre écriture attend la fin de celle-ci
+            session.commit()
+            results.append((name, ids))
+        except Exception as error:  # pragma: no cover
+            failures.append(error)
+        finally:
+            session.close()
+
+    threads = [threading.Thread(target=_create, args=(n,)) for n in "AB"]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert failures == []
+    assert len(set(results[0][1]) | set(results[1][1])) == 40
+    session = db.scoped_session()
+    for name, ids in results:
+        names = {
+            p.firstName
+            for p in session.query(models.Person).filter(
+                models.Person.id.in_(ids)
+            )
+        }
+        assert names == {name}
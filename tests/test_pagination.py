@@ -0,0 +1,107 @@
+""" LPGL - IUT Metz
+Zachary Arnaise
+
+Pagination par curseur des connexions Relay (`pagination`).
+"""
+
+import base64
+
+import pytest
+from graphql import GraphQLError
+
+from pagination import decode_cursor, encode_cursor
+
+PERSONS_QUERY = """
+query ($first: Int, $after: String) {
+  personsConnection(first: $first, after: $after) {
+    totalCount
+    edges { cursor node { id } }
+    pageInfo { startCursor endCursor hasNextPage hasPreviousPage }
+  }
+}
+"""
+
+
+def _page(client, first: int = None, after: str = None) -> dict:
+    result = client.query(PERSONS_QUERY, first=first, after=after)
+    assert "errors" not in result, result
+    return result["data"]["personsConnection"]
+
+
+def _ids(page: dict) -> list:
+    return [int(edge["node"]["id"]) for edge in page["edges"]]
+
+
+def test_cursor_round_trip():
+    for key in (0, 1, 123456789):
+        assert decode_cursor(encode_cursor(key)) == key
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    ["", "not base64!", base64.b64encode(b"42").decode(), "Y3Vyc29yOng="],
+)
+def test_invalid_cursors_are_rejected(cursor):
+    with pytest.raises(GraphQLError):
+        decode_cursor(cursor)
+
+
+def test_pages_cover_every_row_once(client):
+    with client.db.engine.connect() as connection:
+        expected = [
+            id_
+            for id_, in connection.execute("SELECT id FROM person ORDER BY id")
+        ]
+
+    ids, after, pages = [], None, 0
+    while True:
+        page = _page(client, first=5, after=after)
+        pages += 1
+        assert page["totalCount"] == len(expected)
+        assert page["pageInfo"]["hasPreviousPage"] is False
+        ids += _ids(page)
+        if not page["pageInfo"]["hasNextPage"]:
+            break
+        after = page["pageInfo"]["endCursor"]
+        assert after == page["edges"][-1]["cursor"]
+
+    assert ids == expected
+    assert pages == -(-len(expected) // 5)
+
+
+def test_page_after_last_row_is_empty(client):
+    last = _page(client, first=100)
+    page = _page(client, first=5, after=last["pageInfo"]["endCursor"])
+    assert page["edges"] == []
+    assert page["pageInfo"]["hasNextPage"] is False
+    assert page["pageInfo"]["startCursor"] is None
+
+
+def test_deleted_rows_do_not_shift_the_next_page(client):
+    first = _page(client, first=5)
+    expected = _ids(
+        _page(client, first=5, after=first["pageInfo"]["endCursor"])
+    )
+
+    # Suppression d'une ligne déjà lue: un OFFSET sauterait une ligne
+    with client.db.engine.begin() as connection:
+        connection.execute("DELETE FROM person WHERE id = ?", _ids(first)[0])
+
+    page = _page(client, first=5, after=first["pageInfo"]["endCursor"])
+    assert _ids(page) == expected
+
+
+def test_first_zero_and_negative(client):
+    page = _page(client, first=0)
+    assert page["edges"] == []
+    assert page["pageInfo"]["hasNextPage"] is True
+
+    result = client.query(PERSONS_QUERY, first=-1)
+    assert result["data"]["personsConnection"] is None
+    assert "non-negative" in result["errors"][0]["message"]
+
+
+def test_invalid_cursor_is_reported(client):
+    result = client.query(PERSONS_QUERY, first=5, after="nope")
+    assert result["data"]["personsConnection"] is None
+    assert result["errors"][0]["message"] == "Invalid cursor: nope"
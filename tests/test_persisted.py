@@ -0,0 +1,126 @@
+""" LPGL - IUT Metz
+Zachary Arnaise
+
+Requêtes persistées automatiquement (`persisted`, APQ).
+"""
+
+import sqlite3
+
+import pytest
+
+from persisted import MemoryQueryStore, SQLiteQueryStore, query_hash
+
+QUERY = "{ movie(id: 1) { id frenchTitle } }"
+
+
+def _persisted(query: str, sha256_hash: str = None) -> dict:
+    """Corps d'une requête APQ, sans la requête si `query` est `None`."""
+    body = {
+        "extensions": {
+            "persistedQuery": {
+                "version": 1,
+                "sha256Hash": sha256_hash or query_hash(query),
+            }
+        }
+    }
+    if query is not None:
+        body["query"] = query
+    return body
+
+
+@pytest.fixture
+def store(resource):
+    resource.persisted_queries = MemoryQueryStore()
+    return resource.persisted_queries
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def bounded_store(request, tmp_path):
+    """Stockage limité à deux requêtes de 100 caractères."""
+    if request.param == "memory":
+        return MemoryQueryStore(max_size=2, max_length=100)
+    return SQLiteQueryStore(
+        str(tmp_path / "persisted.db"), max_size=2, max_length=100
+    )
+
+
+def test_unknown_hash_asks_for_the_query(client, store):
+    result = client.post(_persisted(None, sha256_hash="0" * 64))
+    assert result.status_code == 200
+    error = result.json["errors"][0]
+    assert error["message"] == "PersistedQueryNotFound"
+    assert error["extensions"]["code"] == "PERSISTED_QUERY_NOT_FOUND"
+
+
+def test_query_is_registered_then_found_by_hash(client, store):
+    registered = client.post(_persisted(QUERY)).json
+    assert registered["data"]["movie"]["id"] == "1"
+    assert store.get(query_hash(QUERY)) == QUERY
+
+    result = client.post(_persisted(None, sha256_hash=query_hash(QUERY)))
+    assert result.json == registered
+
+
+def test_hash_mismatch_is_rejected(client, store):
+    result = client.post(_persisted(QUERY, sha256_hash="0" * 64))
+    assert result.status_code == 400
+    assert result.json["errors"][0]["message"] == (
+        "Provided sha256Hash does not match query."
+    )
+    assert store.get("0" * 64) is None
+
+
+def test_bad_version_and_disabled_store(client, resource):
+    body = _persisted(QUERY)
+    result = client.post(body)
+    assert result.status_code == 400
+    assert result.json["errors"][0]["extensions"]["code"] == (
+        "PERSISTED_QUERY_NOT_SUPPORTED"
+    )
+
+    resource.persisted_queries = MemoryQueryStore()
+    body["extensions"]["persistedQuery"]["version"] = 2
+    assert client.post(body).status_code == 400
+
+
+@pytest.mark.parametrize(
+    "query", ["{ movie(id: 1) { id", "{ movie(id: 1) { unknownField } }"]
+)
+def test_invalid_queries_are_not_stored(client, store, query):
+    result = client.post(_persisted(query))
+    assert result.status_code == 400
+    assert store.get(query_hash(query)) is None
+
+
+def test_store_is_bounded(bounded_store):
+    bounded_store.set("a", "{ a }")
+    bounded_store.set("b", "{ b }")
+    bounded_store.set("long", "{ " + "x " * 100 + "}")
+    assert bounded_store.get("long") is None
+
+    if isinstance(bounded_store, SQLiteQueryStore):
+        # Date d'utilisation mise à jour à chaque lecture pour le test
+        bounded_store.TOUCH_INTERVAL = -1
+    assert bounded_store.get("a") == "{ a }"
+    bounded_store.set("c", "{ c }")
+    # `b`, le moins récemment utilisé, a été retiré
+    assert bounded_store.get("b") is None
+    assert bounded_store.get("a") == "{ a }"
+    assert bounded_store.get("c") == "{ c }"
+
+
+def test_sqlite_store_upgrades_existing_table(tmp_path):
+    path = str(tmp_path / "persisted.db")
+    with sqlite3.connect(path) as connection:
+        connection.execute(
+            "CREATE TABLE persisted_queries ("
+            "hash TEXT PRIMARY KEY, query TEXT NOT NULL)"
+        )
+        connection.execute(
+            "INSERT INTO persisted_queries VALUES ('old', '{ old }')"
+        )
+
+    store = SQLiteQueryStore(path)
+    assert store.get("old") == "{ old }"
+    store.set("new", "{ new }")
+    assert store.get("new") == "{ new }"
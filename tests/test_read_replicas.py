@@ -0,0 +1,118 @@
+""" LPGL - IUT Metz
+Zachary Arnaise
+
+Routage des opérations: requêtes `query` sur les connexions en lecture
+seule, mutations sur la base principale.
+"""
+
+import falcon
+import falcon.testing
+import pytest
+import sqlalchemy
+import sqlalchemy.orm
+
+import database
+import sessions
+from resources import ResourceGraphQL
+from schema import schema
+
+QUERY = "{ person(id: 1) { id firstName } }"
+
+CREATE_PERSON = """
+mutation {
+  createPerson(personData: {
+    firstName: "Ada", lastName: "Test", dateOfBirth: "1980-01-01"
+  }) { person { id } }
+}
+"""
+
+
+class Counter(object):
+    """Nombre de requêtes SQL exécutées par un moteur."""
+
+    def __init__(self: object, engine):
+        """Constructeur."""
+        self.count = 0
+        sqlalchemy.event.listen(engine, "before_cursor_execute", self._count)
+
+    def _count(self: object, *args):
+        self.count += 1
+
+
+@pytest.fixture
+def replica(db):
+    """Moteur en lecture seule sur la base de test."""
+    [engine] = database.create_read_engines(
+        {"DATABASE_URL": f"sqlite:///{db.path}"}
+    )
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def routed(db, replica):
+    """Client d'une resource routant les requêtes vers `replica`, et
+    compteurs des requêtes SQL de chaque moteur."""
+    read_scoped_session = sqlalchemy.orm.scoped_session(
+        database.read_session_factory([replica])
+    )
+    app = falcon.App(
+        middleware=[
+            sessions.SessionMiddleware(db.scoped_session, read_scoped_session)
+        ]
+    )
+    app.add_route(
+        "/graphql",
+        ResourceGraphQL(
+            schema=schema,
+            scoped_session=db.scoped_session,
+            read_scoped_session=read_scoped_session,
+        ),
+    )
+    counters = {"writer": Counter(db.engine), "reader": Counter(replica)}
+    yield falcon.testing.TestClient(app), counters
+    read_scoped_session.remove()
+
+
+def _post(client, body) -> dict:
+    result = client.simulate_post("/graphql", json=body)
+    assert result.status_code == 200
+    return result.json
+
+
+def test_queries_use_the_replica(routed):
+    client, counters = routed
+    result = _post(client, {"query": QUERY})
+    assert result["data"]["person"]["id"] == "1"
+    assert counters["reader"].count > 0
+    assert counters["writer"].count == 0
+
+
+def test_mutations_use_the_writer(routed):
+    client, counters = routed
+    result = _post(client, {"query": CREATE_PERSON})
+    person_id = result["data"]["createPerson"]["person"]["id"]
+    assert counters["writer"].count > 0
+    assert counters["reader"].count == 0
+
+    # La personne créée est lue sur le réplica
+    query = "{ person(id: %s) { firstName } }" % person_id
+    result = _post(client, {"query": query})
+    assert result["data"]["person"] == {"firstName": "Ada"}
+    assert counters["reader"].count > 0
+
+
+def test_batches_with_a_mutation_use_the_writer(routed):
+    client, counters = routed
+    result = _post(client, [{"query": QUERY}, {"query": CREATE_PERSON}])
+    assert all("errors" not in item for item in result)
+    assert counters["reader"].count == 0
+
+
+def test_replica_rejects_writes(replica):
+    session = database.read_session_factory([replica])()
+    try:
+        with pytest.raises(sqlalchemy.exc.OperationalError):
+            session.execute("UPDATE person SET firstName = 'X' WHERE id = 1")
+    finally:
+        session.close()
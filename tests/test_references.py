@@ -0,0 +1,124 @@
+""" LPGL - IUT Metz
+Zachary Arnaise
+
+Tables de référence en mémoire (`references`): rôles et statuts, rechargés
+après une modification locale ou d'un autre processus.
+"""
+
+import sqlalchemy
+
+from models import MovieStatus
+from references import ACTOR, roles, statuses
+
+
+def _other_process(db, *statements: str):
+    """Exécute `statements` hors de l'ORM, comme un autre processus, en
+    incrémentant la version des données."""
+    with db.engine.begin() as connection:
+        for statement in statements:
+            connection.execute(statement)
+        connection.execute("UPDATE data_version SET version = version + 1")
+
+
+def test_lookups(db):
+    session = db.scoped_session()
+    assert roles.id_of(session, ACTOR) == 2
+    assert roles.id_of(session, "chanteur") is None
+    assert statuses.description_of(session, 2) == "sortie"
+    assert statuses.description_of(session, 99) is None
+
+
+def test_version_is_read_once_per_transaction(db):
+    session = db.scoped_session()
+    db.statements = 0
+    for _ in range(10):
+        roles.id_of(session, ACTOR)
+        statuses.description_of(session, 1)
+    assert db.statements == 1
+
+
+def test_orm_changes_reload_the_table(db):
+    session = db.scoped_session()
+    session.query(MovieStatus).get(3).description = "abandonné"
+    session.flush()
+    assert statuses.id_of(session, "abandonné") == 3
+    session.rollback()
+    assert statuses.id_of(session, "abandonné") is None
+
+
+def test_changes_from_other_processes_reload_the_table(db):
+    session = db.scoped_session()
+    assert statuses.description_of(session, 3) == "inabouti"
+    db.scoped_session.remove()
+
+    _other_process(
+        db, "UPDATE movie_status SET description = 'abandonné' WHERE id = 3"
+    )
+    session = db.scoped_session()
+    assert statuses.description_of(session, 3) == "abandonné"
+    assert statuses.id_of(session, "inabouti") is None
+
+
+def _statements(db) -> list:
+    """Requêtes SQL exécutées sur la base de test, ajoutées à la liste
+    renvoyée."""
+    executed = []
+    sqlalchemy.event.listen(
+        db.engine,
+        "before_cursor_execute",
+        lambda conn, cursor, statement, *args: executed.append(statement),
+    )
+    return executed
+
+
+def test_status_is_resolved_without_join(client):
+    executed = _statements(client.db)
+    movies = client.query("{ movies { id status } }")["data"]["movies"]
+    served = list(executed)
+    with client.db.engine.connect() as connection:
+        expected = connection.execute(
+            "SELECT m.id, s.description FROM movie m "
+            "JOIN movie_status s ON s.id = m.statusId ORDER BY m.id"
+        ).fetchall()
+    assert [(int(m["id"]), m["status"]) for m in movies] == expected
+    assert not [s for s in served if "FROM movie_status" in s]
+
+
+def test_movie_filtered_by_status(client):
+    for status, movie_id in (
+        ("inabouti", "4"),
+        ("en cours de réalisation", "5"),
+    ):
+        query = '{ movie(status: "%s") { id status } }' % status
+        movie = client.query(query)["data"]["movie"]
+        assert movie == {"id": movie_id, "status": status}
+    assert client.query('{ movie(status: "nope") { id } }')["data"] == {
+        "movie": None
+    }
+
+
+def test_create_movie_uses_the_status_table(client):
+    create = """
+    mutation ($status: String!) {
+      createMovie(movieData: {
+        frenchTitle: "Nouveau", originalTitle: "New", status: $status,
+        statusDate: "2020-01-01"
+      }) { movie { id status } }
+    }
+    """
+    executed = _statements(client.db)
+    result = client.query(create, status="inabouti")
+    assert result["data"]["createMovie"]["movie"]["status"] == "inabouti"
+    # Statut trouvé sans lire sa table; celle-ci n'est rechargée qu'après
+    # le commit, qui change la version des données
+    insert = next(i for i, s in enumerate(executed) if s.startswith("INSERT"))
+    assert not [s for s in executed[:insert] if "FROM movie_status" in s]
+
+    result = client.query(create, status="nope")
+    assert result["data"]["createMovie"] is None
+    assert result["errors"]
+    with client.db.engine.connect() as connection:
+        titles = connection.execute(
+            "SELECT COUNT(*) FROM movie WHERE frenchTitle = 'Nouveau'"
+        ).scalar()
+    assert titles == 1
@@ -0,0 +1,90 @@
+""" LPGL - IUT Metz
+Zachary Arnaise
+
+Cache des résultats des requêtes (`result_cache`): invalidation par les
+mutations et par les transactions validées pendant l'exécution.
+"""
+
+import pytest
+
+import models
+from resources import ResourceGraphQL
+from result_cache import MemoryResultCache, SQLiteResultCache, cache_key
+from schema import schema
+
+QUERY = "{ person(id: 1) { id firstName } }"
+
+UPDATE = "UPDATE person SET firstName = 'Modifié' WHERE id = 1"
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def resource(request, db, tmp_path):
+    """Resource GraphQL avec un cache des résultats."""
+    if request.param == "memory":
+        cache = MemoryResultCache()
+    else:
+        cache = SQLiteResultCache(str(tmp_path / "cache.db"))
+    return ResourceGraphQL(
+        schema=schema, scoped_session=db.scoped_session, result_cache=cache
+    )
+
+
+def _rename(db, first_name: str):
+    """Renomme la personne 1 dans une autre session, via l'ORM."""
+    session = db.scoped_session.session_factory()
+    session.query(models.Person).get(1).firstName = first_name
+    session.commit()
+    session.close()
+
+
+def test_results_are_served_from_the_cache(client):
+    first = client.query(QUERY)
+    assert client.db.statements > 1
+    assert client.query(QUERY) == first
+    # Seule la version des données est lue (ETag, sessions)
+    assert client.db.statements <= 1
+
+
+def test_cache_key_ignores_formatting(resource):
+    compact = resource.backend.document_from_string(resource.schema, QUERY)
+    spaced = resource.backend.document_from_string(
+        resource.schema, "query {\n  person(id: 1) {\n    id firstName } }"
+    )
+    assert cache_key(compact, None, None) == cache_key(spaced, None, None)
+    assert cache_key(compact, None, None) != cache_key(compact, {"a": 1}, None)
+
+
+def test_mutations_invalidate_cached_results(client):
+    client.query(QUERY)
+    _rename(client.db, "Renommé")
+    result = client.query(QUERY)
+    assert result["data"]["person"]["firstName"] == "Renommé"
+
+
+def test_unrelated_commits_keep_cached_results(client):
+    client.query(QUERY)
+    session = client.db.scoped_session.session_factory()
+    session.query(models.Movie).get(1).frenchTitle = "Autre"
+    session.commit()
+    session.close()
+    client.query(QUERY)
+    assert client.db.statements <= 1
+
+
+def test_commit_during_execution_is_not_cached(client, resource, monkeypatch):
+    execute = resource.schema.execute
+
+    def _execute_then_commit(*args, **kwargs):
+        # La transaction est validée (et le cache invalidé) après la lecture
+        # des données, mais avant l'ajout du résultat au cache
+        result = execute(*args, **kwargs)
+        _rename(client.db, "Pendant")
+        return result
+
+    monkeypatch.setattr(resource.schema, "execute", _execute_then_commit)
+    stale = client.query(QUERY)
+    monkeypatch.undo()
+    assert stale["data"]["person"]["firstName"] != "Pendant"
+
+    result = client.query(QUERY)
+    assert result["data"]["person"]["firstName"] == "Pendant"
@@ -0,0 +1,118 @@
+""" LPGL - IUT Metz
+Zachary Arnaise
+
+Équipe des films et carrière des personnes par rôle, filtrées par l'ID du
+rôle (`references.roles`) plutôt que par sa description.
+"""
+
+import pytest
+import sqlalchemy
+
+ROLES = {
+    "directors": "réalisateur",
+    "actors": "acteur",
+    "songWriters": "compositeur",
+}
+
+
+def _crew(db, movie_id: int, description: str) -> list:
+    """IDs de l'équipe d'un film pour un rôle, par jointure sur la
+    description du rôle."""
+    with db.engine.connect() as connection:
+        rows = connection.execute(
+            "SELECT mp.person_id FROM movie_persons mp "
+            "JOIN person_roles r ON r.id = mp.person_role_id "
+            "WHERE mp.movie_id = ? AND r.description = ? ORDER BY mp.id",
+            (movie_id, description),
+        )
+        return [str(person_id) for person_id, in rows]
+
+
+@pytest.fixture
+def statements(db):
+    """Requêtes SQL exécutées sur la base de test."""
+    executed = []
+
+    def _record(conn, cursor, statement, *args):
+        executed.append(statement)
+
+    sqlalchemy.event.listen(db.engine, "before_cursor_execute", _record)
+    yield executed
+    sqlalchemy.event.remove(db.engine, "before_cursor_execute", _record)
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        # Relations chargées d'avance (`eager`)
+        "{ movies { id directors { id } actors { id } songWriters { id } } }",
+        # DataLoaders, pour les films atteints depuis les personnes
+        "{ person(id: 1) { playedIn { id directors { id } actors { id } "
+        "songWriters { id } } } }",
+    ],
+)
+def test_crew_by_role(client, statements, query):
+    result = client.query(query)["data"]
+    served = list(statements)
+    movies = result.get("movies") or result["person"]["playedIn"]
+    assert movies
+    for movie in movies:
+        for field, description in ROLES.items():
+            expected = _crew(client.db, int(movie["id"]), description)
+            assert [person["id"] for person in movie[field]] == expected
+    # Les rôles sont connus en mémoire: ni jointure ni lecture de leur table
+    assert not [s for s in served if "person_roles" in s]
+
+
+def test_career_by_role(client):
+    result = client.query(
+        "{ person(id: 1) { directed { id } playedIn { id } composed { id } } }"
+    )
+    # Alain Chabbat, réalisateur et acteur de "RRRrrrr!!!"
+    person = result["data"]["person"]
+    assert [movie["id"] for movie in person["playedIn"]] == ["1"]
+    assert [movie["id"] for movie in person["directed"]] == ["1"]
+    assert person["composed"] == []
+
+
+def _members(db, description: str) -> list:
+    """IDs des personnes ayant eu un rôle sur au moins un film."""
+    with db.engine.connect() as connection:
+        rows = connection.execute(
+            "SELECT DISTINCT mp.person_id FROM movie_persons mp "
+            "JOIN person_roles r ON r.id = mp.person_role_id "
+            "WHERE r.description = ? ORDER BY mp.person_id",
+            (description,),
+        )
+        return [str(person_id) for person_id, in rows]
+
+
+@pytest.mark.parametrize("field", ROLES)
+def test_role_members(client, statements, field):
+    expected = _members(client.db, ROLES[field])
+    assert expected
+    statements.clear()
+    result = client.query("{ %s { id } }" % field)["data"][field]
+    served = [s for s in statements if "persons" in s]
+    assert [person["id"] for person in result] == expected
+    # Une seule requête DISTINCT, jointe à movie_persons
+    assert len(served) == 1
+    assert "DISTINCT" in served[0] and "movie_persons" in served[0]
+
+
+@pytest.mark.parametrize("field", ROLES)
+def test_role_members_connection(client, field):
+    expected = _members(client.db, ROLES[field])
+    ids, after = [], None
+    while True:
+        page = client.query(
+            "query ($after: String) { %sConnection(first: 2, after: $after) "
+            "{ edges { cursor node { id } } } }" % field,
+            after=after,
+        )["data"][field + "Connection"]
+        if not page["edges"]:
+            break
+        ids += [edge["node"]["id"] for edge in page["edges"]]
+        after = page["edges"][-1]["cursor"]
+    # Pages sans doublon malgré la jointure sur l'équipe
+    assert ids == expected
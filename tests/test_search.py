@@ -0,0 +1,120 @@
+""" LPGL - IUT Metz
+Zachary Arnaise
+
+Recherche plein texte (`fulltext`): index FTS5 sous SQLite, recherche par
+`ILIKE` sur les autres bases.
+"""
+
+import datetime
+
+import pytest
+
+import fulltext
+from models import Movie, Person
+
+SEARCH = """
+query ($q: String, $first: Int) {
+  search(q: $q, first: $first) {
+    __typename
+    ... on MovieType { id frenchTitle }
+    ... on PersonType { id lastName }
+  }
+}
+"""
+
+
+def _search(client, q: str, first: int = None) -> list:
+    """Résultats de `search`, sous la forme `(type, id)`."""
+    result = client.query(SEARCH, q=q, first=first)
+    return [
+        (entity["__typename"], int(entity["id"]))
+        for entity in result["data"]["search"]
+    ]
+
+
+def _add_person(db, first_name: str, last_name: str) -> int:
+    session = db.scoped_session()
+    person = Person(
+        firstName=first_name,
+        lastName=last_name,
+        dateOfBirth=datetime.date(1980, 1, 1),
+    )
+    session.add(person)
+    session.commit()
+    id_ = person.id
+    db.scoped_session.remove()
+    return id_
+
+
+def test_prefixes_ignore_case_and_accents(client):
+    assert _search(client, "ELEMENT") == [("MovieType", 7)]
+    assert _search(client, "arr") == [("MovieType", 3)]
+    assert sorted(_search(client, "gerard")) == [
+        ("PersonType", 2),
+        ("PersonType", 14),
+    ]
+
+
+def test_all_words_must_match(client):
+    assert _search(client, "gérard oury") == [("PersonType", 14)]
+    assert _search(client, "gérard spielberg") == []
+    assert _search(client, "  ") == []
+
+
+def test_results_are_ranked_and_limited(client):
+    # Titre court: plus pertinent que celui du film 2 pour "breaking"
+    session = client.db.scoped_session()
+    session.add(
+        Movie(
+            frenchTitle="Breaking",
+            originalTitle="Breaking",
+            statusId=2,
+            statusDate=datetime.date(2020, 1, 1),
+        )
+    )
+    session.commit()
+    client.db.scoped_session.remove()
+
+    results = _search(client, "breaking")
+    assert results[1] == ("MovieType", 2)
+    assert _search(client, "breaking", first=1) == results[:1]
+
+
+def test_new_rows_are_searchable(client):
+    id_ = _add_person(client.db, "Ada", "Lovelace")
+    assert _search(client, "lovel") == [("PersonType", id_)]
+
+
+@pytest.fixture
+def like_search(monkeypatch):
+    """Recherche sans FTS5, comme sur une base autre que SQLite."""
+    monkeypatch.setattr(fulltext, "_ranked_ids", None)
+
+    def _search_without_fts(session, q: str, first: int = 20) -> list:
+        bind = session.get_bind()
+        monkeypatch.setattr(bind.dialect, "name", "postgresql")
+        try:
+            return [
+                (type(entity).__name__, entity.id)
+                for entity in fulltext.search(session, q, first)
+            ]
+        finally:
+            monkeypatch.setattr(bind.dialect, "name", "sqlite")
+
+    return _search_without_fts
+
+
+def test_fallback_matches_word_prefixes(db, like_search):
+    session = db.scoped_session()
+    assert like_search(session, "fun") == [("Person", 15)]
+    assert like_search(session, "CHAB") == [("Person", 1)]
+    assert like_search(session, "back fut") == [("Movie", 6)]
+    # Préfixe d'un mot, pas n'importe quelle sous-chaîne
+    assert like_search(session, "amino") == []
+
+
+def test_fallback_escapes_like_wildcards(db, like_search):
+    id_ = _add_person(db, "Jean_Luc", "Test")
+    _add_person(db, "Jeanxluc", "Test")
+    session = db.scoped_session()
+    assert like_search(session, "jean_l") == [("Person", id_)]
@@ -0,0 +1,176 @@
+""" LPGL - IUT Metz
+Zachary Arnaise
+
+Sessions SQLAlchemy propres à chaque requête (`sessions`).
+"""
+
+import gc
+import logging
+
+import falcon.testing
+import sqlalchemy.orm
+
+import metrics
+import sessions
+from models import Movie
+
+QUERY = "{ movie(id: 1) { id frenchTitle actors { id } } }"
+
+CREATE_PERSON = """
+mutation {
+  createPerson(personData: {
+    firstName: "Ada", lastName: "Test", dateOfBirth: "1980-01-01"
+  }) { person { id } }
+}
+"""
+
+
+def _open_sessions(db) -> list:
+    """Sessions encore en vie liées à la base de test."""
+    gc.collect()
+    return [
+        session
+        for session in list(sqlalchemy.orm.session._sessions.values())
+        if session.bind is db.engine
+    ]
+
+
+def _capture_contexts(monkeypatch, resource) -> list:
+    """Contextes construits par `resource`, ajoutés à la liste renvoyée."""
+    contexts = []
+    build = resource._context
+
+    def _context(*args, **kwargs):
+        context = build(*args, **kwargs)
+        contexts.append(context)
+        return context
+
+    monkeypatch.setattr(resource, "_context", _context)
+    return contexts
+
+
+def test_release_counts_loaded_objects(db):
+    session = db.scoped_session()
+    movies = session.query(Movie).all()
+
+    assert sessions.release(db.scoped_session) == len(movies)
+    assert not db.scoped_session.registry.has()
+    del session, movies
+    assert _open_sessions(db) == []
+
+
+def test_release_rolls_back_pending_changes(db):
+    session = db.scoped_session()
+    session.query(Movie).get(1).frenchTitle = "Modifié"
+    session.flush()
+    sessions.release(db.scoped_session)
+
+    title = db.scoped_session().query(Movie).get(1).frenchTitle
+    assert title != "Modifié"
+
+
+def test_sessions_are_released_after_each_request(client, caplog):
+    # Les enregistrements de log conservés par pytest garderaient en vie la
+    # trace de l'exception du resolver, et avec elle la session
+    caplog.set_level(logging.CRITICAL, logger="graphql.execution.executor")
+    assert "errors" not in client.query(QUERY)
+    assert not client.db.scoped_session.registry.has()
+    assert _open_sessions(client.db) == []
+
+    # Y compris après une erreur d'exécution
+    result = client.query(
+        'mutation { createMovie(movieData: {frenchTitle: "X", '
+        'originalTitle: "X", status: "nope", statusDate: "2020-01-01"}) '
+        "{ movie { id } } }"
+    )
+    assert result["errors"]
+    assert _open_sessions(client.db) == []
+
+
+def test_each_request_gets_a_new_session(client, resource, monkeypatch):
+    contexts = _capture_contexts(monkeypatch, resource)
+    client.query(QUERY)
+    client.query(QUERY)
+
+    first, second = (context["session"] for context in contexts)
+    assert isinstance(first, sqlalchemy.orm.Session)
+    assert first is not second
+
+
+def test_batched_operations_share_one_session(client, resource, monkeypatch):
+    contexts = _capture_contexts(monkeypatch, resource)
+    result = client.post([{"query": QUERY}, {"query": CREATE_PERSON}])
+
+    assert result.status_code == 200
+    assert all("errors" not in item for item in result.json)
+    assert len(contexts) == 1
+    contexts.clear()
+    assert _open_sessions(client.db) == []
+
+
+def test_next_request_sees_fresh_data(client):
+    before = client.query(QUERY)["data"]["movie"]["frenchTitle"]
+    with client.db.engine.begin() as connection:
+        connection.execute(
+            "UPDATE movie SET frenchTitle = 'Nouveau' WHERE id = 1"
+        )
+
+    after = client.query(QUERY)["data"]["movie"]["frenchTitle"]
+    assert before != "Nouveau"
+    assert after == "Nouveau"
+
+
+def _observations() -> int:
+    """Nombre de mesures de `sqlalchemy_session_objects`."""
+    histogram = metrics.session_objects
+    return sum(sum(counts) for counts, _ in histogram._values.values())
+
+
+def test_each_request_is_measured_once(client):
+    before = _observations()
+    client.query("{ movies { id } }")
+    client.post([{"query": QUERY}, {"query": QUERY}])
+    assert _observations() == before + 2
+
+
+def test_asgi_requests_release_pool_sessions(async_client):
+    assert "errors" not in async_client.query(QUERY)
+    result = async_client.post([{"query": QUERY}, {"query": CREATE_PERSON}])
+    assert result.status_code == 200
+    assert _open_sessions(async_client.db) == []
+
+
+def test_websocket_operations_release_pool_sessions(db, async_resource):
+    app = falcon.asgi.App()
+    app.add_route("/graphql", async_resource)
+
+    async def run():
+        async with falcon.testing.ASGIConductor(app) as conductor:
+            async with conductor.simulate_ws(
+                "/graphql", subprotocols=["graphql-ws"]
+            ) as ws:
+                await ws.send_json({"type": "connection_init"})
+                assert (await ws.receive_json())["type"] == "connection_ack"
+                messages = []
+                for op_id, query in (("1", QUERY), ("2", CREATE_PERSON)):
+                    await ws.send_json(
+                        {
+                            "type": "start",
+                            "id": op_id,
+                            "payload": {"query": query},
+                        }
+                    )
+                    while len(messages) < 2 * int(op_id):
+                        message = await ws.receive_json()
+                        if message["type"] != "ka":
+                            messages.append(message)
+                await ws.send_json({"type": "connection_terminate"})
+        return messages
+
+    messages = falcon.async_to_sync(run)
+    data = [m for m in messages if m["type"] == "data"]
+    assert [m["id"] for m in data] == ["1", "2"]
+    assert all("errors" not in m["payload"] for m in data)
+    # Ni dans les threads du pool, ni dans celui de la boucle asyncio
+    assert not db.scoped_session.registry.has()
+    assert _open_sessions(db) == []
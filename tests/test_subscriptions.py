@@ -0,0 +1,137 @@
+""" LPGL - IUT Metz
+Zachary Arnaise
+
+Subscriptions (`newMovie`, `newPerson`): WebSocket du serveur ASGI
+uniquement.
+"""
+
+import asyncio
+
+import falcon.asgi
+import falcon.testing
+
+from events import MOVIE_CREATED, bus
+
+SUBSCRIPTION = "subscription { newMovie { id frenchTitle } }"
+
+
+def test_http_subscriptions_are_rejected(client):
+    result = client.post({"query": SUBSCRIPTION})
+    assert result.status_code == 400
+    error = result.json["errors"][0]
+    assert error["extensions"]["code"] == "SUBSCRIPTIONS_NOT_SUPPORTED"
+
+
+CREATE_PERSON = """
+mutation {
+  createPerson(personData: {
+    firstName: "Ada", lastName: "Test", dateOfBirth: "1980-01-01"
+  }) { person { id } }
+}
+"""
+
+CREATE_MOVIE = """
+mutation {
+  createMovie(movieData: {
+    frenchTitle: "Nouveau", originalTitle: "New", status: "sortie",
+    statusDate: "2020-01-01"
+  }) { movie { id } }
+}
+"""
+
+
+def _start(op_id: str, query: str) -> dict:
+    """Message `start` d'une opération."""
+    return {"type": "start", "id": op_id, "payload": {"query": query}}
+
+
+def _exchange(async_resource, messages: list, last: dict) -> list:
+    """Envoie `messages` sur une connexion WebSocket `graphql-ws`.
+
+    Returns:
+        list: Messages reçus (hors `ka`), jusqu'au message `last` inclus.
+    """
+    app = falcon.asgi.App()
+    app.add_route("/graphql", async_resource)
+
+    async def run():
+        received = []
+        async with falcon.testing.ASGIConductor(app) as conductor:
+            async with conductor.simulate_ws(
+                "/graphql", subprotocols=["graphql-ws"]
+            ) as ws:
+                await ws.send_json({"type": "connection_init"})
+                assert (await ws.receive_json())["type"] == "connection_ack"
+                for message in messages:
+                    await ws.send_json(message)
+                while last not in received:
+                    message = await asyncio.wait_for(ws.receive_json(), 10)
+                    if message["type"] != "ka":
+                        received.append(message)
+                    # Arrêt de la subscription une fois le film reçu
+                    if message["type"] == "data" and message["id"] == "1":
+                        await ws.send_json({"type": "stop", "id": "1"})
+                await ws.send_json({"type": "connection_terminate"})
+        return received
+
+    return falcon.async_to_sync(run)
+
+
+def test_new_movie_is_delivered(async_resource):
+    received = _exchange(
+        async_resource,
+        [
+            _start("1", SUBSCRIPTION),
+            _start("2", CREATE_PERSON),
+            _start("3", CREATE_MOVIE),
+        ],
+        {"type": "complete", "id": "1"},
+    )
+    movie_id = next(
+        m["payload"]["data"]["createMovie"]["movie"]["id"]
+        for m in received
+        if m["type"] == "data" and m["id"] == "3"
+    )
+    # Un seul résultat, pour le film: la personne créée n'est pas envoyée
+    assert [m for m in received if m["id"] == "1"] == [
+        {
+            "type": "data",
+            "id": "1",
+            "payload": {
+                "data": {"newMovie": {"id": movie_id, "frenchTitle": "Nouveau"}}
+            },
+        },
+        {"type": "complete", "id": "1"},
+    ]
+
+
+def test_invalid_subscription_is_rejected(async_resource):
+    received = _exchange(
+        async_resource,
+        [
+            _start("2", "subscription { newMovie { nope } }"),
+            _start("3", "{ movie(id: 1) { id } }"),
+        ],
+        {"type": "complete", "id": "3"},
+    )
+    assert received[0]["type"] == "error" and received[0]["id"] == "2"
+    assert "nope" in received[0]["payload"]["message"]
+    assert received[1]["payload"] == {"data": {"movie": {"id": "1"}}}
+
+
+def test_full_queue_drops_oldest_events():
+    async def run():
+        subscriber = bus.subscribe(max_size=2)
+        try:
+            for id_ in (1, 2, 3):
+                bus.publish(MOVIE_CREATED, id_)
+            # Événements remis par la boucle asyncio de l'abonné
+            await asyncio.sleep(0)
+            events = [await subscriber.get() for _ in range(2)]
+        finally:
+            bus.unsubscribe(subscriber)
+        return subscriber, events
+
+    subscriber, events = falcon.async_to_sync(run)
+    assert [event.id for event in events] == [2, 3]
+    assert subscriber.dropped == 1
@@ -0,0 +1,97 @@
+""" LPGL - IUT Metz
+Zachary Arnaise
+
+Mesure des resolvers (`tracing`), métriques et `extensions.tracing`.
+"""
+
+from graphql import (
+    GraphQLField,
+    GraphQLInt,
+    GraphQLList,
+    GraphQLObjectType,
+)
+from promise import Promise, is_thenable
+
+import metrics
+from tracing import Trace, TracingMiddleware
+
+
+ITEM = GraphQLObjectType("Item", {"id": GraphQLField(GraphQLInt)})
+
+
+class _Info(object):
+    """Informations minimales d'un resolver, comme fournies par
+    graphql-core."""
+
+    def __init__(self: object, context: dict, leaf: bool = False):
+        """Constructeur."""
+        self.context = context
+        self.return_type = GraphQLInt if leaf else GraphQLList(ITEM)
+        self.parent_type = "Query"
+        self.field_name = "items"
+        self.path = ["items"]
+
+
+def _observations(field: str) -> int:
+    histogram = metrics.resolver_duration
+    return sum(
+        sum(counts)
+        for key, (counts, _) in histogram._values.items()
+        if key == ("Query", field)
+    )
+
+
+def test_resource_does_not_wrap_resolvers_in_promises(resource):
+    resolver = resource.middleware.get_field_resolver(
+        lambda root, info, **args: [1, 2]
+    )
+    result = resolver(None, _Info({}))
+    assert not is_thenable(result)
+    assert result == [1, 2]
+
+
+def test_plain_resolver_is_measured_without_promise():
+    before = _observations("items")
+    result = TracingMiddleware().resolve(
+        lambda root, info, **args: ["a"], None, _Info({})
+    )
+    assert result == ["a"]
+    assert not is_thenable(result)
+    assert _observations("items") == before + 1
+
+
+def test_pending_resolver_is_measured_when_resolved():
+    trace = Trace()
+    result = TracingMiddleware().resolve(
+        lambda root, info, **args: Promise.resolve(["b"]),
+        None,
+        _Info({"tracing": trace}),
+    )
+    assert is_thenable(result)
+    assert result.get() == ["b"]
+    assert [r["fieldName"] for r in trace.resolvers] == ["items"]
+
+
+def test_leaf_fields_are_only_traced_on_demand():
+    trace = Trace()
+    middleware = TracingMiddleware()
+    resolver = lambda root, info, **args: 3  # noqa: E731
+    assert middleware.resolve(resolver, None, _Info({}, leaf=True)) == 3
+    middleware.resolve(resolver, None, _Info({"tracing": trace}, leaf=True))
+    assert len(trace.resolvers) == 1
+
+
+def test_tracing_extension(client):
+    metrics.instrument_engine(client.db.engine)
+    result = client.post(
+        {
+            "query": "{ movie(id: 1) { id actors { id } } }",
+            "extensions": {"tracing": True},
+        }
+    ).json
+    tracing = result["extensions"]["tracing"]
+    assert tracing["version"] == 1
+    paths = [resolver["path"] for resolver in tracing["execution"]["resolvers"]]
+    assert ["movie"] in paths
+    assert ["movie", "actors"] in paths
+    assert result["extensions"]["sql"]["statements"] >= 1